@@ -0,0 +1,238 @@
+"""
+Admission control for the analysis endpoints
+
+Decides, before any upload is parsed, whether a request gets to run:
+
+- each client has a token bucket, so one client's burst is refused with
+  429 instead of queueing in front of everyone else;
+- at most max_concurrent requests run at once; further requests wait in
+  a bounded FIFO queue, and a full queue refuses new arrivals at once;
+- a waiting request is dropped as soon as its deadline passes (the
+  queue timeout, or the client's own X-Request-Timeout if shorter),
+  because its client has given up and serving it would only delay the
+  requests behind it.
+
+Refusals carry a Retry-After estimate. Overload therefore turns into
+fast rejections with bounded latency for admitted requests, instead of
+an ever-growing queue.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from inference_executor import InferenceUnavailable
+
+
+class RateLimited(Exception):
+    """The client has used up its request budget (HTTP 429)"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionRejected(InferenceUnavailable):
+    """The server is at capacity and the request was not admitted"""
+
+
+class DeadlineExceeded(AdmissionRejected):
+    """The request's deadline passed before it could be served"""
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst tokens"""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """Take one token; returns 0 on success, else seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Ticket:
+    """An admitted request; release() frees its slot"""
+
+    def __init__(self, controller, deadline, holds_slot=True):
+        self._controller = controller
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self._released = not holds_slot
+
+    def check(self):
+        """Raise DeadlineExceeded if the request's deadline has passed"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._controller._count('expired')
+            raise DeadlineExceeded('Request deadline passed before analysis', self._controller.retry_after())
+
+    def release(self):
+        """Free the slot and record the service time; safe to call twice"""
+        if not self._released:
+            self._released = True
+            self._controller.record_service_time(time.monotonic() - self.started)
+            self._controller._release()
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Per-client token buckets plus a global concurrency limit with a
+    bounded, deadline-aware wait queue
+
+    client_rate=0 disables per-client limiting; max_concurrent=0
+    disables the concurrency limit (and the queue).
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=32, queue_timeout=5.0,
+                 client_rate=10.0, client_burst=20, max_clients=10000):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._active = 0
+        self._waiters = deque()
+        self._avg_service_seconds = 0.0
+        self._counters = {
+            'admitted': 0, 'queued': 0, 'rate_limited': 0,
+            'queue_full': 0, 'shed': 0, 'expired': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def retry_after(self):
+        """Seconds a refused client should wait, from the current backlog"""
+        with self._lock:
+            backlog = (len(self._waiters) + 1) / max(self.max_concurrent, 1)
+            return max(1, math.ceil(backlog * self._avg_service_seconds))
+
+    def admit(self, client_id, timeout=None):
+        """
+        Admit a request or raise RateLimited / AdmissionRejected
+        timeout is the client's own budget in seconds, if it sent one.
+        Returns a Ticket that must be released when the request ends.
+        """
+        now = time.monotonic()
+        deadline = None if timeout is None else now + timeout
+        self._take_token(client_id, now)
+
+        if not self.max_concurrent:
+            self._count('admitted')
+            return Ticket(self, deadline, holds_slot=False)
+
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._counters['admitted'] += 1
+                return Ticket(self, deadline)
+            if len(self._waiters) >= self.max_queue:
+                self._counters['queue_full'] += 1
+                full = True
+            else:
+                full = False
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+                self._counters['queued'] += 1
+        if full:
+            raise AdmissionRejected('Server is busy, please retry shortly', self.retry_after())
+
+        wait_until = now + self.queue_timeout
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+        waiter.event.wait(max(0.0, wait_until - time.monotonic()))
+        with self._lock:
+            if waiter.granted:
+                self._counters['admitted'] += 1
+                return Ticket(self, deadline)
+            # Timed out: leave the queue; a grant cannot race us under the lock
+            self._waiters.remove(waiter)
+            self._counters['shed'] += 1
+        raise DeadlineExceeded('Server is busy, please retry shortly', self.retry_after())
+
+    def _take_token(self, client_id, now):
+        if not self.client_rate:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = self._buckets[client_id] = TokenBucket(self.client_rate, self.client_burst, now)
+                # Forget the least recently seen clients; a forgotten
+                # client simply starts again with a full bucket
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+            wait = bucket.take(now)
+            if wait:
+                self._counters['rate_limited'] += 1
+        if wait:
+            raise RateLimited('Too many requests, please slow down', max(1, math.ceil(wait)))
+
+    def _release(self):
+        with self._lock:
+            # Hand the slot straight to the oldest waiter, so arrivals
+            # cannot overtake the queue
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.event.set()
+            else:
+                self._active -= 1
+
+    def record_service_time(self, seconds):
+        """Feed request durations into the Retry-After estimate"""
+        with self._lock:
+            self._avg_service_seconds = (
+                seconds if not self._avg_service_seconds
+                else 0.8 * self._avg_service_seconds + 0.2 * seconds
+            )
+
+    def reset(self):
+        """Forget all client buckets (counters are kept)"""
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'active': self._active,
+                'waiting': len(self._waiters),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'clients': len(self._buckets),
+            })
+        return stats
+
+
+def create_admission_controller():
+    """Build the controller from environment configuration"""
+    return AdmissionController(
+        max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 8)),
+        max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 32)),
+        queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 5)),
+        client_rate=float(os.environ.get('ADMISSION_CLIENT_RATE', 10)),
+        client_burst=int(os.environ.get('ADMISSION_CLIENT_BURST', 20)),
+        max_clients=int(os.environ.get('ADMISSION_MAX_CLIENTS', 10000)),
+    )
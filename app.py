@@ -2,106 +2,877 @@
 First Aid Assistant - Flask Backend
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, time
+import atexit
+import functools
+import hashlib
+import json
+import multiprocessing
 import os
+import metrics
 from classifier import create_classifier
+from result_cache import content_key, create_result_cache
+from near_duplicates import create_near_duplicate_index
+from inference_executor import InferenceUnavailable, create_inference_executor
+from admission import RateLimited, create_admission_controller
+from jobs import FINISHED, create_job_manager
+from request_log import create_request_log
+from capture_store import create_capture_store
+from shared_weights import mapped_memory, process_memory
+from validation import UploadRejected, validate_image_header
+from prerender import PrerenderedResponse
+from startup import Readiness, preload, synthetic_images
 from first_aid_data import FIRST_AID_INSTRUCTIONS, GENERAL_DISCLAIMER, SAFETY_EXCLUSIONS
 
 app = Flask(__name__)
 CORS(app)  # ADD THIS LINE
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['MAX_BATCH_IMAGES'] = int(os.environ.get('MAX_BATCH_IMAGES', 10))
+# Limits checked against the image header before anything is decoded
+app.config['MAX_IMAGE_PIXELS'] = int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000))
+app.config['MAX_IMAGE_DIMENSION'] = int(os.environ.get('MAX_IMAGE_DIMENSION', 20000))
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+# Load Pillow plugins and run the in-process classifier once while the
+# module is imported; under gunicorn --preload this happens once in the
+# master and the workers share it copy-on-write
+preload()
+
 # Initialize classifier
 classifier = create_classifier()
+classifier.warm_up()
+
+# Classification runs in worker processes, off the request threads
+inference_executor = create_inference_executor(classifier)
+
+# Cache of classification results keyed by upload hash
+result_cache = create_result_cache()
+
+# Results for re-encoded or resized re-uploads, keyed by perceptual hash
+near_duplicates = create_near_duplicate_index()
+
+# Per-client rate limits and the concurrency limit for analyze requests
+admission = create_admission_controller()
+# Number of trusted proxies in front of the app that append to
+# X-Forwarded-For (0 = key clients by the socket address)
+TRUST_PROXY_HOPS = int(os.environ.get('ADMISSION_TRUST_PROXY', 0))
+
+# Audit log of analyze calls, written by a background thread (REQUEST_LOG)
+request_log = create_request_log()
+if request_log is not None:
+    atexit.register(request_log.close)
+LOGGED_ENDPOINTS = {'analyze_injury', 'analyze_raw', 'analyze_batch', 'submit_job'}
+
+# Opt-in store of uploads for building a training set (CAPTURE_UPLOADS=1)
+capture_store = create_capture_store(app.config['UPLOAD_FOLDER'], classifier.preprocess_image)
+if capture_store is not None:
+    atexit.register(capture_store.close)
+
+# Background pool and store for asynchronous analysis jobs
+jobs = create_job_manager()
+
+# Worker pool for batch requests. Pillow releases the GIL while decoding
+# and resizing, so threads classify several images in parallel.
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_WORKERS', min(4, os.cpu_count() or 1))),
+    thread_name_prefix='batch'
+)
+
+# Severity levels from first_aid_data, least to most severe
+SEVERITY_ORDER = ['low', 'medium', 'high']
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def validate_upload(image_bytes):
+    """Check format and dimensions from the header; raises UploadRejected"""
+    with metrics.stage('validate'):
+        return validate_image_header(
+            image_bytes,
+            app.config['MAX_IMAGE_PIXELS'],
+            app.config['MAX_IMAGE_DIMENSION']
+        )
+
+def classify_image_bytes(image_bytes, key=None):
+    """
+    Classify an upload, serving identical uploads from the result cache
+    key is the upload's content_key, if the caller already has it
+    """
+    return result_cache.get_or_compute(
+        key or content_key(image_bytes),
+        lambda: classify_uncached(image_bytes)
+    )
+
+def classify_uncached(image_bytes):
+    """
+    Classify an upload the result cache has not seen
+    With the near-duplicate index enabled, an inference worker decodes
+    the upload and returns its perceptual hash and 224x224 pixels; the
+    hash is looked up here, and on a miss the pixels go back to a worker
+    for classification. Nothing is decoded on the request thread.
+    """
+    if near_duplicates is None:
+        return inference_executor.classify(image_bytes)
+    
+    signature = inference_executor.signature(image_bytes)
+    if signature is None:
+        return inference_executor.classify(image_bytes)
+    
+    image_hash, color, rgb_bytes = signature
+    with metrics.stage('near_duplicate'):
+        result = near_duplicates.lookup(image_hash, color)
+    if result is None:
+        result = inference_executor.classify_rgb(rgb_bytes)
+        near_duplicates.add(image_hash, color, result)
+    return result
+
+def capture_upload(key, image_bytes, category, confidence, size=None):
+    """
+    Queue an analyzed upload for the opt-in capture store
+    size marks image_bytes as raw pixels of that size (/api/analyze/raw)
+    """
+    if capture_store is not None:
+        capture_store.capture(key, image_bytes, category, confidence, size=size)
+
+def service_unavailable(error):
+    """503 response asking the client to retry after a while"""
+    response = jsonify({'success': False, 'error': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def forwarded_client(forwarded, remote_addr):
+    """
+    Client address from X-Forwarded-For, behind TRUST_PROXY_HOPS proxies
+    Each trusted proxy appends the address it received from, so the
+    client is the TRUST_PROXY_HOPS-th entry from the right. Entries left
+    of it were written by the client and could name anyone.
+    """
+    if TRUST_PROXY_HOPS:
+        entries = [entry.strip() for entry in (forwarded or '').split(',') if entry.strip()]
+        if len(entries) >= TRUST_PROXY_HOPS:
+            return entries[-TRUST_PROXY_HOPS]
+    return remote_addr or 'unknown'
+
+def client_id():
+    """Identity used for per-client rate limiting"""
+    return forwarded_client(request.headers.get('X-Forwarded-For'), request.remote_addr)
+
+def parse_timeout(value):
+    """An X-Request-Timeout value in seconds, or None if missing or invalid"""
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return None
+    return timeout if timeout > 0 else None
+
+def client_timeout():
+    """The client's X-Request-Timeout budget in seconds, if valid"""
+    return parse_timeout(request.headers.get('X-Request-Timeout'))
+
+def admission_controlled(view):
+    """
+    Admit the request before the view runs (and before its body is read)
+    Refused requests get 429 (client over its rate) or 503 (server full)
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            with metrics.stage('admission'):
+                ticket = admission.admit(client_id(), client_timeout())
+        except RateLimited as e:
+            metrics.ERRORS.inc(type='rate_limited')
+            response = jsonify({'success': False, 'error': str(e)})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        except InferenceUnavailable as e:
+            metrics.ERRORS.inc(type='overloaded')
+            return service_unavailable(e)
+        g.admission_ticket = ticket
+        try:
+            return view(*args, **kwargs)
+        finally:
+            ticket.release()
+    return wrapper
+
+def check_deadline():
+    """Shed the request if its deadline passed while the upload was read"""
+    ticket = g.get('admission_ticket')
+    if ticket is not None:
+        ticket.check()
+
+def build_analysis(category, confidence):
+    """Classification and first-aid instructions for a category"""
+    instructions = FIRST_AID_INSTRUCTIONS.get(category, FIRST_AID_INSTRUCTIONS['unknown'])
+    return {
+        'classification': {
+            'category': category,
+            'name': instructions['name'],
+            'confidence': confidence,
+            'severity': instructions['severity']
+        },
+        'instructions': {
+            'immediate_steps': instructions['immediate_steps'],
+            'warning_signs': instructions['warning_signs'],
+            'when_to_seek_help': instructions['when_to_seek_help'],
+            'additional_tips': instructions.get('additional_tips', [])
+        }
+    }
+
+def build_response(category, confidence):
+    """Full analyze response; ?fields= selects from its keys"""
+    return {
+        'success': True,
+        **build_analysis(category, confidence),
+        'disclaimer': GENERAL_DISCLAIMER,
+        'safety_exclusions': SAFETY_EXCLUSIONS,
+        'catalog_version': CATALOG_VERSION
+    }
+
+def build_catalog():
+    """Static first-aid content that analyze responses can refer to by category"""
+    return {
+        'categories': {
+            category: {
+                'name': instructions['name'],
+                'severity': instructions['severity'],
+                'instructions': build_analysis(category, None)['instructions']
+            }
+            for category, instructions in FIRST_AID_INSTRUCTIONS.items()
+        },
+        'disclaimer': GENERAL_DISCLAIMER,
+        'safety_exclusions': SAFETY_EXCLUSIONS
+    }
+
+# The catalog only changes when first_aid_data.py does, so it is built
+# once and tagged with a hash of its content
+CATALOG = build_catalog()
+CATALOG_VERSION = hashlib.sha256(json.dumps(CATALOG, sort_keys=True).encode()).hexdigest()[:16]
+CATALOG['version'] = CATALOG_VERSION
+
+# Top-level fields of an analyze response that ?fields= can select
+RESPONSE_FIELDS = ('classification', 'instructions', 'disclaimer', 'safety_exclusions', 'catalog_version')
+COMPACT_FIELDS = ('classification', 'catalog_version')
+
+def requested_fields(args=None):
+    """
+    Response fields chosen by ?mode=compact or ?fields=a,b
+    Reads the current request's query unless `args` is given.
+    Defaults to the full response; raises ValueError on unknown fields
+    """
+    if args is None:
+        args = request.args
+    if args.get('fields'):
+        fields = tuple(f.strip() for f in args['fields'].split(',') if f.strip())
+        unknown = [f for f in fields if f not in RESPONSE_FIELDS]
+        if unknown:
+            raise ValueError(
+                f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(RESPONSE_FIELDS)}"
+            )
+        return fields
+    if args.get('mode') == 'compact':
+        return COMPACT_FIELDS
+    return RESPONSE_FIELDS
+
+def select_fields(response, fields):
+    """Keep 'success' plus the requested fields"""
+    return {key: value for key, value in response.items() if key == 'success' or key in fields}
+
+@app.before_request
+def start_request_metrics():
+    """Start collecting stage timings for this request"""
+    if metrics.enabled:
+        g.request_started = perf_counter()
+        g.stage_timings, g.stage_token = metrics.start_collecting()
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record request/stage histograms and add a Server-Timing header"""
+    timings = g.pop('stage_timings', None)
+    if timings is None:
+        return response
+    total = perf_counter() - g.request_started
+    metrics.REQUEST_SECONDS.observe(total, endpoint=request.endpoint or 'unknown')
+    for name, seconds in timings.items():
+        metrics.STAGE_SECONDS.observe(seconds, stage=name)
+    response.headers['Server-Timing'] = metrics.server_timing_header({**timings, 'total': total})
+    return response
+
+@app.before_request
+def start_request_log():
+    if request_log is not None and request.endpoint in LOGGED_ENDPOINTS:
+        g.log_started = perf_counter()
+        g.log_fields = {}
+
+@app.after_request
+def write_request_log(response):
+    """Queue an audit record for analyze calls; never blocks on disk"""
+    started = g.pop('log_started', None)
+    if started is not None:
+        log_analysis(request.endpoint, response.status_code, started, **g.pop('log_fields', {}))
+    return response
+
+def log_analysis(endpoint, status, started, **fields):
+    """
+    Queue one audit record, if the request log is enabled
+    Also used for analyses that finish outside a request: background
+    jobs ('job') and the ASGI app's uploads and stream frames.
+    """
+    if request_log is not None:
+        request_log.log({
+            'ts': round(time(), 3),
+            'endpoint': endpoint,
+            'status': status,
+            'latency_ms': round((perf_counter() - started) * 1000, 2),
+            **fields,
+        })
+
+def log_fields(**fields):
+    """Add fields to this request's audit record, if it is being logged"""
+    if 'log_fields' in g:
+        g.log_fields.update(fields)
+
+@app.teardown_request
+def stop_request_metrics(error=None):
+    token = g.pop('stage_token', None)
+    if token is not None:
+        metrics.stop_collecting(token)
+
 @app.route('/')
 def index():
-    """Render main page"""
-    return render_template('index.html')
+    """Serve main page (rendered once at startup)"""
+    return PRERENDERED['index'].serve(request)
 
 @app.route('/api/analyze', methods=['POST'])
+@admission_controlled
 def analyze_injury():
     """
     Analyze uploaded injury image
     Returns classification and first-aid instructions
     """
     try:
-        # Check if image was uploaded
-        if 'image' not in request.files:
+        fields = requested_fields()
+    except ValueError as e:
+        metrics.ERRORS.inc(type='invalid_fields')
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # Check if image was uploaded (this parses the multipart body)
+        with metrics.stage('parse'):
+            has_image = 'image' in request.files
+        if not has_image:
+            metrics.ERRORS.inc(type='no_image')
             return jsonify({'error': 'No image uploaded'}), 400
         
         file = request.files['image']
         
         if file.filename == '':
+            metrics.ERRORS.inc(type='no_file')
             return jsonify({'error': 'No file selected'}), 400
         
         if not allowed_file(file.filename):
+            metrics.ERRORS.inc(type='invalid_type')
             return jsonify({'error': 'Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, WEBP)'}), 400
         
         # Read image bytes
-        image_bytes = file.read()
+        with metrics.stage('read'):
+            image_bytes = file.read()
+        
+        # Reject non-images and oversized images before decoding
+        validate_upload(image_bytes)
+        check_deadline()
         
-        # Classify the injury
-        category, confidence, features = classifier.classify(image_bytes)
+        # Classify the injury (identical uploads are served from cache)
+        image_hash = content_key(image_bytes)
+        category, confidence, features = classify_image_bytes(image_bytes, image_hash)
+        metrics.CLASSIFICATIONS.inc(category=category)
+        log_fields(image_sha256=image_hash, category=category, confidence=confidence, features=features)
+        capture_upload(image_hash, image_bytes, category, confidence)
         
-        # Get first-aid instructions for this category
-        instructions = FIRST_AID_INSTRUCTIONS.get(category, FIRST_AID_INSTRUCTIONS['unknown'])
+        # Prepare response with first-aid instructions for this category
+        response = build_response(category, confidence)
         
-        # Prepare response
+        with metrics.stage('serialize'):
+            return jsonify(select_fields(response, fields))
+    
+    except UploadRejected as e:
+        metrics.ERRORS.inc(type=e.error_type)
+        return jsonify({'error': str(e)}), e.status
+    
+    except InferenceUnavailable as e:
+        metrics.ERRORS.inc(type='unavailable')
+        return service_unavailable(e)
+    
+    except Exception as e:
+        metrics.ERRORS.inc(type='internal')
+        return jsonify({
+            'success': False,
+            'error': f'An error occurred: {str(e)}'
+        }), 500
+
+@app.route('/api/analyze/raw', methods=['POST'])
+@admission_controlled
+def analyze_raw():
+    """
+    Analyze an image the browser has already downscaled
+    The body is either raw pixels at the classifier's input size
+    (application/octet-stream), which skip decoding and resizing
+    entirely, or a small lossless PNG (image/png). Raw pixels are RGBA,
+    as a canvas's getImageData returns them (mapped without copying),
+    or packed RGB.
+    """
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        metrics.ERRORS.inc(type='invalid_fields')
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with metrics.stage('read'):
+            body = request.get_data(cache=False)
+        check_deadline()
+        
+        if request.mimetype == 'application/octet-stream':
+            width, height = classifier.target_size
+            if len(body) not in (width * height * 4, width * height * 3):
+                metrics.ERRORS.inc(type='invalid_raw')
+                return jsonify({
+                    'error': f'Raw uploads must be exactly {width * height * 4} bytes of {width}x{height} '
+                             f'RGBA data (or {width * height * 3} bytes of RGB)'
+                }), 400
+            image_hash = content_key(b'rgb:' + body)
+            category, confidence, features = result_cache.get_or_compute(
+                image_hash,
+                lambda: inference_executor.classify_rgb(body)
+            )
+            capture_upload(image_hash, body, category, confidence, size=classifier.target_size)
+        elif request.mimetype == 'image/png':
+            validate_upload(body)
+            image_hash = content_key(body)
+            category, confidence, features = classify_image_bytes(body, image_hash)
+            capture_upload(image_hash, body, category, confidence)
+        else:
+            metrics.ERRORS.inc(type='unsupported_format')
+            return jsonify({
+                'error': 'Send raw RGBA pixels as application/octet-stream or a PNG as image/png'
+            }), 415
+        
+        metrics.CLASSIFICATIONS.inc(category=category)
+        log_fields(image_sha256=image_hash, category=category, confidence=confidence, features=features)
+        with metrics.stage('serialize'):
+            return jsonify(select_fields(build_response(category, confidence), fields))
+    
+    except UploadRejected as e:
+        metrics.ERRORS.inc(type=e.error_type)
+        return jsonify({'error': str(e)}), e.status
+    
+    except InferenceUnavailable as e:
+        metrics.ERRORS.inc(type='unavailable')
+        return service_unavailable(e)
+    
+    except Exception as e:
+        metrics.ERRORS.inc(type='internal')
+        return jsonify({
+            'success': False,
+            'error': f'An error occurred: {str(e)}'
+        }), 500
+
+@app.route('/api/analyze/batch', methods=['POST'])
+@admission_controlled
+def analyze_batch():
+    """
+    Analyze several images of the same injury in one request
+    Images are classified in parallel; the aggregate reports the most
+    severe category found across all of them
+    """
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        metrics.ERRORS.inc(type='invalid_fields')
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        files = request.files.getlist('images') + request.files.getlist('image')
+        files = [f for f in files if f.filename != '']
+        
+        if not files:
+            metrics.ERRORS.inc(type='no_image')
+            return jsonify({'error': 'No images uploaded'}), 400
+        
+        if len(files) > app.config['MAX_BATCH_IMAGES']:
+            metrics.ERRORS.inc(type='too_many_images')
+            return jsonify({
+                'error': f"Too many images. A batch may contain at most {app.config['MAX_BATCH_IMAGES']}"
+            }), 400
+        
+        # Read everything on the request thread, then classify in parallel
+        uploads = []
+        for f in files:
+            image_bytes = f.read()
+            error = None
+            if not allowed_file(f.filename):
+                error = 'Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, WEBP)'
+            else:
+                try:
+                    validate_upload(image_bytes)
+                except UploadRejected as e:
+                    metrics.ERRORS.inc(type=e.error_type)
+                    error = str(e)
+            uploads.append((f.filename, error, image_bytes))
+        check_deadline()
+        keys = [content_key(image_bytes) if error is None else None for _, error, image_bytes in uploads]
+        futures = [
+            batch_executor.submit(classify_image_bytes, image_bytes, key) if key is not None else None
+            for (_, _, image_bytes), key in zip(uploads, keys)
+        ]
+        
+        results = []
+        logged = []
+        aggregate = None
+        for (filename, error, image_bytes), key, future in zip(uploads, keys, futures):
+            if future is None:
+                results.append({'filename': filename, 'success': False, 'error': error})
+                logged.append({'error': error})
+                continue
+            
+            category, confidence, features = future.result()
+            metrics.CLASSIFICATIONS.inc(category=category)
+            logged.append({'image_sha256': key, 'category': category,
+                           'confidence': confidence, 'features': features})
+            capture_upload(key, image_bytes, category, confidence)
+            analysis = build_analysis(category, confidence)
+            results.append({'filename': filename, **select_fields({'success': True, **analysis}, fields)})
+            
+            # Keep the most severe classification; break ties on confidence
+            classification = analysis['classification']
+            rank = (SEVERITY_ORDER.index(classification['severity']), confidence)
+            if aggregate is None or rank > aggregate[0]:
+                aggregate = (rank, classification)
+        
+        # One audit record per batch, with an entry per image
+        log_fields(images=logged)
         response = {
-            'success': True,
-            'classification': {
-                'category': category,
-                'name': instructions['name'],
-                'confidence': confidence,
-                'severity': instructions['severity']
-            },
-            'instructions': {
-                'immediate_steps': instructions['immediate_steps'],
-                'warning_signs': instructions['warning_signs'],
-                'when_to_seek_help': instructions['when_to_seek_help'],
-                'additional_tips': instructions.get('additional_tips', [])
+            'success': aggregate is not None,
+            'results': results,
+            'aggregate': {
+                **(aggregate[1] if aggregate else {}),
+                'image_count': len(results),
+                'analyzed_count': sum(1 for r in results if r['success'])
             },
             'disclaimer': GENERAL_DISCLAIMER,
-            'safety_exclusions': SAFETY_EXCLUSIONS
+            'safety_exclusions': SAFETY_EXCLUSIONS,
+            'catalog_version': CATALOG_VERSION
         }
-        
-        return jsonify(response)
+        return jsonify({
+            key: value for key, value in response.items()
+            if key not in RESPONSE_FIELDS or key in fields
+        })
+    
+    except InferenceUnavailable as e:
+        metrics.ERRORS.inc(type='unavailable')
+        return service_unavailable(e)
     
     except Exception as e:
+        metrics.ERRORS.inc(type='internal')
         return jsonify({
             'success': False,
             'error': f'An error occurred: {str(e)}'
         }), 500
 
-@app.route('/api/info', methods=['GET'])
-def get_info():
-    """Get general information about the system"""
-    return jsonify({
+@app.route('/api/jobs', methods=['POST'])
+@admission_controlled
+def submit_job():
+    """
+    Queue an analysis and return its job id at once
+    Takes the same upload as /api/analyze; the result is fetched from
+    /api/jobs/<id> or followed at /api/jobs/<id>/events
+    """
+    file = request.files.get('image')
+    if file is None or file.filename == '':
+        metrics.ERRORS.inc(type='no_image')
+        return jsonify({'error': 'No image uploaded'}), 400
+    if not allowed_file(file.filename):
+        metrics.ERRORS.inc(type='invalid_type')
+        return jsonify({'error': 'Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, WEBP)'}), 400
+    
+    try:
+        image_bytes = file.read()
+        validate_upload(image_bytes)
+        check_deadline()
+        key = content_key(image_bytes)
+        submitted = perf_counter()
+        
+        def analyze():
+            # The request's own record only covers submission, so the
+            # analysis gets a 'job' record, timed from submission
+            try:
+                category, confidence, features = classify_image_bytes(image_bytes, key)
+            except InferenceUnavailable:
+                log_analysis('job', 503, submitted, image_sha256=key)
+                raise
+            except Exception:
+                log_analysis('job', 500, submitted, image_sha256=key)
+                raise
+            metrics.CLASSIFICATIONS.inc(category=category)
+            log_analysis('job', 200, submitted, image_sha256=key, category=category,
+                         confidence=confidence, features=features)
+            capture_upload(key, image_bytes, category, confidence)
+            return build_response(category, confidence)
+        
+        record = jobs.submit(analyze)
+        log_fields(image_sha256=key, job_id=record['id'])
+    except UploadRejected as e:
+        metrics.ERRORS.inc(type=e.error_type)
+        return jsonify({'error': str(e)}), e.status
+    except InferenceUnavailable as e:
+        metrics.ERRORS.inc(type='unavailable')
+        return service_unavailable(e)
+    
+    status_url = f"/api/jobs/{record['id']}"
+    response = jsonify({
+        'job_id': record['id'],
+        'status': record['status'],
+        'status_url': status_url,
+        'events_url': f'{status_url}/events',
+    })
+    response.headers['Location'] = status_url
+    return response, 202
+
+def job_view(record, fields):
+    """Public form of a job record; ?fields= applies to its result"""
+    view = {key: value for key, value in record.items() if key != 'id'}
+    view['job_id'] = record['id']
+    if view['result'] is not None:
+        view['result'] = select_fields(view['result'], fields)
+    return view
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, with the analysis once it is done"""
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    record = jobs.get(job_id)
+    if record is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    response = jsonify(job_view(record, fields))
+    if record['status'] not in FINISHED:
+        response.headers['Retry-After'] = '1'
+    return response
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """
+    Server-Sent Events for one job: an event per status change, named
+    after the status, ending after 'done' or 'failed'
+    """
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    record = jobs.get(job_id)
+    if record is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    def events(record):
+        while True:
+            yield f"event: {record['status']}\ndata: {json.dumps(job_view(record, fields))}\n\n"
+            if record['status'] in FINISHED:
+                return
+            status = record['status']
+            while True:
+                record = jobs.wait(job_id, status)
+                if record is None:
+                    yield 'event: expired\ndata: {}\n\n'
+                    return
+                if record['status'] != status:
+                    break
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+    
+    return Response(events(record), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def get_job_stats():
+    """Job queue depth and latency"""
+    return jsonify(jobs.stats())
+
+def build_info():
+    """General information about the system"""
+    return {
         'supported_categories': list(FIRST_AID_INSTRUCTIONS.keys()),
         'disclaimer': GENERAL_DISCLAIMER,
         'safety_exclusions': SAFETY_EXCLUSIONS,
         'model_info': {
-            'type': 'Demo heuristic-based classifier',
-            'note': 'This is a demonstration. In production, use a trained deep learning model.',
+            **classifier.model_info(),
             'training_recommendation': classifier.get_training_recommendation()
         }
+    }
+
+@app.route('/api/catalog', methods=['GET'])
+def get_catalog():
+    """
+    All first-aid instructions, disclaimer and safety exclusions
+    Compact analyze responses refer to this by category and version;
+    /api/catalog?v=<version> never changes and may be cached forever
+    """
+    if request.args.get('v') == CATALOG_VERSION:
+        return PRERENDERED['catalog'].serve(request, 'public, max-age=31536000, immutable')
+    return PRERENDERED['catalog'].serve(request)
+
+@app.route('/api/instructions/<category>', methods=['GET'])
+def get_instructions(category):
+    """First-aid instructions for a single category"""
+    if category not in PRERENDERED_INSTRUCTIONS:
+        return jsonify({'error': f"Unknown category '{category}'"}), 404
+    return PRERENDERED_INSTRUCTIONS[category].serve(request)
+
+@app.route('/api/info', methods=['GET'])
+def get_info():
+    """Get general information about the system"""
+    return PRERENDERED['info'].serve(request)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Result cache, near-duplicate index and capture store counters"""
+    stats = result_cache.stats()
+    if near_duplicates is not None:
+        stats['near_duplicates'] = near_duplicates.stats()
+    if capture_store is not None:
+        stats['captures'] = capture_store.stats()
+    return jsonify(stats)
+
+@app.route('/api/admission/stats', methods=['GET'])
+def get_admission_stats():
+    """Admitted, queued and shed request counters"""
+    return jsonify(admission.stats())
+
+@app.route('/api/executor/stats', methods=['GET'])
+def get_executor_stats():
+    """Inference worker pool load and counters"""
+    return jsonify(inference_executor.stats())
+
+@app.route('/api/memory', methods=['GET'])
+def get_memory():
+    """Shared and private memory of this worker, its inference processes and the model weights"""
+    weights = getattr(classifier, 'shared_weights', None)
+    return jsonify({
+        'pid': os.getpid(),
+        'process': process_memory(),
+        'inference_workers': {
+            str(child.pid): process_memory(child.pid) for child in multiprocessing.active_children()
+        },
+        'model_weights': {**weights.info(), 'memory': mapped_memory(weights.path)} if weights else None,
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this worker process"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    executor_stats = inference_executor.stats()
+    cache_stats = result_cache.stats()
+    admission_stats = admission.stats()
+    job_stats = jobs.stats()
+    extra = [
+        '# TYPE first_aid_jobs_queued gauge',
+        f"first_aid_jobs_queued {job_stats['queued']}",
+        '# TYPE first_aid_jobs_running gauge',
+        f"first_aid_jobs_running {job_stats['running']}",
+        '# TYPE first_aid_admission_active gauge',
+        f"first_aid_admission_active {admission_stats['active']}",
+        '# TYPE first_aid_admission_waiting gauge',
+        f"first_aid_admission_waiting {admission_stats['waiting']}",
+        '# TYPE first_aid_admission_admitted_total counter',
+        f"first_aid_admission_admitted_total {admission_stats['admitted']}",
+        '# TYPE first_aid_admission_shed_total counter',
+    ]
+    for reason in ('rate_limited', 'queue_full', 'shed', 'expired'):
+        extra.append(f'first_aid_admission_shed_total{{reason="{reason}"}} {admission_stats[reason]}')
+    if request_log is not None:
+        log_stats = request_log.stats()
+        extra.append('# TYPE first_aid_request_log_records_total counter')
+        for outcome in ('written', 'sampled_out', 'dropped'):
+            extra.append(f'first_aid_request_log_records_total{{outcome="{outcome}"}} {log_stats[outcome]}')
+    extra += [
+        '# TYPE first_aid_inference_in_flight gauge',
+        f"first_aid_inference_in_flight {executor_stats['in_flight']}",
+        '# TYPE first_aid_inference_rejected_total counter',
+        f"first_aid_inference_rejected_total {executor_stats['rejected']}",
+        '# TYPE first_aid_result_cache_hits_total counter',
+        f"first_aid_result_cache_hits_total {cache_stats['hits'] + cache_stats['shared_hits']}",
+        '# TYPE first_aid_result_cache_misses_total counter',
+        f"first_aid_result_cache_misses_total {cache_stats['misses']}",
+    ]
+    memory = process_memory()
+    if memory is not None:
+        extra.append('# TYPE first_aid_process_memory_bytes gauge')
+        for kind in ('rss', 'pss', 'shared', 'private'):
+            extra.append(f'first_aid_process_memory_bytes{{kind="{kind}"}} {memory[kind]}')
+    return Response(metrics.render_prometheus(extra), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
+@app.route('/health/ready', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'first-aid-assistant'})
+    """Readiness: 200 once this process has warmed up, 503 before"""
+    payload, status = readiness()
+    return jsonify(payload), status
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'alive', 'service': 'first-aid-assistant'})
+
+def readiness():
+    """Readiness payload and HTTP status, shared with the ASGI app"""
+    if startup.ready:
+        return {'status': 'healthy', 'service': 'first-aid-assistant'}, 200
+    return {
+        'status': 'starting' if startup.state == 'starting' else 'unhealthy',
+        'service': 'first-aid-assistant',
+        'startup': startup.status()
+    }, 503
+
+def warm_up():
+    """
+    Per-process warm-up, run before /health reports ready
+    Starts the inference workers (each warms its own classifier) and
+    sends synthetic images through validation and classification
+    """
+    inference_executor.start()
+    for image_bytes in synthetic_images():
+        validate_upload(image_bytes)
+        inference_executor.classify(image_bytes)
+
+# Responses that never change while the process runs are serialised and
+# compressed once here; handlers only pick an encoding and check ETags
+with app.app_context():
+    PRERENDERED = {
+        'index': PrerenderedResponse(render_template('index.html'), 'text/html', 'no-cache'),
+        'info': PrerenderedResponse(app.json.dumps(build_info()), 'application/json'),
+        'catalog': PrerenderedResponse(app.json.dumps(CATALOG), 'application/json'),
+    }
+    PRERENDERED_INSTRUCTIONS = {
+        category: PrerenderedResponse(app.json.dumps({'category': category, **entry}), 'application/json')
+        for category, entry in CATALOG['categories'].items()
+    }
+
+# Warm-up runs in the background at import, except under the gunicorn
+# config, which defers it to each worker after the fork (STARTUP_DEFER=1)
+startup = Readiness(warm_up)
+if os.environ.get('STARTUP_DEFER') != '1':
+    startup.begin()
 
 if __name__ == '__main__':
     # Create upload folder if it doesn't exist
@@ -0,0 +1,366 @@
+"""
+First Aid Assistant - ASGI serving mode
+
+Serves the same /api/analyze, /api/info and /health contract as app.py,
+but as an ASGI application so one process can hold many slow uploads at
+once. The request body is parsed as it streams in: the image part's
+leading bytes are checked against known image signatures as soon as they
+arrive, so wrong files are rejected without waiting for the full upload,
+and the image header is validated before anything is decoded.
+Requests go through the same admission control as app.py before their
+body is read. Decoding and classification are handed to the inference
+executor.
+
+It also serves /api/stream, a WebSocket for live camera frames: the
+client sends each frame as a binary message and gets a JSON event back
+for it, with frames that barely differ from the last classified one
+skipped (see frame_stream.py). WebSockets need a server with WebSocket
+support, e.g. `pip install 'uvicorn[standard]'`.
+
+Run with any ASGI server, e.g.:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+import app as flask_app
+from admission import RateLimited
+from frame_stream import create_frame_stream
+from inference_executor import InferenceUnavailable
+from result_cache import content_key
+from validation import SNIFF_LENGTH, UploadRejected, sniff_image_format
+
+# Threads that wait for an admission slot; admit() blocks while queued,
+# so it must not run on the event loop
+admission_threads = ThreadPoolExecutor(
+    max_workers=flask_app.admission.max_concurrent + flask_app.admission.max_queue + 1,
+    thread_name_prefix='asgi-admission'
+)
+
+# Threads that classify admitted uploads. Admission lets at most
+# max_concurrent requests through, so work never queues here.
+analysis_threads = ThreadPoolExecutor(
+    max_workers=flask_app.admission.max_concurrent or None,
+    thread_name_prefix='asgi-analysis'
+)
+
+class ClientDisconnected(Exception):
+    """The client went away before the upload finished"""
+
+
+class HTTPError(Exception):
+    """Error response raised while reading a request"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or []
+
+
+async def send_json(send, status, payload, headers=None):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ] + (headers or []),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def decoded_events(decoder, body, more_body):
+    """Feed one body chunk to the decoder and yield the events it completes"""
+    decoder.receive_data(body)
+    if not more_body:
+        decoder.receive_data(None)
+    event = decoder.next_event()
+    while not isinstance(event, (NeedData, Epilogue)):
+        yield event
+        event = decoder.next_event()
+
+
+async def read_image_upload(scope, receive):
+    """
+    Stream a multipart body and return the bytes of its 'image' part
+
+    Other parts are discarded as they arrive. The body size is checked
+    against MAX_CONTENT_LENGTH while streaming.
+    """
+    headers = dict(scope['headers'])
+    content_type, options = parse_options_header(headers.get(b'content-type', b'').decode('latin-1'))
+    if content_type != 'multipart/form-data' or 'boundary' not in options:
+        raise HTTPError(400, 'No image uploaded')
+
+    max_length = flask_app.app.config['MAX_CONTENT_LENGTH']
+    decoder = MultipartDecoder(options['boundary'].encode('latin-1'), max_parts=32)
+    received = 0
+    chunks = None
+    image = None
+    checked = False
+
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        received += len(body)
+        if max_length is not None and received > max_length:
+            raise HTTPError(413, 'File too large. Maximum size is 16MB')
+
+        try:
+            events = list(decoded_events(decoder, body, more_body))
+        except RequestEntityTooLarge:
+            raise HTTPError(413, 'Too many or too large form parts')
+        except ValueError:
+            raise HTTPError(400, 'Malformed multipart body')
+
+        for event in events:
+            if isinstance(event, File):
+                chunks = [] if event.name == 'image' and image is None else None
+                if chunks is not None:
+                    if event.filename == '':
+                        raise HTTPError(400, 'No file selected')
+                    if not flask_app.allowed_file(event.filename):
+                        raise HTTPError(400, 'Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF, WEBP)')
+            elif isinstance(event, Data) and chunks is not None:
+                chunks.append(event.data)
+                if not checked:
+                    head = b''.join(chunks)[:SNIFF_LENGTH]
+                    fmt = sniff_image_format(head)
+                    if fmt is None:
+                        raise HTTPError(415, 'Uploaded file is not a supported image (PNG, JPG, JPEG, GIF, WEBP)')
+                    checked = fmt != '' or not event.more_data
+                if not event.more_data:
+                    image = b''.join(chunks)
+                    chunks = None
+            elif not isinstance(event, Data):
+                chunks = None
+
+    if image is None:
+        raise HTTPError(400, 'No image uploaded')
+    return image
+
+
+def log_analysis(started, status, **fields):
+    """Queue an audit record, as app.py does for its analyze endpoints"""
+    flask_app.log_analysis('analyze_injury', status, started, **fields)
+
+
+async def analyze(scope, receive, send):
+    started = time.perf_counter()
+    query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+    try:
+        fields = flask_app.requested_fields(query)
+    except ValueError as e:
+        await send_json(send, 400, {'error': str(e)})
+        log_analysis(started, 400)
+        return
+
+    loop = asyncio.get_running_loop()
+    headers = dict(scope['headers'])
+    client = flask_app.forwarded_client(
+        headers.get(b'x-forwarded-for', b'').decode('latin-1'),
+        (scope.get('client') or (None,))[0]
+    )
+    timeout = flask_app.parse_timeout(headers.get(b'x-request-timeout', b'').decode('latin-1'))
+    try:
+        ticket = await loop.run_in_executor(admission_threads, flask_app.admission.admit, client, timeout)
+    except RateLimited as e:
+        await send_json(send, 429, {'success': False, 'error': str(e)},
+                        [(b'retry-after', str(e.retry_after).encode())])
+        log_analysis(started, 429)
+        return
+    except InferenceUnavailable as e:
+        await send_json(send, 503, {'success': False, 'error': str(e)},
+                        [(b'retry-after', str(e.retry_after).encode())])
+        log_analysis(started, 503)
+        return
+    try:
+        await analyze_admitted(scope, receive, send, started, fields, ticket)
+    finally:
+        ticket.release()
+
+
+async def analyze_admitted(scope, receive, send, started, fields, ticket):
+    """Read, validate and classify an upload once admission let it in"""
+    try:
+        image_bytes = await read_image_upload(scope, receive)
+    except HTTPError as e:
+        await send_json(send, e.status, {'error': str(e)}, e.headers)
+        log_analysis(started, e.status)
+        return
+    except ClientDisconnected:
+        return
+    
+    try:
+        flask_app.validate_upload(image_bytes)
+    except UploadRejected as e:
+        await send_json(send, e.status, {'error': str(e)})
+        log_analysis(started, e.status)
+        return
+
+    loop = asyncio.get_running_loop()
+    image_hash = content_key(image_bytes)
+    try:
+        # Shed the request if its deadline passed while the body streamed in
+        ticket.check()
+        category, confidence, features = await loop.run_in_executor(
+            analysis_threads, flask_app.classify_image_bytes, image_bytes, image_hash
+        )
+    except InferenceUnavailable as e:
+        await send_json(send, 503, {'success': False, 'error': str(e)},
+                        [(b'retry-after', str(e.retry_after).encode())])
+        log_analysis(started, 503, image_sha256=image_hash)
+        return
+    except Exception as e:
+        await send_json(send, 500, {'success': False, 'error': f'An error occurred: {str(e)}'})
+        log_analysis(started, 500, image_sha256=image_hash)
+        return
+
+    flask_app.capture_upload(image_hash, image_bytes, category, confidence)
+    await send_json(send, 200, flask_app.select_fields(flask_app.build_response(category, confidence), fields))
+    log_analysis(started, 200, image_sha256=image_hash, category=category,
+                 confidence=confidence, features=features)
+
+
+async def info(scope, receive, send):
+    await send_json(send, 200, flask_app.build_info())
+
+
+async def health(scope, receive, send):
+    payload, status = flask_app.readiness()
+    await send_json(send, status, payload)
+
+
+async def liveness(scope, receive, send):
+    await send_json(send, 200, {'status': 'alive', 'service': 'first-aid-assistant'})
+
+
+def process_frame(frames, frame_bytes):
+    """Validate and process one stream frame; runs off the event loop"""
+    started = time.perf_counter()
+    try:
+        flask_app.validate_upload(frame_bytes)
+    except UploadRejected as e:
+        flask_app.log_analysis('stream', e.status, started)
+        raise
+    return frames.process(frame_bytes)
+
+
+def classify_frame(frame_bytes):
+    """
+    Classify a stream frame, with an audit record as for /api/analyze
+    Frames skipped as unchanged are not classified and not logged.
+    """
+    started = time.perf_counter()
+    key = content_key(frame_bytes)
+    try:
+        category, confidence, features = flask_app.classify_image_bytes(frame_bytes, key)
+    except InferenceUnavailable:
+        flask_app.log_analysis('stream', 503, started, image_sha256=key)
+        raise
+    except Exception:
+        flask_app.log_analysis('stream', 500, started, image_sha256=key)
+        raise
+    flask_app.log_analysis('stream', 200, started, image_sha256=key, category=category,
+                           confidence=confidence, features=features)
+    return category, confidence, features
+
+
+async def stream(scope, receive, send):
+    """
+    WebSocket: one binary message per frame, one JSON event per frame
+
+    Clients should send the next frame once the previous frame's event
+    arrives, so a slow server lowers the frame rate instead of queueing.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+    await send({'type': 'websocket.send', 'text': json.dumps({
+        'type': 'ready',
+        'catalog_version': flask_app.CATALOG_VERSION,
+    })})
+
+    frames = create_frame_stream(classify_frame)
+    max_length = flask_app.app.config['MAX_CONTENT_LENGTH']
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        frame_bytes = message.get('bytes')
+        if frame_bytes is None:
+            event = {'type': 'error', 'error': 'Frames must be sent as binary messages'}
+        elif max_length is not None and len(frame_bytes) > max_length:
+            event = {'type': 'error', 'error': 'Frame too large. Maximum size is 16MB'}
+        else:
+            try:
+                event = {'type': 'frame', **await loop.run_in_executor(None, process_frame, frames, frame_bytes)}
+            except UploadRejected as e:
+                event = {'type': 'error', 'error': str(e)}
+            except InferenceUnavailable as e:
+                event = {'type': 'error', 'error': str(e), 'retry_after': e.retry_after}
+            except Exception as e:
+                event = {'type': 'error', 'error': f'An error occurred: {str(e)}'}
+        await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+
+ROUTES = {
+    ('POST', '/api/analyze'): analyze,
+    ('GET', '/api/info'): info,
+    ('GET', '/health'): health,
+    ('GET', '/health/ready'): health,
+    ('GET', '/health/live'): liveness,
+}
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                flask_app.inference_executor.shutdown(wait=False)
+                analysis_threads.shutdown(wait=False)
+                admission_threads.shutdown(wait=False)
+                if flask_app.request_log is not None:
+                    flask_app.request_log.close()
+                if flask_app.capture_store is not None:
+                    flask_app.capture_store.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'websocket':
+        if scope['path'] == '/api/stream':
+            await stream(scope, receive, send)
+        else:
+            await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        known_path = any(path == scope['path'] for _, path in ROUTES)
+        status = 405 if known_path else 404
+        await send_json(send, status, {'error': 'Method not allowed' if known_path else 'Not found'})
+        return
+    await handler(scope, receive, send)
@@ -0,0 +1,76 @@
+"""
+Benchmark: N single /api/analyze requests vs one /api/analyze/batch
+
+Uses the Flask test client, so it measures server-side work (multipart
+parsing, decoding, classification) without network overhead. The result
+cache is disabled so every image is actually classified.
+
+Usage:
+    python benchmarks/bench_batch.py
+    python benchmarks/bench_batch.py --images 8 --size 3000x2000
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['RESULT_CACHE_MAX_BYTES'] = '0'
+os.environ['ADMISSION_CLIENT_RATE'] = '0'
+
+from PIL import Image
+
+import app as app_module
+
+
+def make_jpeg(seed, width, height):
+    """Photo-sized JPEG with distinct content per seed"""
+    bands = [Image.effect_noise((width // 8, height // 8), 20 + seed) for _ in range(3)]
+    image = Image.merge('RGB', bands).resize((width, height))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=6)
+    parser.add_argument('--size', default='4000x3000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    images = [make_jpeg(i, width, height) for i in range(args.images)]
+    app_module.app.config['MAX_BATCH_IMAGES'] = max(args.images, app_module.app.config['MAX_BATCH_IMAGES'])
+    app_module.app.config['MAX_CONTENT_LENGTH'] = None
+    client = app_module.app.test_client()
+
+    def singles():
+        for image_bytes in images:
+            response = client.post('/api/analyze', data={'image': (io.BytesIO(image_bytes), 'photo.jpg')},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200
+
+    def batch():
+        files = [(io.BytesIO(image_bytes), f'photo{i}.jpg') for i, image_bytes in enumerate(images)]
+        response = client.post('/api/analyze/batch', data={'images': files},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+
+    print(f"{args.images} images of {args.size}, {app_module.batch_executor._max_workers} batch workers")
+    results = {}
+    for name, func in (('single', singles), ('batch', batch)):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+        print(f"{name:<7} {results[name] * 1000:>8.1f} ms total")
+    print(f"speedup {results['single'] / results['batch']:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: capture store cost on the request path and for the writer
+
+Reports what capture() costs the request thread, how many captures per
+second the background writer stores in 'original' and 'preprocessed'
+mode (1920x1080 JPEGs), the bytes each mode keeps per image, and how
+long reading index.jsonl takes against walking the shard directories
+for the same store.
+
+Usage:
+    python benchmarks/bench_capture.py
+    python benchmarks/bench_capture.py --images 2000
+"""
+
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from capture_store import CaptureStore, load_index
+from classifier import InjuryClassifier
+from corpus import encode, make_photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=500)
+    parser.add_argument('--distinct', type=int, default=20, help='distinct photos; the rest get unique bytes appended')
+    args = parser.parse_args()
+
+    photos = [encode(make_photo(1920, 1080, seed=seed), 'JPEG') for seed in range(args.distinct)]
+    # Unique trailing bytes make each upload a new object without
+    # encoding hundreds of photos (JPEG decoders ignore them)
+    uploads = [photos[index % args.distinct] + index.to_bytes(4, 'big') for index in range(args.images)]
+    keys = [hashlib.sha256(upload).hexdigest() for upload in uploads]
+    classifier = InjuryClassifier()
+
+    for mode in ('original', 'preprocessed'):
+        with tempfile.TemporaryDirectory() as root:
+            store = CaptureStore(root, mode=mode, max_queue_bytes=sum(map(len, uploads)),
+                                 preprocess=classifier.preprocess_image)
+            calls = []
+            started = time.perf_counter()
+            for key, upload in zip(keys, uploads):
+                call_started = time.perf_counter()
+                store.capture(key, upload, 'cut', 0.7)
+                calls.append(time.perf_counter() - call_started)
+            store.flush()
+            elapsed = time.perf_counter() - started
+            stats = store.stats()
+            store.close()
+            print(f"{mode:<13} capture() p50 {statistics.median(calls) * 1e6:6.1f}us  "
+                  f"writer {stats['captured'] / elapsed:6.0f} images/s  "
+                  f"{stats['bytes'] / stats['captured'] / 1024:6.1f}KB per image")
+
+            started = time.perf_counter()
+            entries = load_index(root)
+            index_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            files = [name for _, _, names in os.walk(os.path.join(root, 'objects')) for name in names]
+            walk_seconds = time.perf_counter() - started
+            assert len(entries) == len(files) == args.images
+            print(f"{'':<13} list {len(entries)} captures: index {index_seconds * 1000:.1f}ms, "
+                  f"directory walk {walk_seconds * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
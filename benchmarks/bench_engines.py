@@ -0,0 +1,66 @@
+"""
+Benchmark: NumPy vs pure-Python feature engine for analyze_color_features
+
+Times the full analyze_color_features call and the engine's share of it
+(reducing the histogram to moments) for each engine across image sizes.
+The histogram itself is computed by Pillow in C for both engines, so
+its cost, which grows with the pixel count, is common to both columns.
+
+Usage:
+    python benchmarks/bench_engines.py
+    python benchmarks/bench_engines.py --repeat 7
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from classifier import InjuryClassifier
+from corpus import make_photo
+
+SIZES = ['224x224', '640x480', '1920x1080', '4000x3000']
+
+
+class FixedHistogram:
+    """Stands in for an image whose histogram is already computed"""
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def histogram(self):
+        return self._histogram
+
+
+def best_time(func, repeat):
+    """Best per-call seconds, with enough calls per run to last ~0.2s"""
+    number = max(1, int(0.2 / max(timeit.timeit(func, number=1), 1e-7)))
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per measurement (best is kept)')
+    args = parser.parse_args()
+
+    engines = {name: InjuryClassifier(engine=name) for name in ('python', 'numpy')}
+    print(f"{'size':<10} {'python':>10} {'numpy':>10} {'speedup':>8}   {'moments py':>10} {'moments np':>10} {'speedup':>8}")
+    for size in SIZES:
+        width, height = (int(v) for v in size.split('x'))
+        image = make_photo(width, height, seed=width)
+        cached = FixedHistogram(image.histogram())
+        features = {}
+        moments = {}
+        for name, classifier in engines.items():
+            features[name] = best_time(lambda: classifier.analyze_color_features(image), args.repeat)
+            moments[name] = best_time(lambda: classifier.engine.band_moments(cached), args.repeat)
+        print(f"{size:<10} {features['python'] * 1e6:>8.0f}us {features['numpy'] * 1e6:>8.0f}us"
+              f" {features['python'] / features['numpy']:>7.2f}x"
+              f"   {moments['python'] * 1e6:>8.1f}us {moments['numpy'] * 1e6:>8.1f}us"
+              f" {moments['python'] / moments['numpy']:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
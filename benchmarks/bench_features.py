@@ -0,0 +1,60 @@
+"""
+Microbenchmark for InjuryClassifier.analyze_color_features
+
+Compares the histogram-based implementation against the original
+per-pixel loop on 224x224 images (the size classify() works on).
+
+Usage:
+    python benchmarks/bench_features.py
+    python benchmarks/bench_features.py --number 200
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from classifier import InjuryClassifier
+
+
+def per_pixel_features(image):
+    """The original implementation: materialise pixels, walk them four times"""
+    pixels = list(image.getdata())
+    num_pixels = len(pixels)
+    avg_red = sum(p[0] for p in pixels) / num_pixels
+    avg_green = sum(p[1] for p in pixels) / num_pixels
+    avg_blue = sum(p[2] for p in pixels) / num_pixels
+    red_variance = sum((p[0] - avg_red) ** 2 for p in pixels) / num_pixels
+    return {
+        'avg_red': avg_red,
+        'avg_green': avg_green,
+        'avg_blue': avg_blue,
+        'red_var': red_variance,
+        'red_dominance': avg_red - (avg_green + avg_blue) / 2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=50, help='calls per timing run')
+    parser.add_argument('--size', type=int, default=224, help='square image edge in pixels')
+    args = parser.parse_args()
+
+    size = (args.size, args.size)
+    image = Image.merge('RGB', [Image.effect_noise(size, 40) for _ in range(3)])
+    classifier = InjuryClassifier()
+
+    results = {}
+    for name, func in (('per-pixel', per_pixel_features), ('histogram', classifier.analyze_color_features)):
+        best = min(timeit.repeat(lambda: func(image), number=args.number, repeat=5))
+        results[name] = best / args.number * 1e6
+        print(f"{name:<10} {results[name]:>10.1f} us/call")
+    print(f"speedup    {results['per-pixel'] / results['histogram']:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
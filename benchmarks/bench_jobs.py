@@ -0,0 +1,85 @@
+"""
+Benchmark: synchronous /api/analyze vs job mode with a slow backend
+
+A slow model is simulated by adding --model-ms of sleep to every
+classification. Reports how long a client waits for the synchronous
+response, for the 202 from POST /api/jobs, and for the job to finish
+(followed over its event stream), plus the job pool's own stats. The
+sync wait is what a proxy timeout is measured against; in job mode the
+only long-lived request is the event stream, which proxies keep open
+as long as events or keep-alives flow.
+
+Usage:
+    python benchmarks/bench_jobs.py
+    python benchmarks/bench_jobs.py --model-ms 2000 --requests 5
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['RESULT_CACHE_MAX_BYTES'] = '0'
+os.environ['NEAR_DUPLICATE_MAX_ENTRIES'] = '0'
+os.environ['ADMISSION_CLIENT_RATE'] = '0'
+os.environ['INFERENCE_WORKERS'] = '0'
+
+import app as app_module
+from corpus import encode, make_photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-ms', type=float, default=500, help='simulated extra model time per image')
+    parser.add_argument('--requests', type=int, default=8)
+    args = parser.parse_args()
+
+    slow = args.model_ms / 1000
+    classify = app_module.inference_executor.classify
+
+    def slow_classify(image_bytes):
+        time.sleep(slow)
+        return classify(image_bytes)
+
+    app_module.inference_executor.classify = slow_classify
+    client = app_module.app.test_client()
+    app_module.startup.wait(60)
+    images = [encode(make_photo(1920, 1080, seed=seed), 'JPEG') for seed in range(args.requests)]
+
+    def post(path, image_bytes):
+        return client.post(path, data={'image': (io.BytesIO(image_bytes), 'photo.jpg')},
+                           content_type='multipart/form-data')
+
+    sync = []
+    for image_bytes in images:
+        start = time.perf_counter()
+        assert post('/api/analyze', image_bytes).status_code == 200
+        sync.append(time.perf_counter() - start)
+
+    submit = []
+    finished = []
+    for image_bytes in images:
+        start = time.perf_counter()
+        response = post('/api/jobs', image_bytes)
+        submit.append(time.perf_counter() - start)
+        assert response.status_code == 202
+        body = client.get(response.get_json()['events_url']).get_data(as_text=True)
+        finished.append(time.perf_counter() - start)
+        assert 'event: done' in body, body
+
+    def ms(samples):
+        return f'{statistics.median(samples) * 1000:8.1f}ms'
+
+    print(f'simulated model time {args.model_ms:g}ms, {args.requests} requests (medians)')
+    print(f'sync /api/analyze response   {ms(sync)}')
+    print(f'POST /api/jobs 202           {ms(submit)}')
+    print(f'job finished (event stream)  {ms(finished)}')
+    print(app_module.jobs.stats())
+    app_module.jobs.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: near-duplicate index lookup time at 10k and 1M entries
+
+Fills a NearDuplicateIndex with random 64-bit hashes, then times
+lookups that hit (the query is a stored hash with up to max_distance
+bits flipped) and lookups that miss. Reports p50/p99 per lookup and the
+index's memory. Real dHashes cluster more than random ones, so treat
+the candidate counts here as a best case for bucket sizes.
+
+Usage:
+    python benchmarks/bench_near_duplicates.py
+    python benchmarks/bench_near_duplicates.py --sizes 10000 100000 --lookups 5000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from near_duplicates import NearDuplicateIndex
+
+
+def rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def time_lookups(index, queries):
+    samples = []
+    for image_hash, color in queries:
+        start = time.perf_counter()
+        index.lookup(image_hash, color)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--max-distance', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'entries':>9} {'build':>8} {'memory':>8}   {'hit p50':>8} {'hit p99':>8}   {'miss p50':>8} {'miss p99':>8}")
+    for size in args.sizes:
+        rng = random.Random(size)
+        before = rss_mb()
+        index = NearDuplicateIndex(max_entries=size, max_distance=args.max_distance)
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        start = time.perf_counter()
+        for image_hash in hashes:
+            index.add(image_hash, (128, 128, 128), ('burn', 0.65, {}))
+        build = time.perf_counter() - start
+        memory = rss_mb() - before
+
+        hits = []
+        for image_hash in rng.sample(hashes, args.lookups):
+            for bit in rng.sample(range(64), rng.randint(0, args.max_distance)):
+                image_hash ^= 1 << bit
+            hits.append((image_hash, (128, 128, 128)))
+        misses = [(rng.getrandbits(64), (128, 128, 128)) for _ in range(args.lookups)]
+        hit_times = time_lookups(index, hits)
+        miss_times = time_lookups(index, misses)
+        assert index.hits == len(hits), 'every near query should hit'
+
+        print(f"{size:>9} {build:>7.1f}s {memory:>6.0f}MB"
+              f"   {statistics.median(hit_times) * 1e6:>6.0f}us {percentile(hit_times, 0.99) * 1e6:>6.0f}us"
+              f"   {statistics.median(miss_times) * 1e6:>6.0f}us {percentile(miss_times, 0.99) * 1e6:>6.0f}us")
+        del index, hashes
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: latency under overload with and without admission control
+
+Simulates a server whose analysis stage can run `capacity` requests at
+once, each taking --service-ms, and offers it open-loop Poisson traffic
+at --load times that capacity. Without admission control every request
+waits in an unbounded queue, so latency grows for as long as the
+overload lasts. With an AdmissionController in front, requests beyond
+the queue bound are refused at once and waiting requests are shed at
+their deadline, so admitted requests keep a bounded latency.
+
+The service is simulated with sleeps so the result shows the queueing
+behaviour itself, not this machine's CPU count.
+
+Usage:
+    python benchmarks/bench_overload.py
+    python benchmarks/bench_overload.py --load 3 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(controller, capacity, service_seconds, rate, seconds, timeout):
+    """Offer Poisson arrivals for `seconds`; returns (latencies, refused, elapsed)"""
+    slots = threading.Semaphore(capacity)
+    latencies = []
+    refused = []
+    lock = threading.Lock()
+
+    def handle(arrived):
+        ticket = None
+        if controller is not None:
+            try:
+                ticket = controller.admit('bench', timeout)
+            except AdmissionRejected:
+                with lock:
+                    refused.append(time.monotonic() - arrived)
+                return
+        try:
+            with slots:
+                time.sleep(service_seconds)
+        finally:
+            if ticket is not None:
+                ticket.release()
+        with lock:
+            latencies.append(time.monotonic() - arrived)
+
+    rng = random.Random(1)
+    threads = []
+    started = time.monotonic()
+    end = started + seconds
+    next_arrival = time.monotonic()
+    while next_arrival < end:
+        time.sleep(max(0.0, next_arrival - time.monotonic()))
+        thread = threading.Thread(target=handle, args=(time.monotonic(),))
+        thread.start()
+        threads.append(thread)
+        next_arrival += rng.expovariate(rate)
+    for thread in threads:
+        thread.join()
+    return latencies, refused, time.monotonic() - started
+
+
+def report(label, latencies, refused, elapsed):
+    print(f'{label:<18} served {len(latencies) / elapsed:6.1f}/s  refused {len(refused):5d}  '
+          f'p50 {percentile(latencies, 0.5) * 1000:7.0f}ms  '
+          f'p99 {percentile(latencies, 0.99) * 1000:7.0f}ms  '
+          f'max {max(latencies) * 1000:7.0f}ms')
+    if refused:
+        print(f'{"":<18} refusals answered in p99 {percentile(refused, 0.99) * 1000:.0f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capacity', type=int, default=4, help='requests the service runs at once')
+    parser.add_argument('--service-ms', type=float, default=20)
+    parser.add_argument('--load', type=float, default=2.0, help='offered load as a multiple of capacity')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--queue', type=int, default=8, help='admission wait queue bound')
+    parser.add_argument('--queue-timeout', type=float, default=0.5)
+    parser.add_argument('--client-timeout', type=float, default=None, help='X-Request-Timeout each client sends')
+    args = parser.parse_args()
+
+    service_seconds = args.service_ms / 1000
+    rate = args.load * args.capacity / service_seconds
+    print(f'capacity {args.capacity / service_seconds:.0f}/s, offered {rate:.0f}/s for {args.seconds:g}s')
+
+    report('no admission', *run(None, args.capacity, service_seconds, rate, args.seconds, None))
+
+    controller = AdmissionController(
+        max_concurrent=args.capacity, max_queue=args.queue,
+        queue_timeout=args.queue_timeout, client_rate=0,
+    )
+    report('admission control', *run(controller, args.capacity, service_seconds, rate, args.seconds,
+                                     args.client_timeout))
+    stats = controller.stats()
+    print(f'{"":<18} queue_full {stats["queue_full"]}, shed at deadline {stats["shed"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark for InjuryClassifier.preprocess_image
+
+Compares the reduced-resolution decode path against the old
+"decode everything, then resize" pipeline across formats and sizes.
+Each case runs in a fresh subprocess so peak RSS is measured per case.
+
+Usage:
+    python benchmarks/bench_preprocess.py
+    python benchmarks/bench_preprocess.py --sizes 4000x3000 --repeat 5
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+DEFAULT_SIZES = ['1024x768', '4000x3000', '8000x6000']
+
+
+def make_image_bytes(fmt, width, height):
+    """Create a synthetic photo-like image (smooth gradient plus noise)"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    if fmt == 'GIF':
+        image = image.convert('P')
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def legacy_preprocess(image_bytes):
+    """The original pipeline: full decode, convert, then resize"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image.resize((224, 224))
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB"""
+    # ru_maxrss survives execve on Linux, so a child would report the
+    # parent's peak; VmHWM belongs to the new address space only.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(pipeline, path, repeat):
+    """Run one case in this process and return its measurements"""
+    from classifier import InjuryClassifier
+
+    with open(path, 'rb') as f:
+        image_bytes = f.read()
+    classifier = InjuryClassifier()
+    # Raise the cap so the largest synthetic inputs are still measured
+    classifier.max_decode_pixels = float('inf')
+    preprocess = legacy_preprocess if pipeline == 'legacy' else classifier.preprocess_image
+
+    baseline_rss = peak_rss_kb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        preprocess(image_bytes)
+        timings.append(time.perf_counter() - start)
+    peak_rss = peak_rss_kb()
+
+    timings.sort()
+    return {
+        'pipeline': pipeline,
+        'input_bytes': len(image_bytes),
+        'median_ms': timings[len(timings) // 2] * 1000,
+        'peak_rss_delta_kb': peak_rss - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--formats', nargs='+', default=FORMATS)
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--case', nargs=2, metavar=('PIPELINE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(*args.case, args.repeat)))
+        return
+
+    print(f"{'format':<6} {'size':>10} {'input':>9}   {'legacy ms':>9} {'new ms':>8}   {'legacy RSS':>10} {'new RSS':>9}")
+    for fmt in args.formats:
+        for size in args.sizes:
+            width, height = (int(v) for v in size.split('x'))
+            # Generate the input here so the child's peak RSS only reflects decoding
+            with tempfile.NamedTemporaryFile(suffix='.' + fmt.lower()) as f:
+                f.write(make_image_bytes(fmt, width, height))
+                f.flush()
+                results = {}
+                for pipeline in ('legacy', 'reduced'):
+                    output = subprocess.run(
+                        [sys.executable, __file__, '--repeat', str(args.repeat), '--case', pipeline, f.name],
+                        check=True, capture_output=True, text=True,
+                    ).stdout
+                    results[pipeline] = json.loads(output.strip().splitlines()[-1])
+            legacy, reduced = results['legacy'], results['reduced']
+            print(f"{fmt:<6} {size:>10} {legacy['input_bytes'] // 1024:>7}KB   "
+                  f"{legacy['median_ms']:>9.1f} {reduced['median_ms']:>8.1f}   "
+                  f"{legacy['peak_rss_delta_kb'] // 1024:>8}MB {reduced['peak_rss_delta_kb'] // 1024:>7}MB")
+
+
+if __name__ == '__main__':
+    main()
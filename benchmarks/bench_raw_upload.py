@@ -0,0 +1,76 @@
+"""
+Benchmark: full-photo uploads vs browser-downscaled /api/analyze/raw
+
+For each resolution, a photo-like JPEG is posted to /api/analyze as the
+page used to, then downscaled to the model input size (with Pillow,
+standing in for the browser canvas) and posted to /api/analyze/raw as
+raw RGBA (what the page's canvas produces) and as PNG. Reports upload bytes and server CPU time per request.
+Uses the Flask test client with the result cache off and inference
+inline, so CPU time is everything the server does for the request.
+
+Usage:
+    python benchmarks/bench_raw_upload.py
+    python benchmarks/bench_raw_upload.py --repeat 20
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['RESULT_CACHE_MAX_BYTES'] = '0'
+os.environ['ADMISSION_CLIENT_RATE'] = '0'
+os.environ['INFERENCE_WORKERS'] = '0'
+
+from PIL import Image
+
+import app as app_module
+from corpus import encode, make_photo
+
+
+def cpu_per_request(send, repeat):
+    send()  # warm up
+    start = time.process_time()
+    for _ in range(repeat):
+        response = send()
+        assert response.status_code == 200, response.get_json()
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help='requests per measurement')
+    args = parser.parse_args()
+
+    client = app_module.app.test_client()
+    size = app_module.classifier.target_size
+    print(f"{'photo':<10} {'upload':>10} {'raw RGBA':>9} {'PNG':>9}   {'cpu upload':>10} {'cpu raw':>8} {'cpu PNG':>8}")
+    for resolution in ('640x480', '1920x1080', '4000x3000'):
+        width, height = (int(v) for v in resolution.split('x'))
+        photo = make_photo(width, height, seed=width)
+        jpeg = encode(photo, 'JPEG')
+        small = photo.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+        pixels = small.convert('RGBA').tobytes()
+        buffer = io.BytesIO()
+        small.save(buffer, format='PNG')
+        png = buffer.getvalue()
+
+        upload = cpu_per_request(lambda: client.post(
+            '/api/analyze?mode=compact',
+            data={'image': (io.BytesIO(jpeg), 'photo.jpg')},
+            content_type='multipart/form-data',
+        ), args.repeat)
+        raw = cpu_per_request(lambda: client.post(
+            '/api/analyze/raw?mode=compact', data=pixels, content_type='application/octet-stream'
+        ), args.repeat)
+        as_png = cpu_per_request(lambda: client.post(
+            '/api/analyze/raw?mode=compact', data=png, content_type='image/png'
+        ), args.repeat)
+        print(f"{resolution:<10} {len(jpeg) // 1024:>8}KB {len(pixels) // 1024:>7}KB {len(png) // 1024:>7}KB"
+              f"   {upload * 1000:>8.1f}ms {raw * 1000:>6.1f}ms {as_png * 1000:>6.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: request log overhead per request
+
+Times what a request thread pays to record one audit entry with
+RequestLog.log() against writing the same JSON line synchronously
+(write + flush per record, and write + flush + fsync), then the
+end-to-end cost on /api/analyze with the log on and off. The analyze
+runs use an upload the result cache already holds, so the request
+itself is cheap and the log's share is visible.
+
+Usage:
+    python benchmarks/bench_request_log.py
+    python benchmarks/bench_request_log.py --records 50000
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['ADMISSION_CLIENT_RATE'] = '0'
+os.environ['INFERENCE_WORKERS'] = '0'
+
+from corpus import encode, make_photo
+from request_log import RequestLog
+
+RECORD = {
+    'ts': 1760000000.123, 'endpoint': 'analyze_injury', 'status': 200, 'latency_ms': 3.21,
+    'image_sha256': 'ab' * 32, 'category': 'cut', 'confidence': 0.72,
+    'features': {'avg_red': 181.2, 'avg_green': 92.4, 'avg_blue': 88.1, 'red_dominance': 91.0,
+                 'red_var': 1523.4, 'green_var': 611.2, 'blue_var': 540.9, 'brightness': 120.6},
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def time_calls(call, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label, samples):
+    print(f'{label:<28} p50 {percentile(samples, 0.5) * 1e6:8.1f}us  p99 {percentile(samples, 0.99) * 1e6:8.1f}us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--fsync-records', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = RequestLog(os.path.join(directory, 'async.jsonl'))
+        started = time.perf_counter()
+        report('RequestLog.log()', time_calls(lambda: log.log(dict(RECORD)), args.records))
+        log.close()
+        stats = log.stats()
+        # A tight loop offers records far faster than any server would,
+        # so this also shows the backpressure path
+        print(f"{'':<28} {stats['written']} written, {stats['sampled_out']} sampled out, "
+              f"{stats['dropped']} dropped; {stats['written'] / (time.perf_counter() - started):.0f} records/s")
+
+        with open(os.path.join(directory, 'sync.jsonl'), 'ab') as sync_file:
+            def write_sync():
+                sync_file.write(json.dumps(RECORD).encode() + b'\n')
+                sync_file.flush()
+
+            def write_fsync():
+                write_sync()
+                os.fsync(sync_file.fileno())
+
+            report('sync write + flush', time_calls(write_sync, args.records))
+            report('sync write + flush + fsync', time_calls(write_fsync, args.fsync_records))
+
+        import app as app_module
+        client = app_module.app.test_client()
+        app_module.startup.wait(60)
+        image_bytes = encode(make_photo(640, 480, seed=1), 'JPEG')
+
+        def analyze():
+            response = client.post('/api/analyze', data={'image': (io.BytesIO(image_bytes), 'photo.jpg')},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200
+
+        analyze()  # fill the result cache
+        report('/api/analyze, log off', time_calls(analyze, args.requests))
+        app_module.request_log = RequestLog(os.path.join(directory, 'app.jsonl'))
+        report('/api/analyze, log on', time_calls(analyze, args.requests))
+        app_module.request_log.close()
+        print(app_module.request_log.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: classification throughput vs worker count per execution mode
+
+Runs the InferenceExecutor in thread, interpreter and process mode with
+1..N workers and reports images per second, with twice as many caller
+threads as workers keeping it busy. Uploads are 1920x1080 JPEGs, so
+each task decodes (draft mode), resizes and extracts features.
+
+Thread mode only scales on a free-threaded build (python3.14t) or as
+far as Pillow releases the GIL; interpreter mode needs Python 3.14 and
+C extensions that load in sub-interpreters, and reports the mode it
+actually ran in when it fell back to processes.
+
+Usage:
+    python benchmarks/bench_scaling.py
+    python benchmarks/bench_scaling.py --workers 1 2 4 8 --images 200
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from classifier import create_classifier
+from corpus import encode, make_photo
+from inference_executor import MODES, InferenceExecutor, gil_enabled
+
+
+def throughput(executor, uploads, callers):
+    """Images per second with `callers` threads sharing the uploads"""
+    next_index = iter(range(len(uploads)))
+    lock = threading.Lock()
+
+    def call():
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            executor.classify(uploads[index])
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(uploads) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cores = os.cpu_count() or 1
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, max(1, cores // 2), cores}))
+    parser.add_argument('--images', type=int, default=80)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    args = parser.parse_args()
+
+    uploads = [encode(make_photo(1920, 1080, seed=seed % 8), 'JPEG') for seed in range(args.images)]
+    print(f'Python {sys.version.split()[0]}, {cores} CPUs, GIL {"enabled" if gil_enabled() else "disabled"}')
+    print(f"{'mode':<12} {'ran as':<12} {'workers':>7} {'images/s':>9} {'speedup':>8}")
+    classifier = create_classifier()
+    classifier.warm_up()
+    for mode in args.modes:
+        baseline = None
+        for workers in args.workers:
+            executor = InferenceExecutor(workers=workers, max_queue=workers * 2, deadline=120,
+                                         classifier=classifier, mode=mode)
+            executor.start()
+            throughput(executor, uploads[:workers * 2], workers * 2)  # warm every worker
+            rate = throughput(executor, uploads, workers * 2)
+            ran_as = executor.stats()['mode']
+            executor.shutdown()
+            baseline = baseline or rate
+            print(f'{mode:<12} {ran_as:<12} {workers:>7} {rate:>9.1f} {rate / baseline:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
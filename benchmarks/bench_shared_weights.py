@@ -0,0 +1,138 @@
+"""
+Benchmark: per-worker memory with copied vs shared model weights
+
+Builds an ONNX classifier with large fully connected layers (about
+--megabytes of float32 weights), exports it with shared_weights.py, and
+for each variant starts --workers processes that each load the
+classifier and classify a few images, the way inference workers do.
+Every worker then reports its memory from /proc/self/smaps_rollup:
+
+    private   pages only this worker uses (what one more worker costs)
+    shared    pages it shares with other processes
+    pss       its proportional share; summed over workers, the real total
+
+and the mean classify latency, since mapped weights run without
+ONNX Runtime's weight pre-packing. Needs onnx and onnxruntime; Linux.
+
+Usage:
+    python benchmarks/bench_shared_weights.py
+    python benchmarks/bench_shared_weights.py --workers 8 --megabytes 256
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared_weights import export_shared_weights, process_memory
+from test_api import create_test_image
+
+MB = 1024 * 1024
+
+
+def build_model(path, megabytes):
+    """average colour -> dense hidden layers -> 5 scores, ~megabytes of weights"""
+    import numpy as np
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    hidden = 2048
+    layers = max(1, round(megabytes * MB / (hidden * hidden * 4)))
+    rng = np.random.default_rng(0)
+    nodes = [
+        helper.make_node('GlobalAveragePool', ['image'], ['pooled']),
+        helper.make_node('Flatten', ['pooled'], ['h0']),
+        helper.make_node('Gemm', ['h0', 'w_in'], ['a0']),
+        helper.make_node('Relu', ['a0'], ['r0']),
+    ]
+    initializers = [numpy_helper.from_array(rng.standard_normal((3, hidden), dtype=np.float32), 'w_in')]
+    for layer in range(layers):
+        weights = rng.standard_normal((hidden, hidden), dtype=np.float32) / hidden ** 0.5
+        initializers.append(numpy_helper.from_array(weights, f'w{layer}'))
+        nodes += [
+            helper.make_node('Gemm', [f'r{layer}', f'w{layer}'], [f'a{layer + 1}']),
+            helper.make_node('Relu', [f'a{layer + 1}'], [f'r{layer + 1}']),
+        ]
+    initializers.append(numpy_helper.from_array(rng.standard_normal((hidden, 5), dtype=np.float32), 'w_out'))
+    nodes += [
+        helper.make_node('Gemm', [f'r{layers}', 'w_out'], ['logits']),
+        helper.make_node('Softmax', ['logits'], ['probabilities'], axis=1),
+    ]
+    graph = helper.make_graph(
+        nodes, 'dense_injury_classifier',
+        [helper.make_tensor_value_info('image', TensorProto.FLOAT, [1, 3, 224, 224])],
+        [helper.make_tensor_value_info('probabilities', TensorProto.FLOAT, [1, 5])],
+        initializer=initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+    return sum(tensor.ByteSize() for tensor in initializers)
+
+
+def worker(model_path, ready, go, results):
+    from onnx_backend import OnnxInjuryClassifier
+
+    classifier = OnnxInjuryClassifier(model_path)
+    images = [create_test_image(color).getvalue() for color in ('red', 'blue', 'normal')] * 10
+    start = time.perf_counter()
+    for image_bytes in images:
+        classifier.classify(image_bytes)
+    latency = (time.perf_counter() - start) / len(images)
+    # Measure only once every worker is loaded, so sharing is visible
+    ready.release()
+    go.wait()
+    results.put((process_memory(), latency))
+
+
+def measure(model_path, workers):
+    context = multiprocessing.get_context('spawn')
+    ready = context.Semaphore(0)
+    go = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(model_path, ready, go, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    go.set()
+    reports = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--megabytes', type=int, default=128, help='approximate size of the weights')
+    args = parser.parse_args()
+
+    if process_memory() is None:
+        sys.exit('This benchmark reads /proc/self/smaps_rollup (Linux only)')
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain_path = os.path.join(directory, 'dense.onnx')
+        weight_bytes = build_model(plain_path, args.megabytes)
+        shared_path = export_shared_weights(plain_path)
+        print(f"{args.workers} worker processes, {weight_bytes / MB:.0f} MB of weights\n")
+        print(f"{'weights':<8} {'private MB':>11} {'shared MB':>10} {'pss MB':>8} {'total pss MB':>13} {'classify ms':>12}")
+        for name, path in (('copied', plain_path), ('shared', shared_path)):
+            reports = measure(path, args.workers)
+            memory = [report[0] for report in reports]
+
+            def mean(key):
+                return sum(usage[key] for usage in memory) / len(memory) / MB
+
+            latency = sum(report[1] for report in reports) / len(reports) * 1000
+            total = sum(usage['pss'] for usage in memory) / MB
+            print(f"{name:<8} {mean('private'):>11.1f} {mean('shared'):>10.1f} {mean('pss'):>8.1f} "
+                  f"{total:>13.1f} {latency:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Load test: many slow uploads against gunicorn+Flask vs the ASGI mode
+
+Starts each server locally, opens --clients concurrent uploads that
+trickle their body at --rate bytes/sec (a slow mobile client), and
+meanwhile probes /health. Reports how many uploads completed, their
+latency, and /health latency while the uploads were in flight.
+
+Usage:
+    python benchmarks/bench_slow_uploads.py
+    python benchmarks/bench_slow_uploads.py --clients 200 --rate 20000
+Requires gunicorn and uvicorn to be installed.
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+SERVERS = {
+    'gunicorn': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'app:app'
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--host', '127.0.0.1',
+        '--port', str(port), '--log-level', 'warning', 'asgi:app'
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_upload_image(kilobytes):
+    """Incompressible PNG of roughly the requested size"""
+    edge = max(16, int((kilobytes * 1024 / 3) ** 0.5))
+    image = Image.merge('RGB', [Image.effect_noise((edge, edge), 64) for _ in range(3)])
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def build_upload(image_bytes):
+    boundary = 'benchboundary'
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="photo.png"\r\n'
+        f'Content-Type: image/png\r\n\r\n'
+    ).encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    head = (
+        f'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+        f'Content-Type: multipart/form-data; boundary={boundary}\r\nContent-Length: {len(body)}\r\n\r\n'
+    ).encode()
+    return head, body
+
+
+async def read_status(reader):
+    status_line = await reader.readline()
+    await reader.read()
+    return int(status_line.split()[1]) if status_line else 0
+
+
+async def slow_upload(port, head, body, rate, timeout):
+    """Send an upload in small pieces at `rate` bytes/sec"""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(head)
+        piece = max(1, rate // 10)
+        for offset in range(0, len(body), piece):
+            writer.write(body[offset:offset + piece])
+            await writer.drain()
+            await asyncio.sleep(0.1)
+        status = await asyncio.wait_for(read_status(reader), timeout)
+        writer.close()
+        return status, time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError):
+        return 0, time.perf_counter() - start
+
+
+async def probe_health(port, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+            await asyncio.wait_for(read_status(reader), 10)
+            writer.close()
+            latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.TimeoutError):
+            latencies.append(float('inf'))
+        await asyncio.sleep(0.2)
+
+
+async def run_load(port, clients, rate, timeout, image_kb):
+    head, body = build_upload(make_upload_image(image_kb))
+    stop = asyncio.Event()
+    health = []
+    prober = asyncio.create_task(probe_health(port, stop, health))
+    results = await asyncio.gather(*(slow_upload(port, head, body, rate, timeout) for _ in range(clients)))
+    stop.set()
+    await prober
+    return results, health
+
+
+def wait_for_server(port, deadline=20):
+    end = time.time() + deadline
+    while time.time() < end:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--rate', type=int, default=200_000, help='bytes/sec per client')
+    parser.add_argument('--image-kb', type=int, default=1000, help='upload size')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS))
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients uploading {args.image_kb} KB at {args.rate // 1000} KB/s, "
+          f"{args.workers} server workers")
+    print(f"{'server':<10} {'ok':>5} {'failed':>6} {'upload p50':>11} {'upload p99':>11} {'health p50':>11} {'health max':>11}")
+    for name in args.servers:
+        port = free_port()
+        env = dict(os.environ, INFERENCE_WORKERS='1')
+        server = subprocess.Popen(SERVERS[name](port, args.workers), cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_server(port)
+            results, health = asyncio.run(run_load(port, args.clients, args.rate, args.timeout, args.image_kb))
+        finally:
+            server.terminate()
+            server.wait(10)
+        ok = [elapsed for status, elapsed in results if status == 200]
+        print(f"{name:<10} {len(ok):>5} {len(results) - len(ok):>6} "
+              f"{percentile(ok, 0.5):>10.2f}s {percentile(ok, 0.99):>10.2f}s "
+              f"{percentile(health, 0.5) * 1000:>9.0f}ms {max(health, default=0) * 1000:>9.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: process startup, warm-up and first-request latency
+
+Each case runs in a fresh subprocess that imports app.py and sends
+photo uploads through the Flask test client (result cache and
+near-duplicate index off, so every request is classified):
+
+    cold   no warm-up (STARTUP_DEFER=1, WARMUP_IMAGES=0); the first
+           request starts the inference workers and loads decoders
+    warm   default startup; requests are sent once /health is ready
+
+Reports import time, time until ready, and the latency of the first
+three requests.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --workers 0 --runs 5
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+CASES = {
+    'cold': {'STARTUP_DEFER': '1', 'WARMUP_IMAGES': '0'},
+    'warm': {},
+}
+
+
+def run_case(requests):
+    """Runs inside the subprocess; prints one JSON line"""
+    started = time.perf_counter()
+    import app as app_module
+    imported = time.perf_counter()
+    client = app_module.app.test_client()
+    if os.environ.get('STARTUP_DEFER') != '1':
+        while client.get('/health').status_code != 200:
+            time.sleep(0.005)
+    ready = time.perf_counter()
+
+    from corpus import encode, make_photo
+    latencies = []
+    for seed in range(requests):
+        image_bytes = encode(make_photo(1920, 1080, seed=seed), 'JPEG')
+        start = time.perf_counter()
+        response = client.post('/api/analyze', data={'image': (io.BytesIO(image_bytes), 'photo.jpg')},
+                               content_type='multipart/form-data')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+    app_module.inference_executor.shutdown(wait=False)
+    print(json.dumps({
+        'import': imported - started,
+        'ready': ready - started,
+        'requests': latencies,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2, help='INFERENCE_WORKERS for every case')
+    parser.add_argument('--runs', type=int, default=3, help='subprocesses per case (median is reported)')
+    parser.add_argument('--requests', type=int, default=3)
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.requests)
+        return
+
+    print(f'INFERENCE_WORKERS={args.workers}, median of {args.runs} runs')
+    print(f"{'case':<6} {'import':>8} {'ready':>8}   " + '  '.join(f'{f"request {i + 1}":>10}' for i in range(args.requests)))
+    for case, overrides in CASES.items():
+        env = dict(os.environ, RESULT_CACHE_MAX_BYTES='0', NEAR_DUPLICATE_MAX_ENTRIES='0',
+                   INFERENCE_WORKERS=str(args.workers))
+        env.pop('STARTUP_DEFER', None)
+        env.update(overrides)
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--case', case, '--requests', str(args.requests)],
+                env=env, capture_output=True, text=True, check=True, cwd=HERE,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        median = lambda values: statistics.median(values) * 1000
+        requests = '  '.join(f"{median([r['requests'][i] for r in results]):>8.0f}ms" for i in range(args.requests))
+        print(f"{case:<6} {median([r['import'] for r in results]):>6.0f}ms"
+              f" {median([r['ready'] for r in results]):>6.0f}ms   {requests}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: requests/sec for the static endpoints, before and after pre-rendering
+
+"before" re-creates the original handlers (render the template / build
+and jsonify the dict on every request, no compression, no ETag);
+"after" is the current pre-rendered handler, with a gzip-accepting
+client and with a revalidating client that gets 304s. Uses the Flask
+test client, so numbers exclude network time.
+
+Usage:
+    python benchmarks/bench_static.py
+    python benchmarks/bench_static.py --seconds 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import jsonify, render_template
+
+import app as app_module
+
+app = app_module.app
+app.add_url_rule('/legacy/', 'legacy_index', lambda: render_template('index.html'))
+app.add_url_rule('/legacy/api/info', 'legacy_info', lambda: jsonify(app_module.build_info()))
+app.add_url_rule('/legacy/api/catalog', 'legacy_catalog', lambda: jsonify(app_module.CATALOG))
+
+
+def requests_per_second(client, path, headers, seconds):
+    count = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        client.get(path, headers=headers)
+        count += 1
+    return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=1.0, help='time per measurement')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    print(f"{'endpoint':<14} {'before':>9} {'after gzip':>11} {'after 304':>10}   {'bytes before':>12} {'bytes gzip':>10}")
+    for path in ('/', '/api/info', '/api/catalog'):
+        gzip_headers = {'Accept-Encoding': 'gzip'}
+        etag = client.get(path, headers=gzip_headers).headers['ETag']
+        before = requests_per_second(client, '/legacy' + path, {}, args.seconds)
+        after = requests_per_second(client, path, gzip_headers, args.seconds)
+        revalidate = requests_per_second(client, path, {**gzip_headers, 'If-None-Match': etag}, args.seconds)
+        size_before = len(client.get('/legacy' + path).get_data())
+        size_after = len(client.get(path, headers=gzip_headers).get_data())
+        print(f"{path:<14} {before:>7.0f}/s {after:>9.0f}/s {revalidate:>8.0f}/s   {size_before:>12} {size_after:>10}")
+
+
+if __name__ == '__main__':
+    main()
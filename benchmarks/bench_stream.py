@@ -0,0 +1,76 @@
+"""
+Benchmark: server CPU for a live camera stream, with and without
+perceptual-hash frame skipping
+
+Simulates a kiosk camera: 640x480 JPEG frames at a fixed frame rate,
+each with sensor noise and a pixel or two of hand shake, and a new
+scene every few seconds. Frames go through FrameStream with the
+application's classify path (result cache off, inference inline), so
+CPU time covers hashing, decoding and classification.
+
+Usage:
+    python benchmarks/bench_stream.py
+    python benchmarks/bench_stream.py --seconds 20 --scene-seconds 5
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['RESULT_CACHE_MAX_BYTES'] = '0'
+os.environ['INFERENCE_WORKERS'] = '0'
+
+from PIL import Image, ImageChops
+
+import app as app_module
+from corpus import make_photo
+from frame_stream import FrameStream
+
+
+def make_frames(seconds, fps, scene_seconds, width=640, height=480):
+    rng = random.Random(0)
+    frames = []
+    scene = None
+    for index in range(int(seconds * fps)):
+        if index % int(scene_seconds * fps) == 0:
+            scene = make_photo(width, height, seed=index)
+        shaken = ImageChops.offset(scene, rng.randint(-2, 2), rng.randint(-2, 2))
+        noise = Image.effect_noise((width, height), 12).convert('RGB')
+        frame = Image.blend(shaken, noise, 0.06)
+        buffer = io.BytesIO()
+        frame.save(buffer, format='JPEG', quality=80)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def run(frames, skip_distance):
+    stream = FrameStream(app_module.classify_image_bytes, skip_distance=skip_distance)
+    start = time.process_time()
+    for frame in frames:
+        stream.process(frame)
+    return time.process_time() - start, stream.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10, help='length of the simulated stream')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--scene-seconds', type=float, default=3, help='seconds between scene changes')
+    args = parser.parse_args()
+
+    frames = make_frames(args.seconds, args.fps, args.scene_seconds)
+    print(f'{len(frames)} frames, {args.fps} fps, new scene every {args.scene_seconds}s')
+    print(f"{'skip distance':<14} {'classified':>10} {'cpu total':>10} {'cpu/frame':>10} {'cpu per stream-second':>22}")
+    for skip_distance in (-1, 6):
+        cpu, stats = run(frames, skip_distance)
+        label = 'off' if skip_distance < 0 else str(skip_distance)
+        print(f"{label:<14} {stats['analyzed']:>10} {cpu * 1000:>8.0f}ms {cpu / len(frames) * 1000:>8.2f}ms"
+              f" {cpu / args.seconds * 1000:>20.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Synthetic image corpus for benchmarks
+
+Images are generated deterministically (seeded), so runs on the same
+machine see identical inputs and results can be compared to a baseline.
+They look roughly like photos: smooth colour regions plus fine texture,
+which matters because flat colours compress and decode unrealistically
+fast.
+"""
+
+import io
+import os
+import random
+
+from PIL import Image, ImageFilter
+
+FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+RESOLUTIONS = ['640x480', '1920x1080', '4000x3000']
+
+
+def make_photo(width, height, seed=0):
+    """Photo-like RGB image of the given size"""
+    rng = random.Random(seed)
+    # Coarse random colours, blown up for smooth regions
+    coarse = Image.frombytes('RGB', (16, 12), rng.randbytes(16 * 12 * 3))
+    image = coarse.resize((width, height), Image.Resampling.BICUBIC)
+    # Fine texture so encoders cannot cheat
+    texture = Image.frombytes('L', (256, 256), rng.randbytes(256 * 256))
+    texture = texture.resize((width, height), Image.Resampling.NEAREST).filter(ImageFilter.BoxBlur(1))
+    return Image.blend(image, Image.merge('RGB', (texture, texture, texture)), 0.15)
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'GIF':
+        image = image.convert('P', palette=Image.Palette.ADAPTIVE)
+    image.save(buffer, format=fmt, **({'quality': 90} if fmt in ('JPEG', 'WEBP') else {}))
+    return buffer.getvalue()
+
+
+def build_corpus(directory, formats=FORMATS, resolutions=RESOLUTIONS):
+    """
+    Write the corpus to directory (reusing files already there)
+    Returns a list of (name, path) pairs
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.split('x'))
+        image = None
+        for fmt in formats:
+            name = f'{resolution}.{fmt.lower()}'
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                if image is None:
+                    image = make_photo(width, height, seed=width * height)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(encode(image, fmt))
+                os.replace(path + '.tmp', path)
+            corpus.append((name, path))
+    return corpus
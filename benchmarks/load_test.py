@@ -0,0 +1,338 @@
+"""
+Open-loop load test and capacity report
+
+Starts the server locally (or targets --url), then offers POST
+/api/analyze at a fixed arrival rate for --duration seconds per step,
+raising the rate step by step until a latency or error SLO breaks.
+Arrivals are open loop: each request is sent at its scheduled time
+whether or not earlier ones have finished, and latency is measured from
+that scheduled time, so a saturated server shows up as growing latency
+instead of a politely slowed-down client.
+
+Uploads are drawn from a weighted mix of generated images:
+
+    small   224x224 PNGs in the style of test_api.create_test_image
+    photo   1920x1080 JPEGs (corpus.make_photo)
+    large   4000x3000 JPEGs
+
+Each upload gets unique trailing bytes so the result cache never serves
+it; a locally started server also runs with the near-duplicate index
+and per-client rate limit off, so every request is really classified.
+
+For each step the report has offered and achieved rate, p50/p95/p99
+latency, error rate, and the server's CPU (cores used) and peak RSS
+summed over its process tree (read from /proc, Linux only).
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --start-rate 5 --step 5 --max-rate 100 --duration 20
+    python benchmarks/load_test.py --mix small=1,photo=1 --slo-p99 1.0 --output capacity.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from corpus import encode, make_photo
+from test_api import create_test_image
+
+SERVERS = {
+    'gunicorn': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+        '--bind', f'127.0.0.1:{port}', 'app:app'
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--host', '127.0.0.1',
+        '--port', str(port), '--log-level', 'warning', 'asgi:app'
+    ],
+}
+
+BOUNDARY = 'loadtestboundary'
+
+
+def make_images(kind, variants):
+    """(filename, bytes) uploads of one kind of the image mix"""
+    if kind == 'small':
+        colors = ['red', 'blue', 'normal']
+        return [(f'small-{index}.png', create_test_image(colors[index % 3]).getvalue())
+                for index in range(variants)]
+    size = {'photo': (1920, 1080), 'large': (4000, 3000)}[kind]
+    return [(f'{kind}-{index}.jpg', encode(make_photo(*size, seed=index), 'JPEG'))
+            for index in range(variants)]
+
+
+def parse_mix(text):
+    """'small=0.6,photo=0.4' -> {'small': 0.6, 'photo': 0.4}"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in ('small', 'photo', 'large'):
+            raise argparse.ArgumentTypeError(f"unknown image kind '{kind}' (small, photo, large)")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def build_request(host, path, filename, image_bytes, serial):
+    # JPEG and PNG decoders ignore bytes after the end marker, so this
+    # makes every upload unique to the result cache at no decode cost
+    image_bytes = image_bytes + serial.to_bytes(8, 'big')
+    content_type = 'image/png' if filename.endswith('.png') else 'image/jpeg'
+    body = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + image_bytes + f'\r\n--{BOUNDARY}--\r\n'.encode()
+    head = (
+        f'POST {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n'
+        f'Content-Type: multipart/form-data; boundary={BOUNDARY}\r\nContent-Length: {len(body)}\r\n\r\n'
+    ).encode()
+    return head + body
+
+
+async def send(host, port, request, timeout):
+    """Send one request on a fresh connection; returns the status (0 on failure)"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(request)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1]) if status_line else 0
+    except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+        return 0
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def process_tree(pid):
+    """pid and all its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    # Field 4 is the parent pid; split after the ')' of the name
+                    ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def tree_usage(pid):
+    """(CPU seconds, RSS bytes) summed over a process tree; None off Linux"""
+    if pid is None or not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    page = os.sysconf('SC_PAGE_SIZE')
+    cpu = rss = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{member}/statm') as statm:
+                rss += int(statm.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+        # utime and stime are fields 14 and 15 of /proc/pid/stat
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, rss
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+async def run_step(target, rate, duration, uploads, weights, timeout, server_pid, rng, serial):
+    """Offer `rate` requests/sec for `duration` seconds; returns the step's report"""
+    host, port, path = target
+    results = []
+    peak_rss = 0
+
+    async def one(scheduled, request):
+        status = await send(host, port, request, timeout)
+        results.append((status, time.perf_counter() - scheduled))
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            usage = tree_usage(server_pid)
+            if usage:
+                peak_rss = max(peak_rss, usage[1])
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample_rss())
+    usage_before = tree_usage(server_pid)
+    tasks = []
+    started = time.perf_counter()
+    scheduled = started
+    while scheduled < started + duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        filename, image_bytes = rng.choices(uploads, weights)[0]
+        serial += 1
+        # Build the request before the timer so client work is not counted
+        request = build_request(host, path, filename, image_bytes, serial)
+        tasks.append(asyncio.create_task(one(scheduled, request)))
+        scheduled += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    usage_after = tree_usage(server_pid)
+    sampler.cancel()
+
+    latencies = [latency for status, latency in results if status == 200]
+    errors = len(results) - len(latencies)
+    step = {
+        'offered_rps': rate,
+        'requests': len(results),
+        'achieved_rps': round(len(latencies) / elapsed, 2),
+        'error_rate': round(errors / max(len(results), 1), 4),
+        'statuses': {str(status): sum(1 for s, _ in results if s == status) for status in sorted({s for s, _ in results})},
+    }
+    for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        value = percentile(latencies, fraction)
+        step[f'{name}_seconds'] = None if value is None else round(value, 4)
+    if usage_before and usage_after:
+        step['server_cpu_cores'] = round((usage_after[0] - usage_before[0]) / elapsed, 2)
+        step['server_peak_rss_mb'] = round(peak_rss / 1024 / 1024, 1)
+    return step, serial
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, deadline=120):
+    """Poll /health until the server reports ready (warm-up finished)"""
+    end = time.time() + deadline
+    while time.time() < end:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.sendall(b'GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+                if sock.recv(64).split(b' ')[1] == b'200':
+                    return
+        except (OSError, IndexError):
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f'server on port {port} did not become ready')
+
+
+def print_step(step):
+    def ms(key):
+        return '-' if step[key] is None else f'{step[key] * 1000:.0f}'
+    cpu = step.get('server_cpu_cores', '-')
+    rss = step.get('server_peak_rss_mb', '-')
+    print(f"{step['offered_rps']:>8.1f} {step['achieved_rps']:>9.1f} {ms('p50_seconds'):>7} "
+          f"{ms('p95_seconds'):>7} {ms('p99_seconds'):>7} {step['error_rate'] * 100:>6.1f}% "
+          f"{cpu:>6} {rss:>8}", flush=True)
+
+
+async def ramp(args, target, server_pid):
+    uploads = []
+    weights = []
+    for kind, weight in args.mix.items():
+        images = make_images(kind, args.variants)
+        uploads += images
+        weights += [weight / len(images)] * len(images)
+    rng = random.Random(args.seed)
+    serial = 0
+    steps = []
+    rate = args.start_rate
+    print(f"{'offered':>8} {'achieved':>9} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'errors':>7} "
+          f"{'cpu':>6} {'rss MB':>8}")
+    while rate <= args.max_rate:
+        step, serial = await run_step(target, rate, args.duration, uploads, weights,
+                                      args.timeout, server_pid, rng, serial)
+        step['within_slo'] = (
+            step['p99_seconds'] is not None
+            and step['p99_seconds'] <= args.slo_p99
+            and step['error_rate'] <= args.slo_errors
+        )
+        steps.append(step)
+        print_step(step)
+        if not step['within_slo']:
+            break
+        rate = rate * args.factor if args.factor else rate + args.step
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='target a running server instead of starting one')
+    parser.add_argument('--server', choices=list(SERVERS), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='web worker processes of a started server')
+    parser.add_argument('--path', default='/api/analyze')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('small=0.5,photo=0.4,large=0.1'),
+                        help='weighted image kinds, e.g. small=0.5,photo=0.4,large=0.1')
+    parser.add_argument('--variants', type=int, default=4, help='distinct images per kind')
+    parser.add_argument('--start-rate', type=float, default=2, help='requests/sec of the first step')
+    parser.add_argument('--step', type=float, default=2, help='requests/sec added per step')
+    parser.add_argument('--factor', type=float, default=None, help='multiply the rate per step instead')
+    parser.add_argument('--max-rate', type=float, default=500)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per step')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout (counts as an error)')
+    parser.add_argument('--slo-p99', type=float, default=0.5, help='p99 latency SLO in seconds')
+    parser.add_argument('--slo-errors', type=float, default=0.01, help='error-rate SLO')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the capacity report as JSON')
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        target = (parts.hostname, parts.port or 80, args.path)
+    else:
+        port = free_port()
+        env = dict(os.environ, ADMISSION_CLIENT_RATE='0', NEAR_DUPLICATE_MAX_ENTRIES='0')
+        server = subprocess.Popen(SERVERS[args.server](port, args.workers), cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        target = ('127.0.0.1', port, args.path)
+
+    try:
+        if server is not None:
+            wait_until_ready(target[1])
+        steps = asyncio.run(ramp(args, target, server.pid if server else None))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+
+    within = [step for step in steps if step['within_slo']]
+    report = {
+        'target': args.url or f'{args.server} x{args.workers} (started locally)',
+        'cpus': os.cpu_count(),
+        'mix': args.mix,
+        'slo': {'p99_seconds': args.slo_p99, 'error_rate': args.slo_errors},
+        'capacity_rps': within[-1]['achieved_rps'] if within else 0,
+        'steps': steps,
+    }
+    print(f"capacity within SLO (p99 <= {args.slo_p99}s, errors <= {args.slo_errors:.0%}): "
+          f"{report['capacity_rps']} requests/s")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark suite for the classification and request pipeline
+
+Runs each benchmark over a generated corpus of images (several
+resolutions and formats), each case in a fresh subprocess so peak memory
+is attributed correctly, and reports latency percentiles, throughput and
+peak RSS growth. Results can be saved as JSON and compared against a
+stored baseline; the exit status is 1 when a regression exceeds the
+configured thresholds.
+
+Benchmarks:
+    preprocess   InjuryClassifier.preprocess_image on the encoded upload
+    features     InjuryClassifier.analyze_color_features on the 224x224 image
+    classify     InjuryClassifier.classify on the encoded upload
+    analyze      POST /api/analyze through the Flask test client
+                 (result cache off, classification inline)
+
+Usage:
+    python benchmarks/suite.py                          # run and compare to baseline.json
+    python benchmarks/suite.py --output results.json    # also save results
+    python benchmarks/suite.py --save-baseline          # replace the stored baseline
+    python benchmarks/suite.py --bench preprocess --resolutions 4000x3000
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+
+import corpus
+
+BENCHMARKS = ['preprocess', 'features', 'classify', 'analyze']
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), 'first-aid-bench-corpus')
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB (Linux VmHWM)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def make_operation(bench, image_bytes, filename):
+    """Return a zero-argument callable that runs one iteration"""
+    if bench == 'analyze':
+        os.environ['RESULT_CACHE_MAX_BYTES'] = '0'
+        os.environ['INFERENCE_WORKERS'] = '0'
+        os.environ['ADMISSION_CLIENT_RATE'] = '0'
+        import app as app_module
+        client = app_module.app.test_client()
+
+        def operation():
+            response = client.post('/api/analyze', data={'image': (io.BytesIO(image_bytes), filename)},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200, response.status_code
+        return operation
+
+    from classifier import InjuryClassifier
+    classifier = InjuryClassifier()
+    if bench == 'preprocess':
+        return lambda: classifier.preprocess_image(image_bytes)
+    if bench == 'classify':
+        return lambda: classifier.classify(image_bytes)
+    if bench == 'features':
+        image = classifier.preprocess_image(image_bytes)
+        return lambda: classifier.analyze_color_features(image)
+    raise ValueError(f'unknown benchmark {bench}')
+
+
+def run_case(bench, path, iterations, max_seconds):
+    """Run one benchmark on one corpus file in this process"""
+    with open(path, 'rb') as f:
+        image_bytes = f.read()
+    operation = make_operation(bench, image_bytes, os.path.basename(path))
+
+    rss_before = peak_rss_kb()
+    operation()  # warm-up: plugin loading, first-call paths
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < iterations:
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+        if time.perf_counter() - started > max_seconds and len(latencies) >= 5:
+            break
+    total = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'iterations': len(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'throughput_per_s': len(latencies) / total,
+        'peak_rss_kb': peak_rss_kb() - rss_before,
+    }
+
+
+def run_suite(args):
+    files = corpus.build_corpus(args.corpus_dir, args.formats, args.resolutions)
+    results = {}
+    for bench in args.bench:
+        for name, path in files:
+            output = subprocess.run(
+                [sys.executable, __file__, '--case', bench, path,
+                 '--iterations', str(args.iterations), '--max-seconds', str(args.max_seconds)],
+                check=True, capture_output=True, text=True, cwd=ROOT,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results[f'{bench}/{name}'] = result
+            print(f"{bench + '/' + name:<32} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+                  f"p99 {result['p99_ms']:>9.2f}ms  {result['throughput_per_s']:>8.1f}/s  "
+                  f"peak +{result['peak_rss_kb'] // 1024}MB", flush=True)
+    return results
+
+
+def environment():
+    import PIL
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'pillow': PIL.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, latency_threshold, memory_threshold, min_delta_ms, min_delta_kb):
+    """Return a list of human-readable regressions"""
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            new, old = result[metric], base[metric]
+            if new > old * (1 + latency_threshold) and new - old > min_delta_ms:
+                regressions.append(f'{key} {metric}: {old:.2f} -> {new:.2f} (+{(new / old - 1) * 100:.0f}%)')
+        new, old = result['peak_rss_kb'], base['peak_rss_kb']
+        if new > old * (1 + memory_threshold) and new - old > min_delta_kb:
+            regressions.append(f'{key} peak_rss_kb: {old} -> {new}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bench', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--formats', nargs='+', default=corpus.FORMATS)
+    parser.add_argument('--resolutions', nargs='+', default=corpus.RESOLUTIONS)
+    parser.add_argument('--iterations', type=int, default=30, help='iterations per case')
+    parser.add_argument('--max-seconds', type=float, default=3.0, help='time budget per case')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write results to --baseline')
+    parser.add_argument('--latency-threshold', type=float, default=0.25,
+                        help='allowed relative p50/p95 increase (default 0.25 = 25%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='allowed relative peak RSS increase')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='ignore latency changes smaller than this')
+    parser.add_argument('--min-delta-kb', type=int, default=2048,
+                        help='ignore memory changes smaller than this')
+    parser.add_argument('--case', nargs=2, metavar=('BENCH', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(*args.case, args.iterations, args.max_seconds)))
+        return 0
+
+    report = {'environment': environment(), 'results': run_suite(args)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'\nBaseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {args.baseline}; run with --save-baseline to create one')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report['results'], baseline['results'], args.latency_threshold,
+                          args.memory_threshold, args.min_delta_ms, args.min_delta_kb)
+    if baseline.get('environment', {}).get('machine') != report['environment']['machine']:
+        print('\nWarning: baseline was recorded on a different machine type')
+    if regressions:
+        print('\nRegressions against baseline:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
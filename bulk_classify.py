@@ -0,0 +1,225 @@
+"""
+Bulk classification - re-score an archive of images offline
+
+Walks a directory or tar archive, classifies every image across a pool
+of worker processes, and appends one JSON line per image to the output
+file as results arrive. The output doubles as the checkpoint: rerunning
+the same command skips images already in the file, so an interrupted
+run resumes where it stopped. A partial line left by a crash is
+discarded before resuming.
+
+Usage:
+    python bulk_classify.py captures/ --output scores.jsonl
+    python bulk_classify.py captures.tar.gz --output scores.jsonl --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tarfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from classifier import create_classifier
+from validation import UploadRejected, validate_image_header
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+
+def is_image_name(name):
+    return '.' in name and name.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_directory(root):
+    """(name, path) for every image below root, in a stable order"""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(files):
+            if is_image_name(filename):
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, root), path
+
+
+def iter_tar(path):
+    """(name, bytes) for every image in a tar archive, read sequentially"""
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and is_image_name(member.name):
+                yield member.name, archive.extractfile(member).read()
+
+
+def load_checkpoint(output_path):
+    """
+    Names already present in the output file
+    A trailing partial line (interrupted write) is truncated away
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_length = 0
+    with open(output_path, 'rb') as output:
+        for line in output:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(json.loads(line)['name'])
+            except (ValueError, KeyError):
+                break
+            valid_length += len(line)
+    if valid_length != os.path.getsize(output_path):
+        with open(output_path, 'r+b') as output:
+            output.truncate(valid_length)
+    return done
+
+
+# Classifier instance owned by each worker process
+_worker_classifier = None
+
+
+def _load_classifier(backend):
+    global _worker_classifier
+    _worker_classifier = create_classifier(backend)
+
+
+def _init_worker(backend):
+    # Ctrl+C reaches the whole process group; only the parent handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _load_classifier(backend)
+
+
+def classify_item(name, source, max_pixels, max_dimension):
+    """
+    Classify one image; source is a file path or the image bytes
+    Returns the output record for it
+    """
+    try:
+        if isinstance(source, str):
+            with open(source, 'rb') as image_file:
+                source = image_file.read()
+        validate_image_header(source, max_pixels, max_dimension)
+    except (OSError, UploadRejected) as e:
+        return {'name': name, 'error': str(e)}
+    category, confidence, features = _worker_classifier.classify(source)
+    return {'name': name, 'category': category, 'confidence': confidence, 'features': features}
+
+
+class Progress:
+    """Periodic throughput line on stderr"""
+
+    def __init__(self, skipped, interval=5.0, stream=sys.stderr):
+        self.skipped = skipped
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.errors = 0
+        self.interrupted = False
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def update(self, record):
+        self.done += 1
+        self.errors += 'error' in record
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def rate(self):
+        return self.done / max(time.monotonic() - self.started, 1e-9)
+
+    def report(self, final=False):
+        label = 'done' if final else 'progress'
+        print(f'{label}: {self.done} classified ({self.errors} errors), '
+              f'{self.skipped} already done, {self.rate():.1f} images/s', file=self.stream, flush=True)
+
+
+def run(source, output_path, workers=None, backend=None, max_pixels=50_000_000, max_dimension=20000,
+        interval=5.0, stream=sys.stderr, stop=None):
+    """
+    Classify every image under source that is not yet in output_path
+    Once the stop event is set, no new images are started; results
+    already in flight are still written
+    """
+    done = load_checkpoint(output_path)
+    items = iter_tar(source) if os.path.isfile(source) else iter_directory(source)
+    progress = Progress(skipped=0, interval=interval, stream=stream)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    def pending():
+        for name, item in items:
+            if stop is not None and stop.is_set():
+                progress.interrupted = True
+                return
+            if name in done:
+                progress.skipped += 1
+            else:
+                yield name, item
+
+    with open(output_path, 'a', encoding='utf-8') as output:
+        def write(record):
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+            progress.update(record)
+
+        if workers == 0:
+            _load_classifier(backend)
+            for name, item in pending():
+                write(classify_item(name, item, max_pixels, max_dimension))
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(backend,),
+            )
+            # Bounded in-flight work so a large tar is never held in memory
+            in_flight = set()
+            try:
+                for name, item in pending():
+                    if len(in_flight) >= workers * 4:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            write(future.result())
+                    in_flight.add(pool.submit(classify_item, name, item, max_pixels, max_dimension))
+                for future in wait(in_flight).done:
+                    write(future.result())
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    progress.report(final=True)
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='directory or tar archive (optionally compressed) of images')
+    parser.add_argument('--output', required=True, help='JSONL file to append results to; also the checkpoint')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count, 0 = inline)')
+    parser.add_argument('--backend', default=None, help='classifier backend (default: CLASSIFIER_BACKEND or heuristic)')
+    parser.add_argument('--max-pixels', type=int, default=int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000)))
+    parser.add_argument('--max-dimension', type=int, default=int(os.environ.get('MAX_IMAGE_DIMENSION', 20000)))
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between progress lines')
+    args = parser.parse_args(argv)
+
+    # Ctrl+C finishes the images in flight so the output stays consistent
+    stop = threading.Event()
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    try:
+        progress = run(args.source, args.output, workers=args.workers, backend=args.backend,
+                       max_pixels=args.max_pixels, max_dimension=args.max_dimension,
+                       interval=args.interval, stop=stop)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    if progress.interrupted:
+        print('interrupted; rerun the same command to resume', file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
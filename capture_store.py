@@ -0,0 +1,322 @@
+"""
+Opt-in capture of uploads for building a training set
+
+Uploads are written by a background thread, never by the request, into
+a content-addressed layout:
+
+    uploads/objects/ab/cd/abcd1234...jpg   (sha256 of the upload)
+    uploads/index.jsonl
+
+Identical uploads are stored once. In 'preprocessed' mode only the
+224x224 image the classifier saw is kept, as PNG, which is a fraction
+of the size of a phone photo and strips its metadata. Raw pixels sent
+to /api/analyze/raw are stored the same way in either mode.
+
+index.jsonl is an append-only log of add / touch / del records, so the
+store (or a training script, via load_index) can be rebuilt from one
+sequential read instead of walking the shard directories. The store is
+bounded by total bytes; least recently captured objects are deleted
+first. The log is compacted when it grows well past the live entries.
+
+Several gunicorn workers may share one directory: index updates are
+serialised with an exclusive file lock, and each process replays the
+records others appended before acting on it.
+
+The request side is a queue bounded by the bytes it holds (uploads
+can be 16MB each): when the writer falls behind, captures are dropped
+and counted rather than slowing requests down or pinning memory.
+"""
+
+import io
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from PIL import Image
+
+from validation import sniff_image_format
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+MODES = ('original', 'preprocessed')
+
+
+def object_path(key, extension):
+    """Shard path of an object, relative to the store root"""
+    return os.path.join('objects', key[:2], key[2:4], f'{key}.{extension}')
+
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def apply_record(entries, record):
+    """Apply one index record to an OrderedDict of key -> entry"""
+    key = record['key']
+    if record['op'] == 'add':
+        entries[key] = {name: value for name, value in record.items() if name != 'op'}
+        entries.move_to_end(key)
+    elif record['op'] == 'touch':
+        if key in entries:
+            entries.move_to_end(key)
+    elif record['op'] == 'del':
+        entries.pop(key, None)
+
+
+def load_index(root):
+    """
+    Live entries of a capture store, least recently captured first
+    Each entry has key, path (relative to root), size, ts and, when the
+    upload was classified, category and confidence.
+    """
+    entries = OrderedDict()
+    try:
+        with open(os.path.join(root, 'index.jsonl'), 'rb') as index:
+            for line in index:
+                if line.endswith(b'\n'):
+                    apply_record(entries, json.loads(line))
+    except FileNotFoundError:
+        pass
+    return list(entries.values())
+
+
+class CaptureStore:
+    """Content-addressed, byte-bounded store of uploads fed by a background writer"""
+
+    def __init__(self, root, mode='original', max_bytes=1024 ** 3, max_queue_bytes=64 * 1024 ** 2,
+                 preprocess=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown capture mode '{mode}'. Available: {', '.join(MODES)}")
+        if mode == 'preprocessed' and preprocess is None:
+            raise ValueError("'preprocessed' capture mode needs a preprocess function")
+        self.root = root
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_queue_bytes = max_queue_bytes
+        self.preprocess = preprocess
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self._queue = queue.Queue()
+        self._queued_bytes = 0
+        self._lock = threading.Lock()  # counters and writer start; never held for I/O
+        self._index_lock = threading.Lock()
+        self._thread = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._index_offset = 0
+        self._index_inode = None
+        self._index_records = 0
+        self._counters = {'captured': 0, 'duplicates': 0, 'dropped': 0, 'evictions': 0, 'write_errors': 0}
+
+    def capture(self, key, image_bytes, category=None, confidence=None, size=None):
+        """
+        Queue an upload for storage; returns False if the queue is full
+        With size, image_bytes are raw RGB or RGBA pixels of that size.
+        """
+        with self._lock:
+            if self._thread is None:
+                # Started on first use, so a preloaded app starts it after fork
+                self._thread = threading.Thread(target=self._run, name='capture-store', daemon=True)
+                self._thread.start()
+            if self._queued_bytes + len(image_bytes) > self.max_queue_bytes:
+                self._counters['dropped'] += 1
+                return False
+            self._queued_bytes += len(image_bytes)
+        self._queue.put((key, image_bytes, category, confidence, size))
+        return True
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _run(self):
+        # Load the existing index before the first capture needs it
+        with self._index_locked():
+            pass
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._store(*item)
+            except Exception as e:
+                self._count('write_errors')
+                print(f"Capture store write failed: {e}")
+            finally:
+                if item is not None:
+                    with self._lock:
+                        self._queued_bytes -= len(item[1])
+                self._queue.task_done()
+
+    def _store(self, key, image_bytes, category, confidence, size):
+        with self._index_locked():
+            if key in self._entries:
+                self._append({'op': 'touch', 'key': key})
+                self._count('duplicates')
+                return
+
+        if size is not None:
+            # Raw pixels are already the model input; the alpha byte of
+            # RGBA is padding
+            mode = 'RGBA' if len(image_bytes) == size[0] * size[1] * 4 else 'RGB'
+            data, extension = encode_png(Image.frombytes(mode, size, image_bytes).convert('RGB')), 'png'
+        elif self.mode == 'preprocessed':
+            image = self.preprocess(image_bytes)
+            if image is None:
+                return
+            data, extension = encode_png(image), 'png'
+        else:
+            fmt = sniff_image_format(image_bytes[:16])
+            if not fmt:
+                return
+            data, extension = image_bytes, EXTENSIONS[fmt]
+
+        path = object_path(key, extension)
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write then rename, so a reader never sees a partial object
+        temporary = f'{full_path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as output:
+            output.write(data)
+        os.replace(temporary, full_path)
+
+        with self._index_locked():
+            if key in self._entries:
+                # Another worker stored it meanwhile (same bytes, same path)
+                self._append({'op': 'touch', 'key': key})
+                self._count('duplicates')
+                return
+            entry = {'key': key, 'path': path, 'size': len(data), 'ts': round(time.time(), 3)}
+            if category is not None:
+                entry.update(category=category, confidence=confidence)
+            self._append({'op': 'add', **entry})
+            self._count('captured')
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict()
+
+    def _evict(self):
+        # Caller holds the index lock
+        key, entry = next(iter(self._entries.items()))
+        try:
+            os.remove(os.path.join(self.root, entry['path']))
+        except FileNotFoundError:
+            pass
+        self._append({'op': 'del', 'key': key})
+        self._count('evictions')
+
+    @contextmanager
+    def _index_locked(self):
+        """Hold the index lock with this process's view brought up to date"""
+        with self._index_lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, 'index.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                    if self._index_records > 2 * len(self._entries) + 1000:
+                        self._compact()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # Replay index records appended since we last looked; start over
+        # if another process compacted (replaced) the file
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._index_inode or stat.st_size < self._index_offset:
+            self._entries.clear()
+            self._index_offset = 0
+            self._index_records = 0
+            self._index_inode = stat.st_ino
+        if stat.st_size == self._index_offset:
+            return
+        with open(self.index_path, 'rb') as index:
+            index.seek(self._index_offset)
+            for line in index:
+                if not line.endswith(b'\n'):
+                    break
+                apply_record(self._entries, json.loads(line))
+                self._index_offset += len(line)
+                self._index_records += 1
+        self._bytes = sum(entry['size'] for entry in self._entries.values())
+
+    def _append(self, record):
+        # Caller holds the index lock
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with open(self.index_path, 'ab') as index:
+            index.write(line)
+            self._index_inode = os.fstat(index.fileno()).st_ino
+        self._index_offset += len(line)
+        self._index_records += 1
+        size_before = self._entries[record['key']]['size'] if record['key'] in self._entries else 0
+        apply_record(self._entries, record)
+        size_after = self._entries[record['key']]['size'] if record['key'] in self._entries else 0
+        self._bytes += size_after - size_before
+
+    def _compact(self):
+        # Caller holds the index lock
+        temporary = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as index:
+            for entry in self._entries.values():
+                index.write((json.dumps({'op': 'add', **entry}, separators=(',', ':')) + '\n').encode())
+        os.replace(temporary, self.index_path)
+        stat = os.stat(self.index_path)
+        self._index_inode = stat.st_ino
+        self._index_offset = stat.st_size
+        self._index_records = len(self._entries)
+
+    def flush(self):
+        """Block until every queued capture has been written"""
+        self._queue.join()
+
+    def close(self, timeout=10.0):
+        """Write out queued captures and stop the writer"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'mode': self.mode,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'queued': self._queue.qsize(),
+                'queued_bytes': self._queued_bytes,
+                'max_queue_bytes': self.max_queue_bytes,
+            })
+        return stats
+
+
+def create_capture_store(root, preprocess=None):
+    """
+    Build the capture store from environment variables
+    Returns None unless CAPTURE_UPLOADS=1 (capturing is opt-in)
+    """
+    if os.environ.get('CAPTURE_UPLOADS') != '1':
+        return None
+    return CaptureStore(
+        root,
+        mode=os.environ.get('CAPTURE_MODE', 'original'),
+        max_bytes=int(os.environ.get('CAPTURE_MAX_BYTES', 1024 ** 3)),
+        max_queue_bytes=int(os.environ.get('CAPTURE_MAX_QUEUE_BYTES', 64 * 1024 ** 2)),
+        preprocess=preprocess,
+    )
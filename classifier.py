@@ -1,32 +1,92 @@
 """
 Simple Image Classifier for Injury Detection
-Python 3.14 Compatible - No NumPy Required
-Uses pure Python for all calculations
+Python 3.14 Compatible - NumPy optional
+Pixel statistics use NumPy when it is installed, pure Python otherwise
 """
 
 from PIL import Image
 import io
+import os
+
+from feature_engines import select_engine
+from metrics import stage
+from startup import synthetic_images
 
 class InjuryClassifier:
     """
     Simple demo classifier that analyzes image features
     In production, replace with a trained CNN model
     
-    This version uses pure Python (no NumPy) for Python 3.14 compatibility
+    Runs without NumPy for Python 3.14 compatibility; engine picks how
+    pixel statistics are computed (see feature_engines.py)
     """
     
-    def __init__(self):
+    # Size of the image handed to feature extraction
+    target_size = (224, 224)
+    
+    # Hard cap on the number of pixels we are willing to decode.
+    # JPEGs are scaled down while decoding (draft mode), so this mostly
+    # matters for formats without scaled decoding (PNG, WebP, GIF).
+    max_decode_pixels = 50_000_000
+    
+    # Name this classifier is registered under
+    backend_name = 'heuristic'
+    
+    def __init__(self, engine=None):
         self.categories = ['minor_cut', 'burn', 'abrasion', 'bruise', 'swelling', 'unknown']
+        self.engine = select_engine(engine)
+    
+    def model_info(self):
+        """Short description of the model, reported by /api/info"""
+        return {
+            'backend': self.backend_name,
+            'type': 'Demo heuristic-based classifier',
+            'input_size': list(self.target_size),
+            'engine': self.engine.name,
+            'note': 'This is a demonstration. In production, use a trained deep learning model.'
+        }
+        
+    def warm_up(self, count=None):
+        """
+        Classify synthetic images in each upload format, so decoders and
+        code paths are loaded before the first real request
+        """
+        for image_bytes in synthetic_images(count):
+            self.classify(image_bytes)
         
     def preprocess_image(self, image_bytes):
-        """Convert image bytes to processable format"""
+        """
+        Convert image bytes to processable format
+        
+        Only decodes as many pixels as needed to produce the target size:
+        JPEGs are decoded at 1/2, 1/4 or 1/8 scale via draft mode, and the
+        final resize uses a cheap integer reduce before the bicubic pass.
+        """
         try:
-            image = Image.open(io.BytesIO(image_bytes))
+            with stage('open'):
+                image = Image.open(io.BytesIO(image_bytes))
+            
+            # Image.open only parses the header, so this check is free
+            width, height = image.size
+            if width * height > self.max_decode_pixels:
+                raise ValueError(f"image too large to decode ({width}x{height})")
+            
+            with stage('decode'):
+                # Let the JPEG decoder scale down while decoding. We ask for
+                # twice the target size so the final resample still has
+                # enough detail; this is a no-op for other formats.
+                image.draft('RGB', (self.target_size[0] * 2, self.target_size[1] * 2))
+                image.load()
+            
             # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            # Resize to standard size
-            image = image.resize((224, 224))
+            with stage('convert'):
+                if image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+            # Resize to standard size (box-reduce first, then bicubic)
+            with stage('resize'):
+                image = image.resize(self.target_size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
             return image
         except Exception as e:
             print(f"Error preprocessing image: {e}")
@@ -34,12 +94,15 @@ class InjuryClassifier:
     
     def analyze_color_features(self, image):
         """
-        Analyze color characteristics using pure Python
-        No NumPy dependency required
+        Analyze color characteristics of an RGB (or RGBA) image
+        
+        Works from the per-band histograms Pillow computes in C; the
+        feature engine reduces the 3 x 256 bins to integer sums and sums
+        of squares. Means are identical to a per-pixel sum; the variance
+        is computed exactly from integer moments and rounded once.
         """
-        # Get all pixels as list of (R, G, B) tuples
-        pixels = list(image.getdata())
-        num_pixels = len(pixels)
+        width, height = image.size
+        num_pixels = width * height
         
         if num_pixels == 0:
             return {
@@ -50,18 +113,18 @@ class InjuryClassifier:
                 'red_dominance': 0
             }
         
-        # Calculate average color values
-        total_r = sum(p[0] for p in pixels)
-        total_g = sum(p[1] for p in pixels)
-        total_b = sum(p[2] for p in pixels)
+        sums, squares = self.engine.band_moments(image)
+        total_r, total_g, total_b = sums
         
+        # Calculate average color values
         avg_red = total_r / num_pixels
         avg_green = total_g / num_pixels
         avg_blue = total_b / num_pixels
         
-        # Calculate variance for red channel
-        mean_r = avg_red
-        red_variance = sum((p[0] - mean_r) ** 2 for p in pixels) / num_pixels
+        # Calculate variance for red channel: E[x^2] - E[x]^2, kept in
+        # integers until the final division so no precision is lost
+        total_r_sq = squares[0]
+        red_variance = (num_pixels * total_r_sq - total_r * total_r) / (num_pixels * num_pixels)
         
         # Calculate red dominance (how much redder than other channels)
         red_dominance = avg_red - (avg_green + avg_blue) / 2
@@ -87,7 +150,41 @@ class InjuryClassifier:
         if image is None:
             return 'unknown', 0.5, {}
         
-        features = self.analyze_color_features(image)
+        return self.classify_image(image)
+    
+    def image_from_rgb(self, pixels):
+        """
+        Wrap a raw target-size pixel buffer (e.g. downscaled in the browser)
+        as an image; nothing is decoded or resized
+        RGBA/RGBX buffers (4 bytes per pixel, what a canvas's getImageData
+        returns) are mapped without copying and the fourth byte is
+        ignored. Packed RGB (3 bytes per pixel) is accepted too, but
+        Pillow copies it.
+        """
+        width, height = self.target_size
+        if len(pixels) == width * height * 4:
+            return Image.frombuffer('RGBA', self.target_size, pixels, 'raw', 'RGBA', 0, 1)
+        if len(pixels) == width * height * 3:
+            return Image.frombuffer('RGB', self.target_size, pixels, 'raw', 'RGB', 0, 1)
+        raise ValueError(
+            f"expected {width * height * 4} bytes of {width}x{height} RGBA data "
+            f"(or {width * height * 3} bytes of RGB)"
+        )
+    
+    def classify_rgb(self, pixels):
+        """
+        Classify a raw target-size RGBA or RGB buffer
+        Returns: (category, confidence, features)
+        """
+        return self.classify_image(self.image_from_rgb(pixels))
+    
+    def classify_image(self, image):
+        """
+        Classify an already preprocessed target-size RGB (or RGBA) image
+        Returns: (category, confidence, features)
+        """
+        with stage('features'):
+            features = self.analyze_color_features(image)
         
         # Simple heuristic classification (DEMO ONLY)
         # In production, use a trained CNN model here
@@ -172,7 +269,34 @@ class InjuryClassifier:
         """
 
 
-# For demo purposes, we'll create a simple rule-based classifier
-def create_classifier():
-    """Factory function to create classifier instance"""
-    return InjuryClassifier()
+def _create_onnx_classifier():
+    # Imported lazily: onnxruntime and NumPy are only needed for this backend
+    from onnx_backend import OnnxInjuryClassifier
+    return OnnxInjuryClassifier.from_env()
+
+
+# Classifier backends by name. Every backend provides classify(),
+# preprocess_image(), model_info() and get_training_recommendation().
+CLASSIFIER_BACKENDS = {
+    'heuristic': InjuryClassifier,
+    'onnx': _create_onnx_classifier,
+}
+
+
+def register_backend(name, factory):
+    """Make a classifier backend available to create_classifier()"""
+    CLASSIFIER_BACKENDS[name] = factory
+
+
+# For demo purposes, the default is the simple rule-based classifier
+def create_classifier(backend=None):
+    """
+    Factory function to create classifier instance
+    The backend is chosen by name, defaulting to $CLASSIFIER_BACKEND or 'heuristic'
+    """
+    name = backend or os.environ.get('CLASSIFIER_BACKEND', 'heuristic')
+    if name not in CLASSIFIER_BACKENDS:
+        raise ValueError(
+            f"Unknown classifier backend '{name}'. Available: {', '.join(sorted(CLASSIFIER_BACKENDS))}"
+        )
+    return CLASSIFIER_BACKENDS[name]()
@@ -0,0 +1,83 @@
+"""
+Pixel statistics engines for the classifier
+
+Colour features are derived from per-band moments of the image: the sum
+and the sum of squares of each colour band, as exact integers. Pillow builds
+the per-band histograms in C; an engine reduces the 3 x 256 bins of the
+red, green and blue bands to moments (an RGBA image's alpha band is
+ignored). The NumPy engine does that with two vectorised dot products,
+the pure-Python engine walks the bins. Both produce the same integers,
+so features are identical whichever engine is selected.
+
+NumPy stays optional: CLASSIFIER_ENGINE=auto (the default) uses it when
+it can be imported and falls back to pure Python otherwise.
+"""
+
+import operator
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class PythonEngine:
+    """Moments from histogram bins with plain Python integer arithmetic"""
+
+    name = 'python'
+
+    def __init__(self):
+        self._values = list(range(256))
+        self._squares = [value * value for value in self._values]
+
+    def band_moments(self, image):
+        """Per-band (sums, sums of squares) of an 8-bit RGB(A) image's colour bands, as ints"""
+        histogram = image.histogram()[:3 * 256]
+        sums = []
+        squares = []
+        for start in range(0, len(histogram), 256):
+            band = histogram[start:start + 256]
+            sums.append(sum(map(operator.mul, self._values, band)))
+            squares.append(sum(map(operator.mul, self._squares, band)))
+        return sums, squares
+
+
+class NumpyEngine:
+    """Moments from histogram bins with NumPy dot products"""
+
+    name = 'numpy'
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("The 'numpy' feature engine requires NumPy: pip install numpy")
+        # int64 holds sums of squares for up to ~140 billion pixels
+        self._values = numpy.arange(256, dtype=numpy.int64)
+        self._squares = self._values * self._values
+
+    def band_moments(self, image):
+        """Per-band (sums, sums of squares) of an 8-bit RGB(A) image's colour bands, as ints"""
+        histogram = numpy.array(image.histogram()[:3 * 256], dtype=numpy.int64).reshape(-1, 256)
+        return (histogram @ self._values).tolist(), (histogram @ self._squares).tolist()
+
+
+ENGINES = {
+    'python': PythonEngine,
+    'numpy': NumpyEngine,
+}
+
+
+def select_engine(name=None):
+    """
+    Create a feature engine by name
+    Falls back to the CLASSIFIER_ENGINE environment variable, default 'auto'
+    ('numpy' when NumPy is importable, else 'python')
+    """
+    name = name or os.environ.get('CLASSIFIER_ENGINE', 'auto')
+    if name == 'auto':
+        name = 'python' if numpy is None else 'numpy'
+    if name not in ENGINES:
+        raise ValueError(
+            f"Unknown feature engine '{name}'. Available: auto, {', '.join(sorted(ENGINES))}"
+        )
+    return ENGINES[name]()
@@ -0,0 +1,85 @@
+"""
+Live camera frame streams
+
+A kiosk camera sends frames continuously, but the scene in front of it
+changes only now and then. Each frame is perceptually hashed (a cheap,
+reduced-scale decode) and compared with the last frame that was actually
+classified; frames within a few bits of it are skipped. Classifications
+of the remaining frames are smoothed over time so a single odd frame
+does not flip the reported category.
+"""
+
+import os
+
+from phash import dhash_bytes, hamming_distance
+
+
+class FrameStream:
+    """
+    Per-client state for one frame stream
+
+    classify is called with the encoded frame bytes and returns
+    (category, confidence, features). A frame is classified when its
+    dHash is more than skip_distance bits from the last classified
+    frame; skip_distance=-1 classifies every frame. Smoothed scores are
+    an exponential moving average per category with weight smoothing
+    for the newest frame.
+    """
+
+    def __init__(self, classify, skip_distance=6, smoothing=0.4):
+        self.classify = classify
+        self.skip_distance = skip_distance
+        self.smoothing = smoothing
+        self.frames = 0
+        self.analyzed = 0
+        self.last_hash = None
+        self.scores = {}
+        self.category = None
+
+    def process(self, frame_bytes):
+        """Handle one frame and return the event to send back"""
+        self.frames += 1
+        frame_hash = dhash_bytes(frame_bytes)
+        distance = None if self.last_hash is None else hamming_distance(frame_hash, self.last_hash)
+        event = {'frame': self.frames, 'distance': distance}
+
+        if distance is not None and distance <= self.skip_distance:
+            event['analyzed'] = False
+        else:
+            category, confidence, features = self.classify(frame_bytes)
+            # Only remember the hash once the frame is classified, so a
+            # failed classification is retried on the next frame
+            self.last_hash = frame_hash
+            self.analyzed += 1
+            self._smooth(category, confidence)
+            event['analyzed'] = True
+            event['classification'] = {'category': category, 'confidence': round(confidence, 2)}
+
+        best = max(self.scores, key=self.scores.get) if self.scores else None
+        event['changed'] = best is not None and best != self.category
+        self.category = best
+        if best is not None:
+            event['smoothed'] = {'category': best, 'confidence': round(self.scores[best], 2)}
+        return event
+
+    def _smooth(self, category, confidence):
+        decay = 1 - self.smoothing
+        for key in self.scores:
+            self.scores[key] *= decay
+        self.scores[category] = self.scores.get(category, 0.0) + self.smoothing * confidence
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'analyzed': self.analyzed,
+            'skipped': self.frames - self.analyzed,
+        }
+
+
+def create_frame_stream(classify):
+    """Build a FrameStream configured from environment variables"""
+    return FrameStream(
+        classify,
+        skip_distance=int(os.environ.get('STREAM_SKIP_DISTANCE', 6)),
+        smoothing=float(os.environ.get('STREAM_SMOOTHING', 0.4)),
+    )
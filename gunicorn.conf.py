@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app): Pillow plugins,
+the classifier, its warm-up run and the pre-rendered responses are
+built there and shared copy-on-write by the forked workers. Each worker
+then starts its own inference processes and warms up after the fork;
+/health answers 503 until that has finished.
+"""
+
+import gc
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+# Threads and process pools must not exist before the fork
+os.environ.setdefault('STARTUP_DEFER', '1')
+
+
+def pre_fork(server, worker):
+    # Move everything imported so far out of the collector's reach, so
+    # garbage collection in a worker does not write to (and unshare)
+    # the pages holding it
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import startup
+    startup.begin()
+
+
+def worker_exit(server, worker):
+    # Write out buffered log records and captures before the worker goes
+    from app import capture_store, request_log
+    if request_log is not None:
+        request_log.close()
+    if capture_store is not None:
+        capture_store.close()
@@ -0,0 +1,345 @@
+"""
+Inference executor - runs classification off the Flask request threads
+
+By default classification happens in a pool of worker processes, so
+CPU-heavy decoding does not hold the web process's GIL and cheap
+endpoints such as /health stay responsive under load. Admission is
+bounded: once every worker is busy and the wait queue is full, new work
+is refused with InferenceUnavailable instead of piling up. Workers are
+recycled after a fixed number of tasks to cap memory growth. If a
+worker process dies (OOM kill, a crash in a decoder), the requests it
+took down get InferenceUnavailable and the next one starts a new pool.
+
+INFERENCE_MODE selects the pool:
+
+- process (default): separate worker processes, each with its own
+  classifier; parallel on any build, at the cost of one interpreter and
+  classifier per worker and pickling every upload across.
+- thread: threads sharing the web process's classifier. The classifier
+  is immutable after construction and the request pipeline's shared
+  state is lock-protected, so this is safe without the GIL; on a
+  free-threaded build (python3.14t) threads classify in parallel with
+  no copying. With the GIL only Pillow's C stages overlap.
+- interpreter: a concurrent.futures.InterpreterPoolExecutor (Python
+  3.14+), one sub-interpreter with its own GIL per worker. Every C
+  extension the classifier imports must support sub-interpreters; if
+  the pool is unavailable or its workers fail to start, the executor
+  falls back to processes.
+"""
+
+import functools
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import (
+    BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout,
+)
+
+try:
+    from concurrent.futures import InterpreterPoolExecutor
+except ImportError:  # Python < 3.14
+    InterpreterPoolExecutor = None
+
+import metrics
+from classifier import create_classifier
+from near_duplicates import upload_signature
+
+
+class InferenceUnavailable(Exception):
+    """Inference could not be completed now; the client should retry later"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExecutorSaturated(InferenceUnavailable):
+    """All workers are busy and the wait queue is full"""
+
+
+class InferenceTimeout(InferenceUnavailable):
+    """The request deadline passed before a result was ready"""
+
+
+# Classifier instance owned by each worker process
+_worker_classifier = None
+
+
+def _init_worker(started=None):
+    global _worker_classifier
+    _worker_classifier = create_classifier()
+    _worker_classifier.warm_up()
+    if started is not None:
+        with started.get_lock():
+            started.value += 1
+
+
+def classify_in_worker(image_bytes):
+    """Task run inside a worker process"""
+    return _worker_classifier.classify(image_bytes)
+
+
+def classify_rgb_in_worker(rgb_bytes):
+    """Task run inside a worker process for raw RGB uploads"""
+    return _worker_classifier.classify_rgb(rgb_bytes)
+
+
+def signature_in_worker(image_bytes):
+    """Task run inside a worker process: decode an upload for the near-duplicate index"""
+    return upload_signature(_worker_classifier, image_bytes)
+
+
+def gil_enabled():
+    """False only on a free-threaded build running without the GIL"""
+    is_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_enabled is None else is_enabled()
+
+
+MODES = ('process', 'thread', 'interpreter')
+
+# Worker-side tasks and what thread pools and inline runs call instead,
+# with the shared classifier
+LOCAL_TASKS = {
+    classify_in_worker: lambda classifier, image_bytes: classifier.classify(image_bytes),
+    classify_rgb_in_worker: lambda classifier, rgb_bytes: classifier.classify_rgb(rgb_bytes),
+    signature_in_worker: upload_signature,
+}
+
+
+def _run_timed(task, *args):
+    # Stage timings measured in the worker travel back with the result
+    with metrics.collect_stages() as timings:
+        result = task(*args)
+    return result, timings
+
+
+class InferenceExecutor:
+    """
+    Bounded worker pool for classification
+
+    workers=0 runs tasks inline on the calling thread, which keeps the old
+    behaviour (useful for debugging and tests). Otherwise at most
+    workers + max_queue tasks are admitted at once; callers wait at most
+    `deadline` seconds for their result. mode is 'process', 'thread' or
+    'interpreter' (see the module docstring).
+    """
+
+    def __init__(self, workers=2, max_queue=16, deadline=30.0, max_tasks_per_worker=1000,
+                 task=classify_in_worker, classifier=None, mode='process'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown inference mode '{mode}'. Available: {', '.join(MODES)}")
+        if mode == 'interpreter' and InterpreterPoolExecutor is None:
+            print("Sub-interpreter pools need Python 3.14+; using worker processes")
+            mode = 'process'
+        self.mode = mode
+        self.workers = workers
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.task = task
+        self.classifier = classifier
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._lock = threading.Lock()
+        self._pool = None
+        self._started = None
+        self._in_flight = 0
+        self._avg_task_seconds = 0.0
+        self._counters = {'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0, 'pool_restarts': 0}
+
+    def _get_pool(self):
+        # Created lazily so importing the app does not start processes
+        with self._lock:
+            if self._pool is None and self.mode == 'thread':
+                if self.classifier is None:
+                    self.classifier = create_classifier()
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+            elif self._pool is None and self.mode == 'interpreter':
+                # Each sub-interpreter imports this module and builds its
+                # own classifier, as a worker process would
+                self._pool = InterpreterPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            elif self._pool is None:
+                # Worker recycling requires a non-fork start method
+                context = multiprocessing.get_context('spawn')
+                # Counts workers that have finished warming up
+                self._started = context.Value('i', 0)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._started,),
+                    max_tasks_per_child=self.max_tasks_per_worker,
+                )
+            return self._pool
+
+    def start(self):
+        """
+        Start every worker process now rather than on the first requests
+        Each worker warms up its classifier as it starts; this returns
+        once all of them have, with the number of workers started.
+        """
+        if not self.workers:
+            if self.classifier is None:
+                self.classifier = create_classifier()
+            return 0
+        if self.mode == 'thread':
+            # Threads share the (already warmed) classifier
+            self._get_pool()
+            return self.workers
+        if self.mode == 'interpreter':
+            return self._start_interpreters()
+        pool = self._get_pool()
+        # Submitted back to back, each task finds no idle worker and
+        # makes the pool spawn another, up to the pool size
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result(timeout=self.deadline)
+        give_up = time.monotonic() + self.deadline
+        while self._started.value < self.workers and time.monotonic() < give_up:
+            time.sleep(0.01)
+        return self._started.value
+
+    def _start_interpreters(self):
+        # A ping finishes only after its interpreter's initializer, and
+        # each back-to-back submit starts another interpreter
+        pool = self._get_pool()
+        try:
+            for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+                future.result(timeout=self.deadline)
+            return self.workers
+        except (BrokenExecutor, ImportError) as e:
+            # Typically a C extension that cannot load in a sub-interpreter
+            print(f"Sub-interpreter workers failed to start ({e}); using worker processes")
+            self.shutdown(wait=False)
+            self.mode = 'process'
+            return self.start()
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, from the current backlog"""
+        with self._lock:
+            backlog = self._in_flight / max(self.workers, 1)
+            return max(1, math.ceil(backlog * self._avg_task_seconds))
+
+    def classify(self, image_bytes):
+        """Run the classification task and wait for its result"""
+        return self._run(self.task, image_bytes)
+
+    def classify_rgb(self, rgb_bytes):
+        """Classify a raw target-size RGB buffer and wait for the result"""
+        return self._run(classify_rgb_in_worker, rgb_bytes)
+
+    def signature(self, image_bytes):
+        """
+        Decode and preprocess an upload in a worker for the near-duplicate
+        index; returns (dHash, mean RGB, RGB pixels), or None when the
+        upload cannot be decoded
+        """
+        return self._run(signature_in_worker, image_bytes)
+
+    def _run(self, task, payload):
+        if not self.workers:
+            if task not in LOCAL_TASKS:
+                raise ValueError(f'{task.__name__} has no inline equivalent in LOCAL_TASKS')
+            if self.classifier is None:
+                self.classifier = create_classifier()
+            return LOCAL_TASKS[task](self.classifier, payload)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise ExecutorSaturated('Server is busy, please retry shortly', self.retry_after())
+
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+        pool = None
+        try:
+            pool = self._get_pool()
+            if self.mode == 'thread' and task in LOCAL_TASKS:
+                task = functools.partial(LOCAL_TASKS[task], self.classifier)
+            future = pool.submit(_run_timed, task, payload)
+        except BrokenExecutor:
+            self._release(started, failed=True)
+            raise self._replace_broken_pool(pool) from None
+        except BaseException:
+            self._release(started, failed=True)
+            raise
+        # The slot is held until the task really finishes, even if the
+        # caller stops waiting, so the bound reflects actual worker load
+        future.add_done_callback(
+            lambda f: self._release(started, failed=f.cancelled() or f.exception() is not None)
+        )
+
+        try:
+            with metrics.stage('inference'):
+                result, timings = future.result(timeout=self.deadline)
+            metrics.record_stages(timings)
+            return result
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self._counters['timed_out'] += 1
+            raise InferenceTimeout('Analysis took too long, please retry', self.retry_after())
+        except BrokenExecutor:
+            raise self._replace_broken_pool(pool) from None
+
+    def _replace_broken_pool(self, pool):
+        """
+        Drop a pool whose worker died (OOM kill, crash in a decoder) so
+        the next call starts a fresh one; returns the error for the
+        request that hit it
+        """
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self._counters['pool_restarts'] += 1
+            else:
+                pool = None  # another request already replaced it
+        if pool is not None:
+            print("An inference worker died; starting a new worker pool")
+            pool.shutdown(wait=False, cancel_futures=True)
+        return InferenceUnavailable('An inference worker failed, please retry', self.retry_after())
+
+    def _release(self, started, failed=False):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._counters['failed' if failed else 'completed'] += 1
+            # Exponentially weighted average, used for Retry-After
+            self._avg_task_seconds = (
+                elapsed if not self._avg_task_seconds
+                else 0.8 * self._avg_task_seconds + 0.2 * elapsed
+            )
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'mode': self.mode if self.workers else 'inline',
+                'workers': self.workers,
+                'gil_enabled': gil_enabled(),
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'avg_task_seconds': round(self._avg_task_seconds, 4),
+            })
+        return stats
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def create_inference_executor(classifier=None):
+    """Build the executor from environment configuration"""
+    return InferenceExecutor(
+        workers=int(os.environ.get('INFERENCE_WORKERS', 2)),
+        max_queue=int(os.environ.get('INFERENCE_MAX_QUEUE', 16)),
+        deadline=float(os.environ.get('INFERENCE_DEADLINE', 30)),
+        max_tasks_per_worker=int(os.environ.get('INFERENCE_MAX_TASKS_PER_WORKER', 1000)),
+        classifier=classifier,
+        mode=os.environ.get('INFERENCE_MODE', 'process'),
+    )
@@ -0,0 +1,309 @@
+"""
+Asynchronous analysis jobs
+
+A slow classifier backend makes synchronous /api/analyze run into proxy
+timeouts. In job mode the upload is validated and queued, the client
+gets a job id straight away, and a background pool does the work. The
+client then polls the job or follows it as Server-Sent Events.
+
+Job records live in a store: an in-process one bounded by count with a
+TTL, or a SQLite file shared by the gunicorn workers on one host, so a
+job submitted to one worker can be polled through any other. Records
+are plain JSON-serialisable dicts:
+
+    {'id', 'status', 'created', 'started', 'finished', 'result', 'error'}
+
+with status one of queued, running, done or failed.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from inference_executor import InferenceUnavailable
+
+FINISHED = ('done', 'failed')
+
+
+class JobQueueFull(InferenceUnavailable):
+    """Too many jobs are already waiting or running"""
+
+
+class MemoryJobStore:
+    """
+    Job records in this process, bounded by count, with a TTL
+
+    The TTL restarts whenever a record changes, so a finished job stays
+    retrievable for ttl seconds after it finished. When the store is
+    full the oldest finished jobs are dropped first.
+    """
+
+    def __init__(self, max_jobs=1000, ttl=600):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._records = OrderedDict()  # id -> (record, expires_at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, record):
+        record = dict(record)
+        with self._lock:
+            self._records[record['id']] = (record, time.monotonic() + self.ttl)
+            self._prune()
+
+    def get(self, job_id):
+        """The job's record, or None if unknown or expired"""
+        with self._lock:
+            entry = self._records.get(job_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._records[job_id]
+                return None
+            return dict(entry[0])
+
+    def _prune(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        for job_id in [key for key, (_, expires_at) in self._records.items() if expires_at <= now]:
+            del self._records[job_id]
+        if len(self._records) <= self.max_jobs:
+            return
+        finished = [key for key, (record, _) in self._records.items() if record['status'] in FINISHED]
+        for job_id in finished[:len(self._records) - self.max_jobs]:
+            del self._records[job_id]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'stored': len(self._records), 'max_jobs': self.max_jobs,
+                    'ttl_seconds': self.ttl, 'evictions': self.evictions}
+
+
+class SqliteJobStore:
+    """
+    Job records shared between processes through a SQLite file
+
+    Same behaviour as MemoryJobStore; the work itself still runs in the
+    process that accepted the job.
+    """
+
+    def __init__(self, path, max_jobs=10000, ttl=600):
+        self.path = path
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.evictions = 0
+        self._local = threading.local()
+        # Throwaway connection, as in SqliteResultBackend: one kept open
+        # here would be inherited by every forked gunicorn worker
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS jobs ('
+                    ' id TEXT PRIMARY KEY,'
+                    ' record TEXT NOT NULL,'
+                    ' finished INTEGER NOT NULL,'
+                    ' created REAL NOT NULL,'
+                    ' expires_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS jobs_expiry ON jobs (expires_at)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, record):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)',
+                (record['id'], json.dumps(record), record['status'] in FINISHED,
+                 record['created'], now + self.ttl),
+            )
+            conn.execute('DELETE FROM jobs WHERE expires_at <= ?', (now,))
+            excess = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] - self.max_jobs
+            if excess > 0:
+                evicted = conn.execute(
+                    'DELETE FROM jobs WHERE id IN ('
+                    ' SELECT id FROM jobs WHERE finished ORDER BY created LIMIT ?)',
+                    (excess,),
+                ).rowcount
+                self.evictions += evicted
+
+    def get(self, job_id):
+        """The job's record, or None if unknown or expired"""
+        row = self._connect().execute(
+            'SELECT record FROM jobs WHERE id = ? AND expires_at > ?', (job_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs')
+
+    def stats(self):
+        stored = self._connect().execute(
+            'SELECT COUNT(*) FROM jobs WHERE expires_at > ?', (time.time(),)
+        ).fetchone()[0]
+        return {'stored': stored, 'max_jobs': self.max_jobs,
+                'ttl_seconds': self.ttl, 'evictions': self.evictions}
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 4)
+
+
+class JobManager:
+    """
+    Runs submitted work on a bounded background pool and records its
+    progress in a job store
+
+    At most max_pending jobs may be queued or running; further
+    submissions raise JobQueueFull (a 503 with Retry-After).
+    """
+
+    def __init__(self, store, workers=2, max_pending=64, poll_interval=0.25):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queued = 0
+        self._running = 0
+        self._queue_seconds = deque(maxlen=1000)
+        self._total_seconds = deque(maxlen=1000)
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, work):
+        """
+        Queue work() and return the new job's record
+        work's return value becomes the job's result; an exception marks
+        the job failed with its message as the error.
+        """
+        with self._lock:
+            if self._queued + self._running >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise JobQueueFull('Too many jobs in progress, please retry shortly', self._retry_after())
+            self._queued += 1
+            self._counters['submitted'] += 1
+        record = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None,
+        }
+        self.store.put(record)
+        self._pool.submit(self._run, record, work)
+        return record
+
+    def _run(self, record, work):
+        record = dict(record, status='running', started=time.time())
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        self._update(record)
+        try:
+            record['result'] = work()
+            record['status'] = 'done'
+        except Exception as e:
+            record['error'] = str(e)
+            record['status'] = 'failed'
+        record['finished'] = time.time()
+        with self._lock:
+            self._running -= 1
+            self._counters['completed' if record['status'] == 'done' else 'failed'] += 1
+            self._queue_seconds.append(record['started'] - record['created'])
+            self._total_seconds.append(record['finished'] - record['created'])
+        self._update(record)
+
+    def _update(self, record):
+        self.store.put(record)
+        with self._changed:
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def wait(self, job_id, status=None, timeout=15.0):
+        """
+        Wait until the job's status differs from `status` or timeout
+        passes; returns the current record (None once it is gone)
+        Jobs run by another process are noticed by polling the store.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self.store.get(job_id)
+            remaining = deadline - time.monotonic()
+            if record is None or record['status'] != status or remaining <= 0:
+                return record
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _retry_after(self):
+        # Caller holds the lock
+        if not self._total_seconds:
+            return 1
+        average = sum(self._total_seconds) / len(self._total_seconds)
+        return max(1, round(average * (self._queued + 1) / max(self.workers, 1)))
+
+    def stats(self):
+        """Queue depth and latency of recent jobs in this process"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'queued': self._queued,
+                'running': self._running,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_seconds_p50': percentile(self._queue_seconds, 0.5),
+                'queue_seconds_p95': percentile(self._queue_seconds, 0.95),
+                'latency_seconds_p50': percentile(self._total_seconds, 0.5),
+                'latency_seconds_p95': percentile(self._total_seconds, 0.95),
+            })
+        stats['store'] = {'backend': type(self.store).__name__, **self.store.stats()}
+        return stats
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def create_job_manager():
+    """Build the job manager and its store from environment configuration"""
+    ttl = float(os.environ.get('JOB_TTL', 600))
+    max_jobs = int(os.environ.get('JOB_MAX_STORED', 1000))
+    shared_path = os.environ.get('JOB_SQLITE')
+    if shared_path:
+        store = SqliteJobStore(shared_path, max_jobs=max_jobs, ttl=ttl)
+    else:
+        store = MemoryJobStore(max_jobs=max_jobs, ttl=ttl)
+    return JobManager(
+        store,
+        workers=int(os.environ.get('JOB_WORKERS', 2)),
+        max_pending=int(os.environ.get('JOB_MAX_PENDING', 64)),
+    )
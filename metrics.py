@@ -0,0 +1,169 @@
+"""
+Lightweight request metrics: stage timers and Prometheus exposition
+
+Code marks expensive steps with `with stage('resize'):`. While a request
+is being measured (see start_collecting), each stage's duration is added
+to that request's timing dict; otherwise stage() costs one context
+variable lookup. The web layer turns the collected timings into
+Server-Timing headers and histogram observations, and /metrics renders
+everything in the Prometheus text format.
+
+Set METRICS_ENABLED=0 to turn collection off entirely.
+"""
+
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+enabled = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Stage timings of the request running in the current context
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block of work as a named stage of the current request"""
+    timings = _stage_timings.get()
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + perf_counter() - start
+
+
+def start_collecting():
+    """Begin collecting stage timings in this context; returns (timings, token)"""
+    timings = {}
+    return timings, _stage_timings.set(timings)
+
+
+def stop_collecting(token):
+    _stage_timings.reset(token)
+
+
+@contextmanager
+def collect_stages():
+    """Collect stage timings for the enclosed block, e.g. inside a worker process"""
+    timings, token = start_collecting()
+    try:
+        yield timings
+    finally:
+        stop_collecting(token)
+
+
+def record_stages(timings):
+    """Merge timings measured elsewhere (e.g. a worker process) into the current request"""
+    current = _stage_timings.get()
+    if current is None:
+        return
+    for name, seconds in timings.items():
+        current[name] = current.get(name, 0.0) + seconds
+
+
+def server_timing_header(timings):
+    """Format timings as a Server-Timing header value (milliseconds)"""
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items())
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labels, key, [('le', repr(bound))])
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labels, key, [('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {series[-2]}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {series[-1]}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'first_aid_request_seconds', 'Time spent handling a request', labels=('endpoint',)
+)
+STAGE_SECONDS = Histogram(
+    'first_aid_stage_seconds', 'Time spent in each stage of the analysis pipeline', labels=('stage',)
+)
+CLASSIFICATIONS = Counter(
+    'first_aid_classifications_total', 'Images classified, by category', labels=('category',)
+)
+ERRORS = Counter(
+    'first_aid_errors_total', 'Failed analysis requests, by error type', labels=('type',)
+)
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, CLASSIFICATIONS, ERRORS]
+
+
+def render_prometheus(extra_lines=()):
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
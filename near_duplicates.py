@@ -0,0 +1,178 @@
+"""
+Near-duplicate index for classification results
+
+The result cache only matches byte-identical uploads. When a phone
+re-encodes or resizes a photo before re-uploading it, the bytes change
+but the 224x224 image the classifier sees barely does. This index keys
+results by a 64-bit dHash of that image plus its mean colour (dHash is
+computed in grayscale, so the colour check stops a red and a blue image
+with the same structure from matching).
+
+Lookups use multi-index hashing: the hash is split into chunks, and by
+the pigeonhole principle any hash within max_distance bits of the query
+has at least one chunk within max_distance // chunks bits of the
+query's chunk. Only entries in those buckets are compared: with 16-bit
+chunks that is a few candidates at 10k entries and about a thousand at
+a million, instead of every entry. Entries are evicted least recently
+used first.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from phash import HASH_SIZE, dhash
+
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def image_signature(image):
+    """(dHash, mean RGB) of a preprocessed image"""
+    thumb = image.convert('RGB').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = thumb.tobytes()
+    count = len(pixels) // 3
+    color = tuple(sum(pixels[band::3]) // count for band in range(3))
+    return dhash(thumb), color
+
+
+def upload_signature(classifier, image_bytes):
+    """
+    (dHash, mean RGB, RGB pixels) of an upload as the classifier sees it,
+    or None if it cannot be decoded
+    Runs where decoding belongs: in an inference worker.
+    """
+    image = classifier.preprocess_image(image_bytes)
+    if image is None:
+        return None
+    image_hash, color = image_signature(image)
+    return image_hash, color, image.tobytes()
+
+
+def _flip_masks(bits, radius):
+    """XOR masks flipping up to radius of the low bits"""
+    masks = [0]
+    frontier = [(0, 0)]
+    for _ in range(radius):
+        next_frontier = []
+        for mask, lowest in frontier:
+            # Flip bits in increasing order so each mask is generated once
+            for bit in range(lowest, bits):
+                flipped = mask | (1 << bit)
+                masks.append(flipped)
+                next_frontier.append((flipped, bit + 1))
+        frontier = next_frontier
+    return masks
+
+
+class NearDuplicateIndex:
+    """
+    Bounded map from image signature to classification result
+
+    A lookup matches an entry whose hash is within max_distance bits and
+    whose mean colour is within max_color_distance on every channel.
+    """
+
+    def __init__(self, max_entries=10000, max_distance=4, max_color_distance=8, chunks=4):
+        if HASH_BITS % chunks:
+            raise ValueError(f"chunks must divide {HASH_BITS}")
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_color_distance = max_color_distance
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.chunk_radius = max_distance // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._probes = _flip_masks(self.chunk_bits, self.chunk_radius)
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in range(chunks)]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _chunks(self, image_hash):
+        return [(image_hash >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def lookup(self, image_hash, color):
+        """Result of the closest matching entry, or None"""
+        max_distance = self.max_distance
+        with self._lock:
+            candidates = []
+            for buckets, chunk in zip(self._buckets, self._chunks(image_hash)):
+                for probe in self._probes:
+                    bucket = buckets.get(chunk ^ probe)
+                    if bucket:
+                        candidates += [c for c in bucket if (c ^ image_hash).bit_count() <= max_distance]
+            candidates = [c for c in candidates if self._color_matches(c, color)]
+            if not candidates:
+                self.misses += 1
+                return None
+            best = min(candidates, key=lambda c: (c ^ image_hash).bit_count())
+            self.hits += 1
+            self._entries.move_to_end(best)
+            return self._entries[best][1]
+
+    def _color_matches(self, candidate, color):
+        stored = self._entries[candidate][0]
+        return all(abs(a - b) <= self.max_color_distance for a, b in zip(stored, color))
+
+    def add(self, image_hash, color, result):
+        """Remember a result, evicting the least recently used entry if full"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if image_hash in self._entries:
+                self._entries[image_hash] = (color, result)
+                self._entries.move_to_end(image_hash)
+                return
+            self._entries[image_hash] = (color, result)
+            for buckets, chunk in zip(self._buckets, self._chunks(image_hash)):
+                buckets.setdefault(chunk, []).append(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        image_hash, _ = self._entries.popitem(last=False)
+        for buckets, chunk in zip(self._buckets, self._chunks(image_hash)):
+            bucket = buckets[chunk]
+            bucket.remove(image_hash)
+            if not bucket:
+                del buckets[chunk]
+        self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for buckets in self._buckets:
+                buckets.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_distance': self.max_distance,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def create_near_duplicate_index():
+    """
+    Build the index from environment variables
+    Returns None when NEAR_DUPLICATE_MAX_ENTRIES is 0 (disabled)
+    """
+    max_entries = int(os.environ.get('NEAR_DUPLICATE_MAX_ENTRIES', 10000))
+    if max_entries <= 0:
+        return None
+    return NearDuplicateIndex(
+        max_entries=max_entries,
+        max_distance=int(os.environ.get('NEAR_DUPLICATE_MAX_DISTANCE', 4)),
+        max_color_distance=int(os.environ.get('NEAR_DUPLICATE_MAX_COLOR_DISTANCE', 8)),
+    )
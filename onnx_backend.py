@@ -0,0 +1,160 @@
+"""
+ONNX Runtime backend for the injury classifier
+
+Runs a trained model exported to ONNX (see get_training_recommendation)
+on the CPU execution provider. Select it with CLASSIFIER_BACKEND=onnx.
+
+Configuration:
+    ONNX_MODEL_PATH         path to the .onnx file (default models/injury_classifier.onnx)
+    ONNX_INTRA_OP_THREADS   threads used inside one operator (default 1)
+    ONNX_INTER_OP_THREADS   operators run in parallel (default 1)
+
+A model exported with shared_weights.py has its weights mapped read-only
+from a file next to it, shared by every worker process on the host
+instead of copied into each.
+
+Requires onnxruntime (which brings NumPy); the default heuristic backend
+does not.
+"""
+
+import os
+
+from classifier import InjuryClassifier
+from metrics import stage
+from shared_weights import load_shared_weights
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+except ImportError:
+    np = None
+    ort = None
+
+# Normalisation used by the ImageNet-pretrained backbones we recommend
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class OnnxInjuryClassifier(InjuryClassifier):
+    """
+    Classifier backed by an ONNX model with a softmax over injury labels
+
+    The model takes a single float32 image batch, either NCHW or NHWC, and
+    returns one score per label. Results below min_confidence are reported
+    as 'unknown' so the app falls back to its most cautious instructions.
+    """
+    
+    backend_name = 'onnx'
+    
+    # Output order of the model, as in the training recommendation
+    labels = ['minor_cut', 'burn', 'abrasion', 'bruise', 'swelling']
+    
+    min_confidence = 0.5
+    
+    def __init__(self, model_path, intra_op_threads=1, inter_op_threads=1):
+        if ort is None:
+            raise ImportError(
+                "The 'onnx' classifier backend requires onnxruntime: pip install onnxruntime"
+            )
+        super().__init__()
+        self.model_path = model_path
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        # Hand the session views of the mapped weights rather than copies;
+        # pre-packing would make private copies of them again
+        self.shared_weights = load_shared_weights(model_path)
+        self._initializers = []
+        if self.shared_weights is not None:
+            options.add_session_config_entry('session.disable_prepacking', '1')
+            for name, array in self.shared_weights.arrays.items():
+                # The session only borrows the memory: keep the values alive
+                value = ort.OrtValue.ortvalue_from_numpy(array)
+                self._initializers.append(value)
+                options.add_initializer(name, value)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        
+        # Work out the layout and size the model expects
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape
+        self.channels_first = shape[1] == 3
+        height, width = shape[2:4] if self.channels_first else shape[1:3]
+        if isinstance(height, int) and isinstance(width, int):
+            self.target_size = (width, height)
+        
+        # (pixel / 255 - mean) / std  ==  pixel * scale + bias
+        bias_shape = (3, 1, 1) if self.channels_first else (3,)
+        self._scale = np.array([1 / (255 * s) for s in IMAGENET_STD], dtype=np.float32).reshape(bias_shape)
+        self._bias = np.array(
+            [-m / s for m, s in zip(IMAGENET_MEAN, IMAGENET_STD)], dtype=np.float32
+        ).reshape(bias_shape)
+        
+        self._warm_session()
+    
+    @classmethod
+    def from_env(cls):
+        """Create the backend from ONNX_* environment variables"""
+        return cls(
+            os.environ.get('ONNX_MODEL_PATH', os.path.join('models', 'injury_classifier.onnx')),
+            intra_op_threads=int(os.environ.get('ONNX_INTRA_OP_THREADS', 1)),
+            inter_op_threads=int(os.environ.get('ONNX_INTER_OP_THREADS', 1)),
+        )
+    
+    def _warm_session(self):
+        """Run one inference so the first real request doesn't pay for it"""
+        width, height = self.target_size
+        shape = (1, 3, height, width) if self.channels_first else (1, height, width, 3)
+        self.session.run(None, {self.input_name: np.zeros(shape, dtype=np.float32)})
+    
+    def to_tensor(self, image):
+        """Normalised float32 batch of one RGB (or RGBA) image, in the model's layout"""
+        width, height = self.target_size
+        pixels = np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(height, width, -1)[:, :, :3]
+        if self.channels_first:
+            pixels = pixels.transpose(2, 0, 1)
+        # Two in-place passes into the final layout: the multiply converts
+        # and scales, then the bias is added. A per-channel lookup table
+        # would be one pass but measured ~8x slower (np.take per channel).
+        tensor = np.empty((1,) + pixels.shape, dtype=np.float32)
+        np.multiply(pixels, self._scale, out=tensor[0])
+        tensor += self._bias
+        return tensor
+    
+    def classify_image(self, image):
+        """
+        Classify an already preprocessed RGB image of the model's input size
+        Returns: (category, confidence, features)
+        """
+        with stage('tensor'):
+            tensor = self.to_tensor(image)
+        with stage('model'):
+            scores = self.session.run(None, {self.input_name: tensor})[0][0]
+        
+        # Accept models that end in logits as well as in a softmax
+        if scores.min() < 0 or abs(float(scores.sum()) - 1.0) > 1e-3:
+            scores = np.exp(scores - scores.max())
+            scores /= scores.sum()
+        
+        best = int(scores.argmax())
+        features = {'probabilities': {label: float(p) for label, p in zip(self.labels, scores)}}
+        
+        if scores[best] < self.min_confidence:
+            return 'unknown', 0.5, features
+        return self.labels[best], float(scores[best]), features
+    
+    def model_info(self):
+        return {
+            'backend': self.backend_name,
+            'type': 'ONNX Runtime CPU model',
+            'model_path': self.model_path,
+            'input_size': list(self.target_size),
+            'shared_weights': self.shared_weights.info() if self.shared_weights else None,
+            'note': 'Model output is a first-aid hint only, not a diagnosis.'
+        }
@@ -0,0 +1,43 @@
+"""
+Perceptual hashing for images
+
+A difference hash (dHash) shrinks the image to a tiny grayscale grid and
+records, for each pixel, whether it is darker than its right-hand
+neighbour. Re-encoding, rescaling and sensor noise barely change those
+comparisons, so visually similar images get hashes a few bits apart.
+"""
+
+import io
+
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """hash_size**2-bit difference hash of a PIL image, as an int"""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(offset, offset + hash_size):
+            bits = (bits << 1) | (pixels[col] < pixels[col + 1])
+    return bits
+
+
+def dhash_bytes(image_bytes, hash_size=HASH_SIZE):
+    """
+    Difference hash of encoded image bytes
+
+    JPEGs are decoded at reduced scale (draft mode), since only a
+    (hash_size + 1) x hash_size thumbnail is needed.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        return dhash(image, hash_size)
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return (a ^ b).bit_count()
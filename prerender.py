@@ -0,0 +1,83 @@
+"""
+Pre-rendered, pre-compressed responses for immutable content
+
+Pages and JSON documents that never change while the process runs (the
+index page, /api/info, the first-aid catalog) are serialised once at
+startup and compressed with gzip and, when the brotli package is
+installed, brotli. Each request then only picks an encoding and checks
+If-None-Match; no rendering, serialisation or compression happens on
+the request path.
+"""
+
+import gzip
+import hashlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _accepted_encodings(header):
+    """Content codings the client accepts (q=0 excluded)"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrerenderedResponse:
+    """
+    A response body rendered once, stored identity, gzip and brotli encoded
+
+    Every encoding gets its own strong ETag, as required for byte-different
+    representations; a conditional request matching any of them gets 304.
+    """
+
+    def __init__(self, body, mimetype, cache_control='public, max-age=300'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        # encoding -> (body, etag); preferred encodings first
+        self.variants = {}
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        self.variants['identity'] = (body, f'"{digest}"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def serve(self, request, cache_control=None):
+        """Build the Flask response for this request"""
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next(
+            (name for name in self.variants if name in accepted or name == 'identity'),
+            'identity'
+        )
+        body, etag = self.variants[encoding]
+
+        headers = {
+            'ETag': etag,
+            'Cache-Control': cache_control or self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match:
+            candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            matched = candidates & self.etags
+            if matched or '*' in candidates:
+                if matched:
+                    headers['ETag'] = matched.pop()
+                return Response(status=304, headers=headers)
+
+        response = Response(body, mimetype=self.mimetype, headers=headers)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,184 @@
+"""
+Structured request log written off the request thread
+
+Request threads only append a dict to an in-memory buffer; a background
+writer serialises records in batches and appends them to a JSONL file,
+so disk latency never lands on a request. The file is rotated by size
+and by age (requests.jsonl -> requests.jsonl.1 -> ...), keeping a fixed
+number of old files.
+
+When the writer falls behind, the buffer applies backpressure instead
+of growing: above three quarters full only one record in sample_every
+is kept (and marked with 'sample_rate' so counts can be scaled back
+up), and when completely full new records are dropped. Both are
+counted in stats(). close() drains the buffer and closes the file.
+
+Each process needs its own file: put {pid} in the path when several
+gunicorn workers log.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+
+class RequestLog:
+    """Bounded buffer drained to a rotating JSONL file by a writer thread"""
+
+    def __init__(self, path, max_buffer=10000, batch_size=256, flush_interval=1.0,
+                 max_bytes=64 * 1024 * 1024, rotate_seconds=24 * 3600, backups=5, sample_every=10):
+        self.path_template = path
+        self.path = None
+        self.max_buffer = max_buffer
+        self.high_water = max(1, max_buffer * 3 // 4)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.sample_every = sample_every
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+        self._closed = False
+        self._file = None
+        self._opened_at = 0.0
+        self._sample_counter = 0
+        self._counters = {
+            'logged': 0, 'written': 0, 'sampled_out': 0, 'dropped': 0,
+            'batches': 0, 'rotations': 0, 'write_errors': 0,
+        }
+
+    def log(self, record):
+        """Queue one record; returns False if it was sampled out or dropped"""
+        with self._lock:
+            if self._closed:
+                return False
+            if self._thread is None:
+                # Started on first use, so a preloaded app starts it after fork
+                self._thread = threading.Thread(target=self._run, name='request-log', daemon=True)
+                self._thread.start()
+            pending = len(self._buffer)
+            if pending >= self.max_buffer:
+                self._counters['dropped'] += 1
+                return False
+            if pending >= self.high_water:
+                self._sample_counter += 1
+                if self._sample_counter % self.sample_every:
+                    self._counters['sampled_out'] += 1
+                    return False
+                record['sample_rate'] = self.sample_every
+            self._buffer.append(record)
+            self._counters['logged'] += 1
+            if pending + 1 >= self.batch_size:
+                self._wake.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # Wait for a full batch, but no longer than flush_interval
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._buffer) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wake.wait(remaining)
+                count = min(len(self._buffer), self.batch_size)
+                batch = [self._buffer.popleft() for _ in range(count)]
+                finished = self._closed and not self._buffer
+            if batch:
+                self._write(batch)
+            if finished:
+                break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, batch):
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in batch).encode()
+        try:
+            self._rotate_if_needed(len(data))
+            self._file.write(data)
+            self._file.flush()
+        except OSError as e:
+            with self._lock:
+                self._counters['write_errors'] += 1
+            print(f"Request log write failed: {e}", file=sys.stderr)
+            return
+        with self._lock:
+            self._counters['written'] += len(batch)
+            self._counters['batches'] += 1
+
+    def _open(self):
+        self.path = self.path_template.format(pid=os.getpid())
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self._opened_at = time.time()
+
+    def _rotate_if_needed(self, incoming):
+        if self._file is None:
+            self._open()
+        size = self._file.tell()
+        too_big = size and size + incoming > self.max_bytes
+        too_old = size and time.time() - self._opened_at >= self.rotate_seconds
+        if not (too_big or too_old):
+            return
+        self._file.close()
+        self._file = None
+        for index in range(self.backups - 1, 0, -1):
+            older = f'{self.path}.{index}'
+            if os.path.exists(older):
+                os.replace(older, f'{self.path}.{index + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        with self._lock:
+            self._counters['rotations'] += 1
+        self._open()
+
+    def close(self, timeout=10.0):
+        """Stop accepting records, write everything buffered and close the file"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            self._wake.notify()
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'buffered': len(self._buffer),
+                'max_buffer': self.max_buffer,
+                'path': self.path,
+            })
+        return stats
+
+
+def create_request_log():
+    """
+    Build the request log from environment variables
+    Returns None when REQUEST_LOG (the file path) is not set
+    """
+    path = os.environ.get('REQUEST_LOG')
+    if not path:
+        return None
+    return RequestLog(
+        path,
+        max_buffer=int(os.environ.get('REQUEST_LOG_BUFFER', 10000)),
+        batch_size=int(os.environ.get('REQUEST_LOG_BATCH', 256)),
+        flush_interval=float(os.environ.get('REQUEST_LOG_FLUSH_SECONDS', 1)),
+        max_bytes=int(os.environ.get('REQUEST_LOG_MAX_BYTES', 64 * 1024 * 1024)),
+        rotate_seconds=float(os.environ.get('REQUEST_LOG_ROTATE_SECONDS', 24 * 3600)),
+        backups=int(os.environ.get('REQUEST_LOG_BACKUPS', 5)),
+        sample_every=int(os.environ.get('REQUEST_LOG_SAMPLE_EVERY', 10)),
+    )
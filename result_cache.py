@@ -0,0 +1,246 @@
+"""
+Content-addressed result cache for image classification
+
+Results are keyed by a hash of the uploaded bytes, so re-submitting the
+same photo (mobile retries, double taps) skips decode and feature
+extraction. The in-process cache is an LRU bounded by the serialised
+size of its entries, with a TTL. Concurrent requests for the same key
+are coalesced onto a single computation. An optional SQLite backend
+lets several gunicorn workers on one host share results.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def content_key(data):
+    """Hash uploaded bytes into a cache key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class SqliteResultBackend:
+    """
+    Result store shared between processes through a SQLite file
+
+    Entries are JSON-encoded. The store is bounded by the total size of
+    the encoded values; least recently used rows are deleted when the
+    bound is exceeded.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Set up with a throwaway connection: one kept open here would be
+        # inherited by every worker when gunicorn forks a preloaded app
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS results ('
+                    ' key TEXT PRIMARY KEY,'
+                    ' value TEXT NOT NULL,'
+                    ' size INTEGER NOT NULL,'
+                    ' expires_at REAL NOT NULL,'
+                    ' last_access REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the stored value, or None if missing or expired"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE results SET last_access = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        """Store a value and return the number of rows evicted to make room"""
+        encoded = json.dumps(value)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (key, encoded, len(encoded), now + ttl, now),
+            )
+            conn.execute('DELETE FROM results WHERE expires_at <= ?', (now,))
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            evicted = 0
+            while total > self.max_bytes:
+                row = conn.execute(
+                    'SELECT key, size FROM results ORDER BY last_access LIMIT 1'
+                ).fetchone()
+                if row is None or row[0] == key:
+                    break
+                conn.execute('DELETE FROM results WHERE key = ?', (row[0],))
+                total -= row[1]
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM results')
+
+
+class ResultCache:
+    """
+    Byte-bounded LRU cache with TTL and request coalescing
+
+    Values must be JSON-serialisable; their encoded length is what counts
+    against max_bytes. A max_bytes of 0 disables caching entirely, but
+    concurrent identical requests are still coalesced.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, ttl=3600, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._size = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, calling compute() on a miss
+
+        If another thread is already computing the same key, wait for its
+        result instead of starting a second computation. Exceptions from
+        compute() propagate to every waiter and are not cached.
+        """
+        with self._lock:
+            value = self._get_local(key)
+            if value is not None:
+                self._counters['hits'] += 1
+                return value
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+            else:
+                self._counters['coalesced'] += 1
+        if not leader:
+            return pending.result()
+
+        try:
+            value = None
+            if self.backend is not None and self.max_bytes:
+                value = self.backend.get(key)
+            if value is not None:
+                with self._lock:
+                    self._counters['shared_hits'] += 1
+            else:
+                with self._lock:
+                    self._counters['misses'] += 1
+                value = compute()
+                if self.backend is not None and self.max_bytes:
+                    evicted = self.backend.set(key, value, self.ttl)
+                    with self._lock:
+                        self._counters['evictions'] += evicted
+            self._put_local(key, value)
+            pending.set_result(value)
+            return value
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _get_local(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._size -= size
+            self._counters['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key, value):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """Counters and current occupancy"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'shared_backend': type(self.backend).__name__ if self.backend is not None else None,
+            })
+        return stats
+
+
+def create_result_cache():
+    """Build the result cache from environment configuration"""
+    backend = None
+    shared_path = os.environ.get('RESULT_CACHE_SQLITE')
+    if shared_path:
+        backend = SqliteResultBackend(
+            shared_path,
+            max_bytes=int(os.environ.get('RESULT_CACHE_SQLITE_MAX_BYTES', 64 * 1024 * 1024)),
+        )
+    return ResultCache(
+        max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 8 * 1024 * 1024)),
+        ttl=float(os.environ.get('RESULT_CACHE_TTL', 3600)),
+        backend=backend,
+    )
@@ -0,0 +1,212 @@
+"""
+Model weights shared read-only between processes
+
+Every gunicorn worker and every inference worker process builds its own
+classifier, and an ONNX session normally copies the model's weights
+into private memory, so each process holds a full copy. Exporting the
+model with this module moves the weights into a separate file:
+
+    python shared_weights.py models/injury_classifier.onnx
+    # writes models/injury_classifier.shared.onnx
+    #    and models/injury_classifier.shared.onnx.weights
+
+Point ONNX_MODEL_PATH at the .shared.onnx file. The backend then maps
+the .weights file read-only and hands ONNX Runtime views of it instead
+of copies, so every process on the host uses the same page-cache pages
+and an extra worker costs only its private working memory. The exported
+model is still a valid ONNX model (the weights file doubles as its
+external data), so other tools can load it as usual.
+
+The .weights file is an 8-byte little-endian header length, a JSON
+header describing each tensor ({name: {dtype, shape, offset}}, offsets
+from the start of the file, 64-byte aligned) and the raw tensor data.
+
+ONNX Runtime's weight pre-packing is turned off for mapped weights,
+since pre-packed weights are private copies; on some models that costs
+a little speed per inference. Weights that graph optimisations rewrite
+(e.g. BatchNorm folded into a Conv) also end up private, so export a
+model that has already been optimised.
+
+process_memory() and mapped_memory() report how much of a process's
+memory is shared and how much is its own, from /proc (Linux only).
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ALIGNMENT = 64
+WEIGHTS_SUFFIX = '.weights'
+
+
+def weights_path(model_path):
+    """Path of the weights file that belongs to an exported model"""
+    return model_path + WEIGHTS_SUFFIX
+
+
+def export_shared_weights(model_path, output_path=None):
+    """
+    Rewrite an ONNX model so its weights live in a mappable file
+    Returns the path of the exported model (default: <name>.shared.onnx).
+    Needs the onnx package; serving the exported model does not.
+    """
+    try:
+        import onnx
+        from onnx import numpy_helper
+    except ImportError:
+        raise ImportError("Exporting shared weights requires onnx: pip install onnx") from None
+
+    if output_path is None:
+        output_path = os.path.splitext(model_path)[0] + '.shared.onnx'
+    data_path = weights_path(output_path)
+    model = onnx.load(model_path)
+
+    # Lay the tensors out first: the header must be written before them
+    arrays = []
+    for tensor in model.graph.initializer:
+        array = numpy_helper.to_array(tensor)
+        if array.dtype.kind in 'biuf':
+            arrays.append((tensor, np.ascontiguousarray(array)))
+    header = {}
+    offset = 0
+    for tensor, array in arrays:
+        header[tensor.name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    # Offsets are relative to the data so far; shifting them past the
+    # header can lengthen the header, so repeat until it fits
+    data_start = 0
+    while True:
+        shifted = {name: dict(spec, offset=spec['offset'] + data_start) for name, spec in header.items()}
+        encoded = json.dumps(shifted).encode()
+        needed = -(-(8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+        if needed <= data_start:
+            break
+        data_start = needed
+    header = shifted
+    encoded = encoded.ljust(data_start - 8)
+
+    with open(data_path, 'wb') as output:
+        output.write(len(encoded).to_bytes(8, 'little'))
+        output.write(encoded)
+        for tensor, array in arrays:
+            spec = header[tensor.name]
+            output.seek(spec['offset'])
+            output.write(array.tobytes())
+            # Point the model at the same bytes as ONNX external data
+            tensor.ClearField('raw_data')
+            for field in ('float_data', 'int32_data', 'int64_data', 'double_data', 'uint64_data'):
+                tensor.ClearField(field)
+            tensor.data_location = onnx.TensorProto.EXTERNAL
+            del tensor.external_data[:]
+            for key, value in (('location', os.path.basename(data_path)),
+                               ('offset', str(spec['offset'])), ('length', str(array.nbytes))):
+                entry = tensor.external_data.add()
+                entry.key, entry.value = key, value
+
+    onnx.save(model, output_path)
+    return output_path
+
+
+class SharedWeights:
+    """Read-only NumPy views of the tensors in a mapped weights file"""
+
+    def __init__(self, path):
+        if np is None:
+            raise ImportError("Shared model weights require NumPy: pip install numpy")
+        self.path = path
+        with open(path, 'rb') as weights:
+            # The mapping stays valid after the file is closed
+            self._map = mmap.mmap(weights.fileno(), 0, access=mmap.ACCESS_READ)
+        header_length = int.from_bytes(self._map[:8], 'little')
+        header = json.loads(self._map[8:8 + header_length])
+        self.arrays = {
+            name: np.frombuffer(
+                self._map, dtype=spec['dtype'], count=math.prod(spec['shape']), offset=spec['offset']
+            ).reshape(spec['shape'])
+            for name, spec in header.items()
+        }
+        self.nbytes = sum(array.nbytes for array in self.arrays.values())
+
+    def info(self):
+        return {'path': self.path, 'tensors': len(self.arrays), 'bytes': self.nbytes}
+
+
+def load_shared_weights(model_path):
+    """The mapped weights of an exported model, or None for an ordinary model"""
+    path = weights_path(model_path)
+    if not os.path.exists(path):
+        return None
+    return SharedWeights(path)
+
+
+def _read_kb_fields(lines):
+    fields = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB':
+            fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return fields
+
+
+def _summarise(fields):
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def process_memory(pid='self'):
+    """
+    Resident memory of a process in bytes, split into pages shared with
+    other processes and pages only it uses (private), plus its
+    proportional share (pss); None where /proc is unavailable
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as rollup:
+            return _summarise(_read_kb_fields(rollup))
+    except OSError:
+        return None
+
+
+def mapped_memory(path, pid='self'):
+    """Like process_memory, counting only the process's mappings of one file"""
+    path = os.path.realpath(path)
+    totals = {}
+    try:
+        with open(f'/proc/{pid}/smaps') as smaps:
+            inside = False
+            for line in smaps:
+                first = line.split(None, 1)[0]
+                if not first.endswith(':'):
+                    # A mapping's header line: address range ... pathname
+                    inside = line.rstrip('\n').endswith(' ' + path)
+                elif inside:
+                    for name, value in _read_kb_fields([line]).items():
+                        totals[name] = totals.get(name, 0) + value
+    except OSError:
+        return None
+    return _summarise(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export an ONNX model with weights that worker processes share')
+    parser.add_argument('model', help='path of the .onnx model')
+    parser.add_argument('--output', help='exported model path (default: <model>.shared.onnx)')
+    args = parser.parse_args()
+    output_path = export_shared_weights(args.model, args.output)
+    size = os.path.getsize(weights_path(output_path))
+    print(f"Wrote {output_path} and {weights_path(output_path)} ({size / 1024 / 1024:.1f} MB)")
+    print(f"Serve it with CLASSIFIER_BACKEND=onnx ONNX_MODEL_PATH={output_path}")
+
+
+if __name__ == '__main__':
+    main()
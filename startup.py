@@ -0,0 +1,110 @@
+"""
+Process startup: preloading, warm-up and readiness
+
+Pillow imports its format plugins lazily and the first classification
+runs through cold code paths, so without warm-up the first upload a
+process serves is several times slower than the rest. preload() does
+the import-time part; it runs while app.py is imported, which under
+gunicorn --preload happens once in the master, so workers share the
+result copy-on-write. Readiness then runs the per-process part (worker
+processes, a few classifications of synthetic images) in the background
+and /health only reports ready once it has finished.
+"""
+
+import io
+import os
+import threading
+import time
+
+from PIL import Image
+
+# One synthetic image per accepted upload format, in this order
+WARMUP_FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+
+
+def preload():
+    """Import every Pillow plugin now instead of on the first upload"""
+    Image.init()
+
+
+def warmup_image_count():
+    """Number of synthetic images to classify during warm-up (WARMUP_IMAGES)"""
+    return int(os.environ.get('WARMUP_IMAGES', len(WARMUP_FORMATS)))
+
+
+def synthetic_images(count=None, size=(640, 480)):
+    """
+    Deterministic photo-sized images for warm-up, as encoded bytes
+    Cycles through the upload formats so each decoder gets exercised
+    """
+    if count is None:
+        count = warmup_image_count()
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', (
+        gradient,
+        gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+        gradient.transpose(Image.Transpose.ROTATE_180),
+    ))
+    images = []
+    for index in range(count):
+        fmt = WARMUP_FORMATS[index % len(WARMUP_FORMATS)]
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt)
+        images.append(buffer.getvalue())
+    return images
+
+
+class Readiness:
+    """
+    Runs a process's warm-up once, in the background, and reports
+    whether the process is ready to take traffic
+
+    States: 'starting' until begin() is called and warm-up finishes,
+    then 'ready', or 'failed' if warm-up raised.
+    """
+
+    def __init__(self, warm_up):
+        self.warm_up = warm_up
+        self.state = 'starting'
+        self.error = None
+        self.warmup_seconds = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self):
+        """Start warm-up in a background thread; later calls do nothing"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='warm-up', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            self.warm_up()
+            self.state = 'ready'
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            self.error = str(e)
+            self.state = 'failed'
+        finally:
+            self.warmup_seconds = time.perf_counter() - started
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def wait(self, timeout=None):
+        """Block until warm-up has finished; returns whether it succeeded"""
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self):
+        status = {'state': self.state}
+        if self.warmup_seconds is not None:
+            status['warmup_seconds'] = round(self.warmup_seconds, 3)
+        if self.error is not None:
+            status['error'] = self.error
+        return status
@@ -0,0 +1,111 @@
+"""
+Tests for the admission controller
+Run with: python -m pytest test_admission.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, DeadlineExceeded, RateLimited, TokenBucket
+from inference_executor import InferenceUnavailable
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, burst=2, now=0)
+    assert bucket.take(0) == 0
+    assert bucket.take(0) == 0
+    assert bucket.take(0) == pytest.approx(0.5)
+    assert bucket.take(0.5) == 0
+
+
+def test_rate_limit_is_per_client():
+    controller = AdmissionController(client_rate=0.01, client_burst=1)
+    controller.admit('a').release()
+    with pytest.raises(RateLimited) as error:
+        controller.admit('a')
+    assert error.value.retry_after >= 1
+    controller.admit('b').release()
+    assert controller.stats()['rate_limited'] == 1
+
+
+def test_forgets_least_recently_seen_clients():
+    controller = AdmissionController(client_rate=1, max_clients=2)
+    for client in 'abc':
+        controller.admit(client).release()
+    assert controller.stats()['clients'] == 2
+
+
+def test_full_queue_rejects_immediately():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, client_rate=0)
+    ticket = controller.admit('a')
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as error:
+        controller.admit('b')
+    assert time.monotonic() - started < 0.5
+    # Handled like any other saturation by the existing 503 paths
+    assert isinstance(error.value, InferenceUnavailable)
+    ticket.release()
+    assert controller.stats()['active'] == 0
+
+
+def test_waiter_is_shed_at_its_deadline():
+    controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=5, client_rate=0)
+    ticket = controller.admit('a')
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        controller.admit('b', timeout=0.1)
+    assert time.monotonic() - started < 1
+    stats = controller.stats()
+    assert stats['shed'] == 1
+    assert stats['waiting'] == 0
+    ticket.release()
+    assert controller.stats()['active'] == 0
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    controller = AdmissionController(max_concurrent=1, max_queue=4, client_rate=0)
+    ticket = controller.admit('a')
+    order = []
+
+    def wait(name):
+        controller.admit(name).release()
+        order.append(name)
+
+    threads = []
+    for name in ('first', 'second'):
+        thread = threading.Thread(target=wait, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while controller.stats()['waiting'] < len(threads):
+            time.sleep(0.01)
+    ticket.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['first', 'second']
+    stats = controller.stats()
+    assert stats['admitted'] == 3
+    assert stats['queued'] == 2
+    assert stats['active'] == 0
+
+
+def test_ticket_check_sheds_expired_requests():
+    controller = AdmissionController(client_rate=0)
+    ticket = controller.admit('a', timeout=0.01)
+    time.sleep(0.02)
+    with pytest.raises(DeadlineExceeded):
+        ticket.check()
+    ticket.release()
+    ticket.release()
+    stats = controller.stats()
+    assert stats['expired'] == 1
+    assert stats['active'] == 0
+
+
+def test_unlimited_concurrency_never_queues():
+    controller = AdmissionController(max_concurrent=0, client_rate=0)
+    tickets = [controller.admit('a') for _ in range(100)]
+    for ticket in tickets:
+        ticket.release()
+    assert controller.stats()['active'] == 0
@@ -0,0 +1,474 @@
+"""
+Tests for the Flask API using the built-in test client
+Run with: python -m pytest test_app.py
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+import app as app_module
+from admission import AdmissionController
+from capture_store import CaptureStore, load_index
+from inference_executor import InferenceExecutor
+from request_log import RequestLog
+from result_cache import content_key
+from test_api import create_test_image
+
+
+@pytest.fixture
+def client():
+    app_module.app.config['TESTING'] = True
+    assert app_module.startup.wait(timeout=60), app_module.startup.status()
+    app_module.result_cache.clear()
+    if app_module.near_duplicates is not None:
+        app_module.near_duplicates.clear()
+    app_module.admission.reset()
+    with app_module.app.test_client() as client:
+        yield client
+
+
+def post_image(client, image_bytes, filename='test.png', path='/api/analyze'):
+    return client.post(
+        path,
+        data={'image': (io.BytesIO(image_bytes), filename)},
+        content_type='multipart/form-data',
+    )
+
+
+def test_health(client):
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'healthy'
+
+
+def test_analyze_returns_classification(client):
+    response = post_image(client, create_test_image('red').getvalue())
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] is True
+    assert data['classification']['category'] in app_module.FIRST_AID_INSTRUCTIONS
+
+
+def test_analyze_rejects_bad_extension(client):
+    response = post_image(client, b'This is not an image', filename='test.txt')
+    assert response.status_code == 400
+
+
+def test_resubmitted_image_is_served_from_cache(client):
+    image_bytes = create_test_image('blue').getvalue()
+    before = client.get('/api/cache/stats').get_json()
+    first = post_image(client, image_bytes).get_json()
+    second = post_image(client, image_bytes).get_json()
+    assert first == second
+    after = client.get('/api/cache/stats').get_json()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
+
+
+def post_batch(client, images):
+    return client.post(
+        '/api/analyze/batch',
+        data={'images': [(io.BytesIO(image_bytes), filename) for filename, image_bytes in images]},
+        content_type='multipart/form-data',
+    )
+
+
+def test_batch_reports_most_severe_category(client):
+    images = [
+        ('red.png', create_test_image('red').getvalue()),
+        ('blue.png', create_test_image('blue').getvalue()),
+        ('gray.png', create_test_image('gray').getvalue()),
+    ]
+    response = post_batch(client, images)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [r['filename'] for r in data['results']] == ['red.png', 'blue.png', 'gray.png']
+    severities = [r['classification']['severity'] for r in data['results']]
+    order = app_module.SEVERITY_ORDER
+    assert data['aggregate']['severity'] == max(severities, key=order.index)
+    assert data['aggregate']['analyzed_count'] == 3
+
+
+def test_batch_reports_invalid_files_per_image(client):
+    images = [('ok.png', create_test_image('red').getvalue()), ('notes.txt', b'hello')]
+    data = post_batch(client, images).get_json()
+    assert data['results'][0]['success'] is True
+    assert data['results'][1]['success'] is False
+    assert data['aggregate']['image_count'] == 2
+    assert data['aggregate']['analyzed_count'] == 1
+
+
+def test_batch_size_limit(client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MAX_BATCH_IMAGES', 2)
+    image_bytes = create_test_image('red').getvalue()
+    response = post_batch(client, [('a.png', image_bytes)] * 3)
+    assert response.status_code == 400
+
+
+def test_analyze_returns_503_when_saturated(client, monkeypatch):
+    def saturated(image_bytes):
+        raise app_module.InferenceUnavailable('Server is busy, please retry shortly', retry_after=3)
+
+    monkeypatch.setattr(app_module.inference_executor, 'classify', saturated)
+    monkeypatch.setattr(app_module.inference_executor, 'classify_rgb', saturated)
+    response = post_image(client, create_test_image('red').getvalue())
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert client.get('/health').status_code == 200
+
+
+def test_server_timing_and_metrics(client):
+    # Distinct bytes so the result cache cannot answer
+    image_bytes = create_test_image('red').getvalue() + b'server-timing'
+    response = post_image(client, image_bytes)
+    assert response.status_code == 200
+    stages = {part.split(';')[0] for part in response.headers['Server-Timing'].split(', ')}
+    assert {'parse', 'decode', 'resize', 'features', 'serialize', 'total'} <= stages
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'first_aid_stage_seconds_count{stage="decode"}' in text
+    assert 'first_aid_request_seconds_bucket{endpoint="analyze_injury",le="+Inf"}' in text
+    assert 'first_aid_classifications_total{category=' in text
+
+
+def test_metrics_can_be_disabled(client, monkeypatch):
+    monkeypatch.setattr(app_module.metrics, 'enabled', False)
+    response = post_image(client, create_test_image('red').getvalue())
+    assert 'Server-Timing' not in response.headers
+    assert client.get('/metrics').status_code == 404
+
+
+def test_memory_report(client):
+    payload = client.get('/api/memory').get_json()
+    assert payload['model_weights'] is None  # the heuristic backend has no weights
+    if payload['process'] is not None:
+        assert payload['process']['rss'] == payload['process']['shared'] + payload['process']['private']
+        assert 'first_aid_process_memory_bytes{kind="pss"}' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_analyze_rejects_image_bomb_before_decoding(client):
+    from test_validation import png_header_only
+
+    response = post_image(client, png_header_only(30000, 30000))
+    assert response.status_code == 413
+    assert 'pixels' in response.get_json()['error']
+    response = post_image(client, b'This is not an image', filename='photo.png')
+    assert response.status_code == 415
+
+
+def test_compact_response_refers_to_catalog(client):
+    image_bytes = create_test_image('red').getvalue()
+    full = post_image(client, image_bytes).get_json()
+    compact = post_image(client, image_bytes, path='/api/analyze?mode=compact').get_json()
+    assert set(compact) == {'success', 'classification', 'catalog_version'}
+    assert compact['classification'] == full['classification']
+
+    catalog = client.get('/api/catalog').get_json()
+    assert catalog['version'] == compact['catalog_version']
+    entry = catalog['categories'][compact['classification']['category']]
+    assert entry['instructions'] == full['instructions']
+    assert catalog['disclaimer'] == full['disclaimer']
+
+
+def test_fields_selection(client):
+    image_bytes = create_test_image('blue').getvalue()
+    data = post_image(client, image_bytes, path='/api/analyze?fields=classification,instructions').get_json()
+    assert set(data) == {'success', 'classification', 'instructions'}
+    response = post_image(client, image_bytes, path='/api/analyze?fields=bogus')
+    assert response.status_code == 400
+
+
+def test_catalog_is_cacheable(client):
+    first = client.get('/api/catalog')
+    etag = first.headers['ETag']
+    assert 'max-age' in first.headers['Cache-Control']
+    assert client.get('/api/catalog', headers={'If-None-Match': etag}).status_code == 304
+    version = first.get_json()['version']
+    pinned = client.get(f'/api/catalog?v={version}')
+    assert 'immutable' in pinned.headers['Cache-Control']
+
+
+@pytest.mark.parametrize('path', ['/', '/api/info', '/api/catalog', '/api/instructions/burn'])
+def test_prerendered_responses_are_conditional(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert etag.startswith('"') and not etag.startswith('W/')
+    again = client.get(path, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+
+
+def test_prerendered_responses_are_compressed(client):
+    import gzip
+
+    plain = client.get('/api/info')
+    compressed = client.get('/api/info', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert len(compressed.get_data()) < len(plain.get_data())
+
+
+def test_instructions_per_category(client):
+    data = client.get('/api/instructions/burn').get_json()
+    assert data['category'] == 'burn'
+    assert data['instructions']['immediate_steps'] == app_module.FIRST_AID_INSTRUCTIONS['burn']['immediate_steps']
+    assert client.get('/api/instructions/nope').status_code == 404
+
+
+def test_analyze_raw_accepts_pixels_and_png(client):
+    image_bytes = create_test_image('red').getvalue()
+    expected = post_image(client, image_bytes).get_json()['classification']
+    pixels = app_module.classifier.preprocess_image(image_bytes).tobytes()
+
+    raw = client.post('/api/analyze/raw', data=pixels, content_type='application/octet-stream')
+    assert raw.status_code == 200
+    assert raw.get_json()['classification'] == expected
+    # What the page sends: getImageData's RGBA
+    rgba = app_module.classifier.preprocess_image(image_bytes).convert('RGBA').tobytes()
+    raw = client.post('/api/analyze/raw', data=rgba, content_type='application/octet-stream')
+    assert raw.get_json()['classification'] == expected
+    png = client.post('/api/analyze/raw?mode=compact', data=image_bytes, content_type='image/png')
+    assert set(png.get_json()) == {'success', 'classification', 'catalog_version'}
+
+
+def test_analyze_raw_rejects_bad_bodies(client):
+    response = client.post('/api/analyze/raw', data=b'\x00' * 1000, content_type='application/octet-stream')
+    assert response.status_code == 400
+    assert '224x224' in response.get_json()['error']
+    response = client.post('/api/analyze/raw', data=b'GIF89a', content_type='image/gif')
+    assert response.status_code == 415
+
+
+def test_near_duplicate_upload_reuses_result(client, monkeypatch):
+    if app_module.near_duplicates is None:
+        pytest.skip('near-duplicate index disabled')
+    from PIL import Image
+
+    image = Image.open(create_test_image('red'))
+    original = io.BytesIO()
+    image.save(original, format='PNG')
+    reencoded = io.BytesIO()
+    image.resize((448, 448)).save(reencoded, format='JPEG', quality=80)
+
+    def decode_in_web_process(image_bytes):
+        raise AssertionError('uploads should be decoded by the inference workers')
+
+    if app_module.inference_executor.mode == 'process' and app_module.inference_executor.workers:
+        monkeypatch.setattr(app_module.classifier, 'preprocess_image', decode_in_web_process)
+    first = post_image(client, original.getvalue()).get_json()
+    assert first['success'] is True
+
+    def fail(image_bytes):
+        raise AssertionError('near-duplicate should not be classified again')
+
+    monkeypatch.setattr(app_module.inference_executor, 'classify_rgb', fail)
+    second = post_image(client, reencoded.getvalue(), filename='test.jpg').get_json()
+    assert second['classification'] == first['classification']
+    assert client.get('/api/cache/stats').get_json()['near_duplicates']['hits'] == 1
+
+
+def test_analyze_rate_limits_each_client(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'admission', AdmissionController(client_rate=0.01, client_burst=2))
+    image = create_test_image().getvalue()
+    assert post_image(client, image).status_code == 200
+    assert post_image(client, image).status_code == 200
+    response = post_image(client, image)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # Another client has its own budget
+    other = client.post('/api/analyze', data={'image': (io.BytesIO(image), 'test.png')},
+                        content_type='multipart/form-data', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert other.status_code == 200
+    assert client.get('/api/admission/stats').get_json()['rate_limited'] == 1
+
+
+def test_spoofed_forwarded_for_does_not_reset_rate_limit(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'admission', AdmissionController(client_rate=0.01, client_burst=2))
+    monkeypatch.setattr(app_module, 'TRUST_PROXY_HOPS', 1)
+    image = create_test_image().getvalue()
+    statuses = []
+    for spoofed in ('1.1.1.1', '2.2.2.2', '3.3.3.3'):
+        response = client.post('/api/analyze', data={'image': (io.BytesIO(image), 'test.png')},
+                               content_type='multipart/form-data',
+                               headers={'X-Forwarded-For': f'{spoofed}, 203.0.113.7'})
+        statuses.append(response.status_code)
+    assert statuses == [200, 200, 429]
+    assert client.get('/api/admission/stats').get_json()['clients'] == 1
+
+
+def test_analyze_sheds_when_server_is_full(client, monkeypatch):
+    controller = AdmissionController(max_concurrent=1, max_queue=0, client_rate=0)
+    monkeypatch.setattr(app_module, 'admission', controller)
+    held = controller.admit('someone-else')
+    try:
+        response = post_image(client, create_test_image().getvalue())
+    finally:
+        held.release()
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    assert controller.stats()['queue_full'] == 1
+    assert post_image(client, create_test_image().getvalue()).status_code == 200
+
+
+def test_job_is_not_queued_after_its_deadline(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'client_timeout', lambda: 1e-6)
+    submitted = app_module.jobs.stats()['submitted']
+    response = post_image(client, create_test_image('red').getvalue(), path='/api/jobs')
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    assert app_module.jobs.stats()['submitted'] == submitted
+
+
+def test_job_api_runs_analysis_in_background(client):
+    response = post_image(client, create_test_image('red').getvalue(), path='/api/jobs')
+    assert response.status_code == 202
+    job = response.get_json()
+    assert response.headers['Location'] == job['status_url']
+
+    status = client.get(job['status_url']).get_json()
+    while status['status'] not in ('done', 'failed'):
+        time.sleep(0.01)
+        status = client.get(job['status_url']).get_json()
+    assert status['status'] == 'done'
+    assert status['result']['classification']['category'] in app_module.FIRST_AID_INSTRUCTIONS
+
+    events = client.get(job['events_url'] + '?fields=classification')
+    assert events.mimetype == 'text/event-stream'
+    body = events.get_data(as_text=True)
+    assert body.startswith('event: done\n')
+    assert 'instructions' not in body
+    assert client.get('/api/jobs/stats').get_json()['completed'] >= 1
+
+
+def test_job_api_validates_upload_and_unknown_ids(client):
+    assert post_image(client, b'not an image', path='/api/jobs').status_code == 415
+    assert client.get('/api/jobs/unknown').status_code == 404
+    assert client.get('/api/jobs/unknown/events').status_code == 404
+
+
+def test_job_events_follow_status_changes(client, monkeypatch):
+    release = threading.Event()
+    record = app_module.jobs.submit(lambda: release.wait(5) and {'success': True})
+    threading.Timer(0.1, release.set).start()
+    body = client.get(f"/api/jobs/{record['id']}/events").get_data(as_text=True)
+    statuses = [line.split(': ', 1)[1] for line in body.splitlines() if line.startswith('event:')]
+    assert statuses[-1] == 'done'
+    assert statuses[0] in ('queued', 'running')
+
+
+def test_analyze_calls_are_logged(client, monkeypatch, tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path))
+    monkeypatch.setattr(app_module, 'request_log', log)
+    image = create_test_image('red').getvalue()
+    assert post_image(client, image).status_code == 200
+    assert post_image(client, image, filename='notes.txt').status_code == 400
+    client.get('/api/info')
+    log.close()
+    with open(path) as log_file:
+        ok, rejected = [json.loads(line) for line in log_file]
+    assert ok['endpoint'] == 'analyze_injury'
+    assert ok['status'] == 200
+    assert ok['image_sha256'] == content_key(image)
+    assert ok['category'] in app_module.FIRST_AID_INSTRUCTIONS
+    assert set(ok['features']) >= {'avg_red', 'red_dominance'}
+    assert ok['latency_ms'] > 0
+    assert rejected['status'] == 400
+    assert 'category' not in rejected
+
+
+def test_batch_and_job_analyses_are_logged(client, monkeypatch, tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path))
+    monkeypatch.setattr(app_module, 'request_log', log)
+    blue = create_test_image('blue').getvalue()
+    assert post_batch(client, [('a.png', blue), ('b.txt', blue)]).status_code == 200
+    red = create_test_image('red').getvalue()
+    job = post_image(client, red, path='/api/jobs').get_json()
+    record = app_module.jobs.wait(job['job_id'], 'queued', timeout=10)
+    app_module.jobs.wait(job['job_id'], record['status'], timeout=10)
+    log.close()
+    with open(path) as log_file:
+        records = {record['endpoint']: record for record in map(json.loads, log_file)}
+    batch = records['analyze_batch']
+    assert batch['status'] == 200
+    assert batch['images'][0]['image_sha256'] == content_key(blue)
+    assert 'error' in batch['images'][1]
+    assert records['submit_job']['status'] == 202
+    assert records['submit_job']['job_id'] == job['job_id']
+    assert records['job']['status'] == 200
+    assert records['job']['image_sha256'] == content_key(red)
+    assert records['job']['category'] in app_module.FIRST_AID_INSTRUCTIONS
+
+
+def test_analyzed_uploads_are_captured_when_enabled(client, monkeypatch, tmp_path):
+    store = CaptureStore(str(tmp_path))
+    monkeypatch.setattr(app_module, 'capture_store', store)
+    image = create_test_image('red').getvalue()
+    response = post_image(client, image)
+    store.flush()
+    store.close()
+    [entry] = load_index(str(tmp_path))
+    assert entry['key'] == content_key(image)
+    assert entry['category'] == response.get_json()['classification']['category']
+    assert client.get('/api/cache/stats').get_json()['captures']['captured'] == 1
+
+
+def test_raw_batch_and_job_uploads_are_captured(client, monkeypatch, tmp_path):
+    store = CaptureStore(str(tmp_path))
+    monkeypatch.setattr(app_module, 'capture_store', store)
+    rgba = Image.new('RGBA', (224, 224), (200, 80, 80, 255)).tobytes()
+    assert client.post('/api/analyze/raw', data=rgba, content_type='application/octet-stream').status_code == 200
+    batch = [('a.png', create_test_image('blue').getvalue()), ('b.png', create_test_image('normal').getvalue())]
+    assert post_batch(client, batch).status_code == 200
+    job = post_image(client, create_test_image('red').getvalue() + b'job', path='/api/jobs').get_json()
+    assert app_module.jobs.wait(job['job_id'], 'queued', timeout=10)['status'] in ('running', 'done')
+    app_module.jobs.wait(job['job_id'], 'running', timeout=10)
+    store.flush()
+    store.close()
+
+    entries = load_index(str(tmp_path))
+    assert len(entries) == 4
+    raw = next(entry for entry in entries if entry['key'] == content_key(b'rgb:' + rgba))
+    with Image.open(tmp_path / raw['path']) as stored:
+        assert (stored.format, stored.mode, stored.size) == ('PNG', 'RGB', (224, 224))
+        assert stored.getpixel((0, 0)) == (200, 80, 80)
+
+
+def test_concurrent_requests_match_serial_results(client, monkeypatch):
+    """The request pipeline's shared state holds up under thread interleaving"""
+    monkeypatch.setattr(app_module, 'inference_executor', InferenceExecutor(workers=4, mode='thread'))
+    colors = [(r, g, b) for r in (30, 130, 230) for g in (30, 130, 230) for b in (30, 230)]
+    uploads = []
+    for color in colors:
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 240), color).save(buffer, format='JPEG')
+        uploads.append(buffer.getvalue())
+    expected = [app_module.classifier.classify(upload)[:2] for upload in uploads]
+    before = sum(app_module.metrics.CLASSIFICATIONS._values.values())
+
+    def analyze(upload):
+        with app_module.app.test_client() as thread_client:
+            data = post_image(thread_client, upload, filename='photo.jpg').get_json()
+        return data['classification']['category'], data['classification']['confidence']
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(analyze, uploads))
+    finally:
+        sys.setswitchinterval(interval)
+        app_module.inference_executor.shutdown()
+    assert results == expected
+    assert sum(app_module.metrics.CLASSIFICATIONS._values.values()) - before == len(uploads)
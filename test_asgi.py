@@ -0,0 +1,229 @@
+"""
+Tests for the ASGI serving mode, driving the ASGI callable directly
+Run with: python -m pytest test_asgi.py
+"""
+
+import asyncio
+import io
+import json
+
+import pytest
+from werkzeug.datastructures import FileStorage
+from werkzeug.test import encode_multipart
+
+import asgi
+import validation
+from admission import AdmissionController
+from request_log import RequestLog
+from result_cache import content_key
+from test_api import create_test_image
+
+
+@pytest.fixture(autouse=True)
+def fresh_admission():
+    asgi.flask_app.admission.reset()
+
+
+def call(method, path, body=b'', content_type=None, chunk_size=1024):
+    """Run one request through the ASGI app, streaming the body in chunks"""
+    headers = [(b'content-type', content_type.encode())] if content_type else []
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(), 'headers': headers}
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    sent = []
+    reads = []
+
+    async def receive():
+        index = len(reads)
+        reads.append(index)
+        if index >= len(chunks):
+            return {'type': 'http.disconnect'}
+        return {'type': 'http.request', 'body': chunks[index], 'more_body': index < len(chunks) - 1}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    status = sent[0]['status']
+    payload = json.loads(b''.join(m.get('body', b'') for m in sent[1:]))
+    return status, payload, len(reads), len(chunks)
+
+
+def multipart(filename, data, field='image'):
+    boundary, body = encode_multipart({field: FileStorage(io.BytesIO(data), filename)})
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def test_health_and_info():
+    assert asgi.flask_app.startup.wait(timeout=60)
+    assert call('GET', '/health')[:2] == (200, {'status': 'healthy', 'service': 'first-aid-assistant'})
+    status, payload, _, _ = call('GET', '/api/info')
+    assert status == 200
+    assert 'unknown' in payload['supported_categories']
+
+
+def test_analyze_streams_upload():
+    body, content_type = multipart('test.png', create_test_image('red').getvalue())
+    status, payload, _, _ = call('POST', '/api/analyze', body, content_type)
+    assert status == 200
+    assert payload['success'] is True
+    assert payload['classification']['category'] in asgi.flask_app.FIRST_AID_INSTRUCTIONS
+    assert payload['catalog_version'] == asgi.flask_app.CATALOG_VERSION
+
+
+def test_analyze_selects_fields_like_flask():
+    body, content_type = multipart('test.png', create_test_image('red').getvalue())
+    status, payload, _, _ = call('POST', '/api/analyze?mode=compact', body, content_type)
+    assert status == 200
+    assert set(payload) == {'success', 'classification', 'catalog_version'}
+
+    status, payload, _, _ = call('POST', '/api/analyze?fields=instructions', body, content_type)
+    assert status == 200
+    assert set(payload) == {'success', 'instructions'}
+
+    status, payload, reads, _ = call('POST', '/api/analyze?fields=bogus', body, content_type)
+    assert status == 400
+    assert 'bogus' in payload['error']
+    assert reads == 0
+
+
+def test_analyzed_uploads_are_captured_when_enabled(monkeypatch, tmp_path):
+    from capture_store import CaptureStore, load_index
+
+    store = CaptureStore(str(tmp_path))
+    monkeypatch.setattr(asgi.flask_app, 'capture_store', store)
+    body, content_type = multipart('test.png', create_test_image('blue').getvalue())
+    assert call('POST', '/api/analyze', body, content_type)[0] == 200
+    store.flush()
+    store.close()
+    assert len(load_index(str(tmp_path))) == 1
+
+
+def test_analyze_goes_through_admission_control(monkeypatch):
+    body, content_type = multipart('test.png', create_test_image('red').getvalue())
+    monkeypatch.setattr(asgi.flask_app, 'admission', AdmissionController(client_rate=0.01, client_burst=1))
+    assert call('POST', '/api/analyze', body, content_type)[0] == 200
+    status, payload, reads, _ = call('POST', '/api/analyze', body, content_type)
+    assert status == 429
+    assert reads == 0
+    assert asgi.flask_app.admission.stats()['active'] == 0
+
+    controller = AdmissionController(max_concurrent=1, max_queue=0, client_rate=0)
+    monkeypatch.setattr(asgi.flask_app, 'admission', controller)
+    held = controller.admit('someone-else')
+    try:
+        status, payload, reads, _ = call('POST', '/api/analyze', body, content_type)
+    finally:
+        held.release()
+    assert status == 503
+    assert reads == 0
+    assert controller.stats()['queue_full'] == 1
+
+
+def test_analyze_sheds_requests_past_their_deadline(monkeypatch):
+    controller = AdmissionController(client_rate=0)
+    monkeypatch.setattr(asgi.flask_app, 'admission', controller)
+    monkeypatch.setattr(asgi.flask_app, 'parse_timeout', lambda value: -1)
+    body, content_type = multipart('test.png', create_test_image('red').getvalue())
+    status, payload, _, _ = call('POST', '/api/analyze', body, content_type)
+    assert status == 503
+    assert controller.stats()['expired'] == 1
+    assert controller.stats()['active'] == 0
+
+
+def test_non_image_rejected_before_body_finishes():
+    body, content_type = multipart('test.png', b'this is not an image' * 5000)
+    status, payload, reads, chunks = call('POST', '/api/analyze', body, content_type)
+    assert status == 415
+    assert reads < chunks
+
+
+def test_bad_extension_and_missing_image():
+    body, content_type = multipart('notes.txt', b'hello')
+    assert call('POST', '/api/analyze', body, content_type)[0] == 400
+    body, content_type = multipart('test.png', create_test_image('red').getvalue(), field='other')
+    assert call('POST', '/api/analyze', body, content_type)[0] == 400
+
+
+def test_malformed_multipart_is_rejected_and_logged(monkeypatch, tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path))
+    monkeypatch.setattr(asgi.flask_app, 'request_log', log)
+    # A part without a Content-Disposition header
+    body = b'--xyz\r\nContent-Type: image/png\r\n\r\nnot a part\r\n--xyz--\r\n'
+    status, payload, _, _ = call('POST', '/api/analyze', body, 'multipart/form-data; boundary=xyz')
+    log.close()
+    assert status == 400
+    assert payload == {'error': 'Malformed multipart body'}
+    with open(path) as log_file:
+        [record] = [json.loads(line) for line in log_file]
+    assert record['status'] == 400
+
+
+def test_unknown_route():
+    assert call('GET', '/nope')[0] == 404
+    assert call('GET', '/api/analyze')[0] == 405
+
+
+def test_sniff_image_format():
+    assert validation.sniff_image_format(b'\x89PNG\r\n\x1a\nrest') == 'PNG'
+    assert validation.sniff_image_format(b'\xff\xd8') == ''
+    assert validation.sniff_image_format(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'WEBP'
+    assert validation.sniff_image_format(b'hello world!') is None
+
+
+def websocket(path, messages):
+    """Run a WebSocket session through the ASGI app; returns sent messages"""
+    incoming = [{'type': 'websocket.connect'}] + messages + [{'type': 'websocket.disconnect', 'code': 1000}]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'websocket', 'path': path, 'headers': []}
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent
+
+
+def test_stream_skips_repeated_frames():
+    frame = create_test_image('red').getvalue()
+    sent = websocket('/api/stream', [
+        {'type': 'websocket.receive', 'bytes': frame},
+        {'type': 'websocket.receive', 'bytes': frame},
+        {'type': 'websocket.receive', 'text': 'hello'},
+        {'type': 'websocket.receive', 'bytes': b'not an image'},
+    ])
+    assert sent[0]['type'] == 'websocket.accept'
+    events = [json.loads(m['text']) for m in sent[1:]]
+    assert events[0]['type'] == 'ready'
+    assert events[1]['analyzed'] is True
+    assert events[2]['analyzed'] is False
+    assert events[2]['smoothed'] == events[1]['smoothed']
+    assert events[3]['type'] == 'error'
+    assert events[4]['type'] == 'error'
+
+
+def test_stream_frames_are_logged(monkeypatch, tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path))
+    monkeypatch.setattr(asgi.flask_app, 'request_log', log)
+    frame = create_test_image('red').getvalue()
+    websocket('/api/stream', [
+        {'type': 'websocket.receive', 'bytes': frame},
+        {'type': 'websocket.receive', 'bytes': frame},
+        {'type': 'websocket.receive', 'bytes': b'not an image'},
+    ])
+    log.close()
+    with open(path) as log_file:
+        analyzed, rejected = [json.loads(line) for line in log_file]
+    assert (analyzed['endpoint'], analyzed['status']) == ('stream', 200)
+    assert analyzed['image_sha256'] == content_key(frame)
+    assert analyzed['category'] in asgi.flask_app.FIRST_AID_INSTRUCTIONS
+    assert (rejected['endpoint'], rejected['status']) == ('stream', 415)
+
+
+def test_stream_unknown_path_is_closed():
+    assert websocket('/nope', [])[0]['type'] == 'websocket.close'
@@ -0,0 +1,83 @@
+"""
+Tests for the bulk classification CLI
+Run with: python -m pytest test_bulk_classify.py
+"""
+
+import io
+import json
+import signal
+import tarfile
+
+import bulk_classify
+from test_api import create_test_image
+
+
+def write_images(directory):
+    (directory / 'a').mkdir(parents=True)
+    (directory / 'a' / 'red.png').write_bytes(create_test_image('red').getvalue())
+    (directory / 'blue.png').write_bytes(create_test_image('blue').getvalue())
+    (directory / 'gray.jpg').write_bytes(create_test_image('gray').getvalue())
+    (directory / 'fake.png').write_bytes(b'not an image')
+    (directory / 'notes.txt').write_text('ignored')
+
+
+def read_records(path):
+    return {record['name']: record for record in map(json.loads, path.read_text().splitlines())}
+
+
+def test_classifies_directory(tmp_path):
+    write_images(tmp_path / 'images')
+    output = tmp_path / 'out.jsonl'
+    progress = bulk_classify.run(str(tmp_path / 'images'), str(output), workers=0, stream=io.StringIO())
+    records = read_records(output)
+    assert set(records) == {'a/red.png', 'blue.png', 'gray.jpg', 'fake.png'}
+    assert 0 < records['a/red.png']['confidence'] < 1
+    assert 'error' in records['fake.png']
+    assert (progress.done, progress.errors) == (4, 1)
+
+
+def test_resumes_after_interruption(tmp_path):
+    write_images(tmp_path / 'images')
+    output = tmp_path / 'out.jsonl'
+    bulk_classify.run(str(tmp_path / 'images'), str(output), workers=0, stream=io.StringIO())
+    lines = output.read_text().splitlines(keepends=True)
+    # Keep two results and half of a third, as if killed mid-write
+    output.write_text(''.join(lines[:2]) + lines[2][:10])
+
+    progress = bulk_classify.run(str(tmp_path / 'images'), str(output), workers=0, stream=io.StringIO())
+    assert (progress.done, progress.skipped) == (2, 2)
+    assert len(output.read_text().splitlines()) == 4
+    assert len(read_records(output)) == 4
+
+
+def test_stop_event_ends_run_early(tmp_path):
+    import threading
+
+    write_images(tmp_path / 'images')
+    stop = threading.Event()
+    stop.set()
+    progress = bulk_classify.run(str(tmp_path / 'images'), str(tmp_path / 'out.jsonl'), workers=0,
+                                 stream=io.StringIO(), stop=stop)
+    assert progress.interrupted and progress.done == 0
+
+
+def test_classifies_tar_in_worker_processes(tmp_path):
+    archive = tmp_path / 'images.tar.gz'
+    with tarfile.open(archive, 'w:gz') as tar:
+        for color in ('red', 'blue', 'gray'):
+            data = create_test_image(color).getvalue()
+            info = tarfile.TarInfo(f'captures/{color}.png')
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    output = tmp_path / 'out.jsonl'
+    progress = bulk_classify.run(str(archive), str(output), workers=1, stream=io.StringIO())
+    assert progress.done == 3
+    assert set(read_records(output)) == {'captures/red.png', 'captures/blue.png', 'captures/gray.png'}
+
+
+def test_main_restores_sigint_handler(tmp_path):
+    (tmp_path / 'images').mkdir()
+    before = signal.getsignal(signal.SIGINT)
+    assert bulk_classify.main([str(tmp_path / 'images'), '--output', str(tmp_path / 'out.jsonl'),
+                               '--workers', '0']) == 0
+    assert signal.getsignal(signal.SIGINT) is before
@@ -0,0 +1,129 @@
+"""
+Tests for the upload capture store
+Run with: python -m pytest test_capture_store.py
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from capture_store import CaptureStore, load_index
+
+
+def encoded(color, fmt='PNG', size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def capture(store, image_bytes, **labels):
+    key = hashlib.sha256(image_bytes).hexdigest()
+    assert store.capture(key, image_bytes, **labels)
+    store.flush()
+    return key
+
+
+def test_stores_content_addressed_and_deduplicates(tmp_path):
+    store = CaptureStore(str(tmp_path))
+    image = encoded('red', 'JPEG')
+    key = capture(store, image, category='cut', confidence=0.7)
+    capture(store, image)
+    store.close()
+
+    path = tmp_path / 'objects' / key[:2] / key[2:4] / f'{key}.jpg'
+    assert path.read_bytes() == image
+    [entry] = load_index(str(tmp_path))
+    assert entry['key'] == key
+    assert entry['category'] == 'cut'
+    assert entry['size'] == len(image)
+    stats = store.stats()
+    assert stats['captured'] == 1
+    assert stats['duplicates'] == 1
+
+
+def test_preprocessed_mode_keeps_only_model_input(tmp_path):
+    store = CaptureStore(str(tmp_path), mode='preprocessed',
+                         preprocess=lambda data: Image.open(io.BytesIO(data)).convert('RGB').resize((224, 224)))
+    image = encoded('blue', 'JPEG', size=(2000, 1500))
+    key = capture(store, image)
+    store.close()
+    [entry] = load_index(str(tmp_path))
+    assert entry['path'].endswith(f'{key}.png')
+    with Image.open(tmp_path / entry['path']) as stored:
+        assert stored.size == (224, 224)
+
+
+def test_raw_pixels_are_stored_as_png(tmp_path):
+    store = CaptureStore(str(tmp_path))
+    pixels = Image.new('RGBA', (224, 224), (10, 20, 30, 255)).tobytes()
+    store.capture('raw', pixels, size=(224, 224))
+    store.close()
+    [entry] = load_index(str(tmp_path))
+    assert entry['path'].endswith('raw.png')
+    with Image.open(tmp_path / entry['path']) as stored:
+        assert (stored.mode, stored.size) == ('RGB', (224, 224))
+        assert stored.getpixel((0, 0)) == (10, 20, 30)
+
+
+def test_quota_evicts_least_recently_captured(tmp_path):
+    images = [encoded((index * 40, 0, 0)) for index in range(4)]
+    store = CaptureStore(str(tmp_path), max_bytes=sum(len(image) for image in images[:3]))
+    keys = [capture(store, image) for image in images[:3]]
+    capture(store, images[0])  # recaptured, so no longer the oldest
+    capture(store, images[3])
+    store.close()
+    remaining = [entry['key'] for entry in load_index(str(tmp_path))]
+    assert keys[1] not in remaining
+    assert remaining[-2:] == [keys[0], hashlib.sha256(images[3]).hexdigest()]
+    assert not any(keys[1] in name for _, _, files in os.walk(tmp_path) for name in files)
+    assert store.stats()['evictions'] == 1
+
+
+def test_stores_sharing_a_directory_see_each_others_entries(tmp_path):
+    first = CaptureStore(str(tmp_path))
+    second = CaptureStore(str(tmp_path))
+    image = encoded('green')
+    capture(first, image)
+    capture(second, image)
+    first.close()
+    second.close()
+    assert len(load_index(str(tmp_path))) == 1
+    assert second.stats()['duplicates'] == 1
+
+
+def test_index_is_compacted(tmp_path):
+    store = CaptureStore(str(tmp_path))
+    image = encoded('white')
+    for _ in range(1005):
+        capture(store, image)
+    store.close()
+    with open(tmp_path / 'index.jsonl') as index:
+        assert len(index.readlines()) < 10
+    assert len(load_index(str(tmp_path))) == 1
+
+
+def test_full_queue_drops_captures(tmp_path):
+    store = CaptureStore(str(tmp_path), max_queue_bytes=10)
+    store._thread = object()  # writer not running, so the queue only fills
+    assert store.capture('a' * 64, b'x' * 6)
+    assert not store.capture('b' * 64, b'x' * 6)
+    assert store.capture('c' * 64, b'x' * 4)
+    stats = store.stats()
+    assert stats['dropped'] == 1
+    assert stats['queued_bytes'] == 10
+
+
+def test_written_captures_free_queue_bytes(tmp_path):
+    store = CaptureStore(str(tmp_path), max_queue_bytes=1024 ** 2)
+    capture(store, encoded((200, 0, 0)))
+    store.flush()
+    assert store.stats()['queued_bytes'] == 0
+    store.close()
+
+
+def test_rejects_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        CaptureStore(str(tmp_path), mode='thumbnails')
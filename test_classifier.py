@@ -0,0 +1,168 @@
+"""
+Unit tests for the injury classifier
+Run with: python -m pytest test_classifier.py
+"""
+
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from classifier import InjuryClassifier
+
+
+def make_image_bytes(size, color=(200, 80, 80), fmt='PNG', mode='RGB'):
+    """Encode a solid-color image of the given size and format"""
+    image = Image.new('RGB', size, color=color)
+    if mode != 'RGB':
+        image = image.convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('fmt', ['JPEG', 'PNG', 'WEBP', 'GIF'])
+def test_preprocess_lands_on_target_size(fmt):
+    """Every supported format comes out as a 224x224 RGB image"""
+    classifier = InjuryClassifier()
+    image = classifier.preprocess_image(make_image_bytes((1600, 1200), fmt=fmt))
+    assert image.size == (224, 224)
+    assert image.mode == 'RGB'
+
+
+@pytest.mark.parametrize('mode', ['L', 'RGBA', 'P'])
+def test_preprocess_converts_modes(mode):
+    """Grayscale, alpha and palette images are converted to RGB"""
+    classifier = InjuryClassifier()
+    image = classifier.preprocess_image(make_image_bytes((500, 400), mode=mode))
+    assert image.mode == 'RGB'
+    assert image.size == (224, 224)
+
+
+def test_preprocess_keeps_solid_color():
+    """Scaled decoding must not shift the colors the heuristics rely on"""
+    classifier = InjuryClassifier()
+    image = classifier.preprocess_image(make_image_bytes((3000, 2000), fmt='JPEG'))
+    red, green, blue = image.getpixel((112, 112))
+    assert abs(red - 200) <= 3 and abs(green - 80) <= 3 and abs(blue - 80) <= 3
+
+
+def test_preprocess_rejects_oversized_images():
+    """Images above the decode cap are refused before decoding"""
+    classifier = InjuryClassifier()
+    classifier.max_decode_pixels = 1000 * 1000
+    assert classifier.preprocess_image(make_image_bytes((1200, 1000))) is None
+    assert classifier.classify(make_image_bytes((1200, 1000))) == ('unknown', 0.5, {})
+
+
+def reference_color_features(image):
+    """The original per-pixel implementation of analyze_color_features"""
+    pixels = list(image.getdata())
+    num_pixels = len(pixels)
+    if num_pixels == 0:
+        return {'avg_red': 0, 'avg_green': 0, 'avg_blue': 0, 'red_var': 0, 'red_dominance': 0}
+    avg_red = sum(p[0] for p in pixels) / num_pixels
+    avg_green = sum(p[1] for p in pixels) / num_pixels
+    avg_blue = sum(p[2] for p in pixels) / num_pixels
+    red_variance = sum((p[0] - avg_red) ** 2 for p in pixels) / num_pixels
+    return {
+        'avg_red': avg_red,
+        'avg_green': avg_green,
+        'avg_blue': avg_blue,
+        'red_var': red_variance,
+        'red_dominance': avg_red - (avg_green + avg_blue) / 2,
+    }
+
+
+def noisy_image(seed, size=(224, 224)):
+    """Deterministic RGB noise image with a per-seed color cast"""
+    bands = [Image.effect_noise(size, 30 + 10 * (seed % 5)) for _ in range(3)]
+    image = Image.merge('RGB', bands)
+    cast = Image.new('RGB', size, color=((seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256))
+    return Image.blend(image, cast, 0.5)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_color_features_match_reference(seed):
+    """Histogram features equal the per-pixel reference implementation"""
+    classifier = InjuryClassifier()
+    image = noisy_image(seed)
+    features = classifier.analyze_color_features(image)
+    expected = reference_color_features(image)
+    assert features.keys() == expected.keys()
+    # Means come from the same integer totals, so they are bit-identical
+    for key in ('avg_red', 'avg_green', 'avg_blue', 'red_dominance'):
+        assert features[key] == expected[key]
+    # The reference accumulates float rounding error; ours is exact
+    assert features['red_var'] == pytest.approx(expected['red_var'], rel=1e-12, abs=1e-9)
+
+
+@pytest.mark.parametrize('color', ['red', 'blue', 'gray'])
+def test_classify_matches_reference(color):
+    """Categories are unchanged for the synthetic test_api.py images"""
+    from test_api import create_test_image
+
+    classifier = InjuryClassifier()
+    image_bytes = create_test_image(color).getvalue()
+    category, confidence, features = classifier.classify(image_bytes)
+    expected = reference_color_features(classifier.preprocess_image(image_bytes))
+    assert features['avg_red'] == expected['avg_red']
+    assert features['red_var'] == pytest.approx(expected['red_var'], rel=1e-12, abs=1e-9)
+    assert category in classifier.categories
+
+
+def test_color_features_empty_image():
+    """A zero-sized image yields all-zero features"""
+    classifier = InjuryClassifier()
+    features = classifier.analyze_color_features(Image.new('RGB', (0, 0)))
+    assert features == reference_color_features(Image.new('RGB', (0, 0)))
+
+
+def test_classify_rgb_matches_decoded_path():
+    """Pre-resized RGB pixels classify exactly like the decoded upload"""
+    from test_api import create_test_image
+
+    classifier = InjuryClassifier()
+    image = classifier.preprocess_image(create_test_image('red').getvalue())
+    assert classifier.classify_rgb(image.tobytes()) == classifier.classify_image(image)
+    with pytest.raises(ValueError):
+        classifier.classify_rgb(b'\x00' * 100)
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy'])
+def test_rgba_pixels_are_mapped_without_copying(engine):
+    """RGBA buffers are wrapped in place and classify like the RGB image"""
+    if engine == 'numpy':
+        pytest.importorskip('numpy')
+    classifier = InjuryClassifier(engine=engine)
+    image = noisy_image(3)
+    buffer = bytearray(image.convert('RGBA').tobytes())
+    wrapped = classifier.image_from_rgb(buffer)
+    assert classifier.analyze_color_features(wrapped) == classifier.analyze_color_features(image)
+    assert classifier.classify_rgb(buffer) == classifier.classify_image(image)
+    buffer[0] = (buffer[0] + 1) % 256
+    assert wrapped.getpixel((0, 0))[0] == buffer[0]
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy'])
+def test_shared_classifier_is_thread_safe(engine):
+    """One instance used from many threads gives the serial results"""
+    if engine == 'numpy':
+        pytest.importorskip('numpy')
+    classifier = InjuryClassifier(engine=engine)
+    uploads = [
+        make_image_bytes((320 + index * 16, 240), color=(index * 16, 255 - index * 16, (index * 40) % 256), fmt=fmt)
+        for index in range(16) for fmt in ('JPEG', 'PNG')
+    ]
+    expected = [classifier.classify(upload) for upload in uploads]
+    # Switch threads as often as possible to shake out interleavings
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in range(3):
+                assert list(pool.map(classifier.classify, uploads)) == expected
+    finally:
+        sys.setswitchinterval(interval)
@@ -0,0 +1,67 @@
+"""
+Tests that the NumPy and pure-Python feature engines agree exactly
+Run with: python -m pytest test_feature_engines.py
+"""
+
+import random
+
+import pytest
+from PIL import Image
+
+import feature_engines
+from classifier import InjuryClassifier
+from feature_engines import NumpyEngine, PythonEngine, select_engine
+from test_api import create_test_image
+
+pytest.importorskip('numpy')
+
+
+def random_image(seed, size, mode='RGB'):
+    rng = random.Random(seed)
+    bands = len(Image.new(mode, (1, 1)).getbands())
+    return Image.frombytes(mode, size, rng.randbytes(size[0] * size[1] * bands))
+
+
+@pytest.mark.parametrize('size', [(1, 1), (224, 224), (640, 480), (1000, 3)])
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+def test_engines_compute_identical_moments(size, mode):
+    image = random_image(size[0] * size[1], size, mode)
+    assert NumpyEngine().band_moments(image) == PythonEngine().band_moments(image)
+
+
+def test_moments_match_pixel_sums():
+    image = random_image(7, (32, 32))
+    sums, squares = PythonEngine().band_moments(image)
+    data = image.tobytes()
+    assert sums == [sum(data[band::3]) for band in range(3)]
+    assert squares == [sum(v * v for v in data[band::3]) for band in range(3)]
+
+
+@pytest.mark.parametrize('color', ['red', 'blue', 'gray'])
+def test_classifier_results_identical_across_engines(color):
+    image_bytes = create_test_image(color).getvalue()
+    assert InjuryClassifier(engine='numpy').classify(image_bytes) == \
+        InjuryClassifier(engine='python').classify(image_bytes)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_features_identical_on_photo_like_images(seed):
+    image = random_image(seed, (16, 16)).resize((224, 224), Image.Resampling.BICUBIC)
+    assert InjuryClassifier(engine='numpy').classify_image(image) == \
+        InjuryClassifier(engine='python').classify_image(image)
+
+
+def test_auto_selects_numpy_and_falls_back(monkeypatch):
+    monkeypatch.delenv('CLASSIFIER_ENGINE', raising=False)
+    assert select_engine().name == 'numpy'
+    monkeypatch.setattr(feature_engines, 'numpy', None)
+    assert select_engine().name == 'python'
+    with pytest.raises(ImportError):
+        select_engine('numpy')
+    with pytest.raises(ValueError):
+        select_engine('fortran')
+
+
+def test_engine_from_environment(monkeypatch):
+    monkeypatch.setenv('CLASSIFIER_ENGINE', 'python')
+    assert InjuryClassifier().model_info()['engine'] == 'python'
@@ -0,0 +1,67 @@
+"""
+Unit tests for perceptual hashing and live frame streams
+Run with: python -m pytest test_frame_stream.py
+"""
+
+import io
+import random
+
+from PIL import Image
+
+from frame_stream import FrameStream
+from phash import dhash, dhash_bytes, hamming_distance
+
+
+def scene(seed, size=(320, 240)):
+    """Smooth random scene, like a camera view"""
+    rng = random.Random(seed)
+    coarse = Image.frombytes('RGB', (8, 6), rng.randbytes(8 * 6 * 3))
+    return coarse.resize(size, Image.Resampling.BICUBIC)
+
+
+def jpeg(image, quality=85):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def test_dhash_is_stable_under_recompression_and_resizing():
+    image = scene(1)
+    original = dhash(image)
+    assert hamming_distance(original, dhash_bytes(jpeg(image, quality=40))) <= 4
+    assert hamming_distance(original, dhash(image.resize((160, 120)))) <= 4
+    assert hamming_distance(original, dhash(scene(2))) > 12
+
+
+def test_similar_frames_are_skipped():
+    calls = []
+
+    def classify(frame_bytes):
+        calls.append(frame_bytes)
+        return 'burn', 0.8, {}
+
+    frames = FrameStream(classify)
+    first = frames.process(jpeg(scene(1)))
+    assert first['analyzed'] is True and first['distance'] is None
+    again = frames.process(jpeg(scene(1), quality=70))
+    assert again['analyzed'] is False
+    assert again['smoothed'] == {'category': 'burn', 'confidence': 0.32}
+    changed = frames.process(jpeg(scene(2)))
+    assert changed['analyzed'] is True
+    assert len(calls) == 2
+    assert frames.stats() == {'frames': 3, 'analyzed': 2, 'skipped': 1}
+
+
+def test_skipping_can_be_disabled():
+    frames = FrameStream(lambda frame_bytes: ('burn', 0.8, {}), skip_distance=-1)
+    for _ in range(3):
+        assert frames.process(jpeg(scene(1)))['analyzed'] is True
+
+
+def test_smoothing_ignores_a_single_outlier():
+    results = iter(['bruise', 'bruise', 'bruise', 'burn', 'bruise'])
+    frames = FrameStream(lambda frame_bytes: (next(results), 0.8, {}), skip_distance=-1)
+    events = [frames.process(jpeg(scene(1))) for _ in range(5)]
+    assert [e['classification']['category'] for e in events][3] == 'burn'
+    assert all(e['smoothed']['category'] == 'bruise' for e in events)
+    assert [e['changed'] for e in events] == [True, False, False, False, False]
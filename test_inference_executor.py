@@ -0,0 +1,167 @@
+"""
+Unit tests for the process-pool inference executor
+Run with: python -m pytest test_inference_executor.py
+"""
+
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from inference_executor import (
+    ExecutorSaturated, InferenceExecutor, InferenceTimeout, InferenceUnavailable,
+    InterpreterPoolExecutor,
+)
+from test_api import create_test_image
+
+
+def slow_task(seconds):
+    """Stand-in for a slow classification; runs in a worker"""
+    time.sleep(seconds)
+    return seconds
+
+
+def crash_or_pid(payload):
+    """Kill the worker process on 'crash', as an OOM kill or segfault would"""
+    if payload == 'crash':
+        os._exit(1)
+    return os.getpid()
+
+
+@pytest.fixture
+def executor_factory():
+    executors = []
+
+    def factory(**kwargs):
+        executor = InferenceExecutor(**kwargs)
+        executors.append(executor)
+        return executor
+
+    yield factory
+    for executor in executors:
+        executor.shutdown(wait=False)
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_classifies_in_worker(executor_factory, mode):
+    executor = executor_factory(workers=1, mode=mode)
+    category, confidence, features = executor.classify(create_test_image('red').getvalue())
+    assert 0 < confidence < 1
+    assert 'avg_red' in features
+    assert executor.stats()['completed'] == 1
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_classifies_raw_pixels_in_worker(executor_factory, mode):
+    executor = executor_factory(workers=1, mode=mode)
+    pixels = bytes([200, 40, 40]) * (224 * 224)
+    category, confidence, features = executor.classify_rgb(pixels)
+    assert features['avg_red'] == 200
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_signature_in_worker(executor_factory, mode):
+    executor = executor_factory(workers=1, mode=mode)
+    image_hash, color, rgb_bytes = executor.signature(create_test_image('red').getvalue())
+    assert color == (200, 80, 80)
+    assert len(rgb_bytes) == 224 * 224 * 3
+    assert executor.classify_rgb(rgb_bytes)[2]['avg_red'] == pytest.approx(200, abs=1)
+    assert executor.signature(b'not an image') is None
+
+
+def test_start_spawns_every_worker(executor_factory):
+    executor = executor_factory(workers=2)
+    assert executor.start() == 2
+
+
+def test_inline_mode_without_workers(executor_factory):
+    executor = executor_factory(workers=0)
+    category, confidence, features = executor.classify(create_test_image('blue').getvalue())
+    assert executor.stats()['mode'] == 'inline'
+    assert 'avg_blue' in features
+
+
+def test_inline_mode_rejects_unregistered_tasks(executor_factory):
+    executor = executor_factory(workers=0, task=slow_task)
+    with pytest.raises(ValueError, match='slow_task'):
+        executor.classify(0)
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_rejects_when_saturated(executor_factory, mode):
+    executor = executor_factory(workers=1, max_queue=0, task=slow_task, mode=mode)
+    executor.classify(0)  # start the worker so timing below is stable
+    busy = threading.Thread(target=executor.classify, args=(0.5,))
+    busy.start()
+    while executor.stats()['in_flight'] == 0:
+        time.sleep(0.001)
+    with pytest.raises(ExecutorSaturated) as excinfo:
+        executor.classify(0)
+    assert excinfo.value.retry_after >= 1
+    busy.join()
+    assert executor.stats()['rejected'] == 1
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_deadline(executor_factory, mode):
+    executor = executor_factory(workers=1, deadline=0.1, task=slow_task, mode=mode)
+    with pytest.raises(InferenceTimeout):
+        executor.classify(1)
+    assert executor.stats()['timed_out'] == 1
+
+
+def test_replaces_pool_after_a_worker_dies(executor_factory):
+    executor = executor_factory(workers=1, task=crash_or_pid)
+    first_pid = executor.classify('ping')
+    with pytest.raises(InferenceUnavailable):
+        executor.classify('crash')
+    # The broken pool is gone: the next request gets a new worker
+    second_pid = executor.classify('ping')
+    assert second_pid != first_pid
+    # Killed from outside while idle
+    os.kill(second_pid, signal.SIGKILL)
+    with pytest.raises(InferenceUnavailable):
+        executor.classify('ping')
+    assert executor.classify('ping') not in (first_pid, second_pid)
+    stats = executor.stats()
+    assert stats['pool_restarts'] == 2
+    assert stats['in_flight'] == 0
+
+
+def test_thread_mode_shares_the_classifier(executor_factory):
+    executor = executor_factory(workers=4, mode='thread')
+    assert executor.start() == 4
+    images = [create_test_image(color).getvalue() for color in ('red', 'blue', 'normal')] * 4
+    expected = [executor.classifier.classify(image) for image in images]
+    threads = []
+    results = [None] * len(images)
+
+    def classify(index):
+        results[index] = executor.classify(images[index])
+
+    for index in range(len(images)):
+        threads.append(threading.Thread(target=classify, args=(index,)))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+    assert results == expected
+    stats = executor.stats()
+    assert stats['mode'] == 'thread'
+    assert stats['completed'] == len(images)
+    assert isinstance(stats['gil_enabled'], bool)
+
+
+def test_interpreter_mode_runs_or_falls_back_to_processes(executor_factory):
+    executor = executor_factory(workers=1, mode='interpreter')
+    assert executor.start() == 1
+    category, confidence, features = executor.classify(create_test_image('red').getvalue())
+    assert 'avg_red' in features
+    if InterpreterPoolExecutor is None:
+        assert executor.stats()['mode'] == 'process'
+
+
+def test_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        InferenceExecutor(mode='fibers')
@@ -0,0 +1,118 @@
+"""
+Tests for asynchronous jobs
+Run with: python -m pytest test_jobs.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from jobs import JobManager, JobQueueFull, MemoryJobStore, SqliteJobStore
+
+
+def record(job_id, status='queued', created=0.0):
+    return {'id': job_id, 'status': status, 'created': created, 'started': None,
+            'finished': None, 'result': None, 'error': None}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == 'memory':
+            return MemoryJobStore(**kwargs)
+        return SqliteJobStore(str(tmp_path / 'jobs.sqlite3'), **kwargs)
+    return make
+
+
+def test_store_round_trip_and_ttl(make_store):
+    store = make_store(ttl=0.05)
+    store.put(record('a'))
+    assert store.get('a')['status'] == 'queued'
+    assert store.get('missing') is None
+    time.sleep(0.1)
+    assert store.get('a') is None
+
+
+def test_store_evicts_oldest_finished_jobs_first(make_store):
+    store = make_store(max_jobs=2)
+    store.put(record('pending', created=1))
+    store.put(record('old', status='done', created=2))
+    store.put(record('new', status='done', created=3))
+    assert store.get('pending') is not None
+    assert store.get('old') is None
+    assert store.get('new') is not None
+    assert store.stats()['evictions'] == 1
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    SqliteJobStore(path).put(record('a', status='done'))
+    assert SqliteJobStore(path).get('a')['status'] == 'done'
+
+
+def wait_finished(manager, job_id):
+    record = manager.get(job_id)
+    while record['status'] not in ('done', 'failed'):
+        record = manager.wait(job_id, record['status'], timeout=5)
+    return record
+
+
+def test_job_runs_in_background_and_records_result():
+    manager = JobManager(MemoryJobStore(), workers=1)
+    release = threading.Event()
+    job = manager.submit(lambda: release.wait(5) and {'category': 'cut'})
+    assert job['status'] == 'queued'
+    release.set()
+    finished = wait_finished(manager, job['id'])
+    assert finished['status'] == 'done'
+    assert finished['result'] == {'category': 'cut'}
+    assert finished['finished'] >= finished['started'] >= finished['created']
+    stats = manager.stats()
+    assert stats['completed'] == 1
+    assert stats['latency_seconds_p50'] is not None
+    manager.shutdown()
+
+
+def test_failed_job_records_error():
+    manager = JobManager(MemoryJobStore(), workers=1)
+
+    def fail():
+        raise RuntimeError('model crashed')
+
+    finished = wait_finished(manager, manager.submit(fail)['id'])
+    assert finished['status'] == 'failed'
+    assert finished['error'] == 'model crashed'
+    assert manager.stats()['failed'] == 1
+    manager.shutdown()
+
+
+def test_submissions_beyond_max_pending_are_rejected():
+    manager = JobManager(MemoryJobStore(), workers=1, max_pending=2)
+    release = threading.Event()
+    jobs = [manager.submit(lambda: release.wait(5)) for _ in range(2)]
+    with pytest.raises(JobQueueFull) as error:
+        manager.submit(lambda: None)
+    assert error.value.retry_after >= 1
+    stats = manager.stats()
+    assert stats['queued'] + stats['running'] == 2
+    assert stats['rejected'] == 1
+    release.set()
+    for job in jobs:
+        wait_finished(manager, job['id'])
+    manager.submit(lambda: None)
+    manager.shutdown()
+
+
+def test_wait_returns_on_status_change():
+    manager = JobManager(MemoryJobStore(), workers=1, poll_interval=5)
+    release = threading.Event()
+    job = manager.submit(lambda: release.wait(5))
+    while manager.get(job['id'])['status'] == 'queued':
+        time.sleep(0.01)
+    threading.Timer(0.05, release.set).start()
+    started = time.monotonic()
+    assert manager.wait(job['id'], 'running', timeout=5)['status'] == 'done'
+    # Woken by the change, not by the poll interval
+    assert time.monotonic() - started < 2
+    manager.shutdown()
@@ -0,0 +1,42 @@
+"""
+Unit tests for stage timers and Prometheus rendering
+Run with: python -m pytest test_metrics.py
+"""
+
+import metrics
+
+
+def test_stage_is_noop_without_collector():
+    with metrics.stage('decode'):
+        pass
+    assert metrics._stage_timings.get() is None
+
+
+def test_collect_and_merge_stages():
+    with metrics.collect_stages() as timings:
+        with metrics.stage('decode'):
+            pass
+        with metrics.stage('decode'):
+            pass
+        metrics.record_stages({'resize': 0.25})
+    assert set(timings) == {'decode', 'resize'}
+    assert timings['resize'] == 0.25
+    assert metrics.server_timing_header({'resize': 0.25}) == 'resize;dur=250.00'
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram('test_seconds', 'Test', labels=('stage',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage='a')
+    histogram.observe(0.5, stage='a')
+    histogram.observe(5, stage='a')
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a"} 3' in lines
+
+
+def test_counter_render_escapes_labels():
+    counter = metrics.Counter('test_total', 'Test', labels=('type',))
+    counter.inc(type='say "hi"')
+    assert 'test_total{type="say \\"hi\\""} 1' in counter.render()
@@ -0,0 +1,71 @@
+"""
+Unit tests for the near-duplicate result index
+Run with: python -m pytest test_near_duplicates.py
+"""
+
+import random
+
+import pytest
+from PIL import Image
+
+from near_duplicates import NearDuplicateIndex, _flip_masks, image_signature
+
+
+def random_hash(rng):
+    return rng.getrandbits(64)
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def test_flip_masks_enumerate_each_neighbour_once():
+    masks = _flip_masks(16, 2)
+    assert len(masks) == len(set(masks)) == 1 + 16 + 16 * 15 // 2
+
+
+@pytest.mark.parametrize('distance', [0, 1, 3, 4])
+def test_finds_entries_within_distance(distance):
+    rng = random.Random(distance)
+    index = NearDuplicateIndex(max_distance=4)
+    for _ in range(1000):
+        index.add(random_hash(rng), (0, 0, 0), 'other')
+    target = random_hash(rng)
+    index.add(target, (100, 50, 50), 'match')
+    assert index.lookup(flip_bits(target, distance, rng), (102, 50, 47)) == 'match'
+
+
+def test_rejects_distant_hash_and_different_colour():
+    rng = random.Random(0)
+    index = NearDuplicateIndex(max_distance=4, max_color_distance=8)
+    target = random_hash(rng)
+    index.add(target, (100, 50, 50), 'match')
+    assert index.lookup(flip_bits(target, 5, rng), (100, 50, 50)) is None
+    assert index.lookup(target, (60, 60, 120)) is None
+    assert index.stats()['misses'] == 2
+
+
+def test_evicts_least_recently_used():
+    a, b, c = 0, (1 << 64) - 1, 0x00FF00FF00FF00FF
+    index = NearDuplicateIndex(max_entries=2)
+    index.add(a, (0, 0, 0), 'a')
+    index.add(b, (0, 0, 0), 'b')
+    assert index.lookup(a, (0, 0, 0)) == 'a'
+    index.add(c, (0, 0, 0), 'c')
+    assert len(index) == 2
+    assert index.lookup(b, (0, 0, 0)) is None
+    assert index.lookup(a, (0, 0, 0)) == 'a'
+    assert index.stats()['evictions'] == 1
+    assert sum(len(buckets) for buckets in index._buckets) == 2 * index.chunks
+
+
+def test_signature_survives_reencoding():
+    rng = random.Random(3)
+    coarse = Image.frombytes('RGB', (8, 8), rng.randbytes(8 * 8 * 3))
+    image = coarse.resize((224, 224), Image.Resampling.BICUBIC)
+    noisy = Image.blend(image, Image.effect_noise((224, 224), 30).convert('RGB'), 0.05)
+    index = NearDuplicateIndex()
+    index.add(*image_signature(image), 'result')
+    assert index.lookup(*image_signature(noisy)) == 'result'
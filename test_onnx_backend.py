@@ -0,0 +1,126 @@
+"""
+Tests for the classifier backend registry and the ONNX Runtime backend
+Run with: python -m pytest test_onnx_backend.py
+
+The ONNX tests build a tiny model locally, so no download is needed.
+"""
+
+import pytest
+
+from classifier import CLASSIFIER_BACKENDS, InjuryClassifier, create_classifier, register_backend
+from test_api import create_test_image
+
+
+def build_tiny_model(path, channels_first=True):
+    """
+    Write a 5-class ONNX model: global average colour -> linear -> softmax
+    Red-dominant images score highest as 'burn', blue ones as 'bruise'
+    """
+    onnx = pytest.importorskip('onnx')
+    from onnx import TensorProto, helper
+
+    shape = [1, 3, 224, 224] if channels_first else [1, 224, 224, 3]
+    nodes = []
+    pooled = 'image'
+    if not channels_first:
+        nodes.append(helper.make_node('Transpose', ['image'], ['nchw'], perm=[0, 3, 1, 2]))
+        pooled = 'nchw'
+    nodes += [
+        helper.make_node('GlobalAveragePool', [pooled], ['pooled']),
+        helper.make_node('Flatten', ['pooled'], ['flat']),
+        helper.make_node('Gemm', ['flat', 'weights', 'bias'], ['logits']),
+        helper.make_node('Softmax', ['logits'], ['probabilities'], axis=1),
+    ]
+    # Rows: R, G, B channel means; columns: minor_cut, burn, abrasion, bruise, swelling
+    weights = [
+        0.0, 4.0, 0.0, -4.0, 0.0,
+        0.0, -2.0, 0.0, -2.0, 0.0,
+        0.0, -2.0, 0.0, 4.0, 0.0,
+    ]
+    graph = helper.make_graph(
+        nodes,
+        'tiny_injury_classifier',
+        [helper.make_tensor_value_info('image', TensorProto.FLOAT, shape)],
+        [helper.make_tensor_value_info('probabilities', TensorProto.FLOAT, [1, 5])],
+        initializer=[
+            helper.make_tensor('weights', TensorProto.FLOAT, [3, 5], weights),
+            helper.make_tensor('bias', TensorProto.FLOAT, [5], [0.0] * 5),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def onnx_model(tmp_path):
+    pytest.importorskip('onnxruntime')
+    return build_tiny_model(tmp_path / 'tiny.onnx')
+
+
+def test_default_backend_is_heuristic(monkeypatch):
+    monkeypatch.delenv('CLASSIFIER_BACKEND', raising=False)
+    classifier = create_classifier()
+    assert type(classifier) is InjuryClassifier
+    assert classifier.model_info()['backend'] == 'heuristic'
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match='Unknown classifier backend'):
+        create_classifier('does-not-exist')
+
+
+def test_register_backend(monkeypatch):
+    monkeypatch.setitem(CLASSIFIER_BACKENDS, 'custom', lambda: 'custom classifier')
+    assert create_classifier('custom') == 'custom classifier'
+    monkeypatch.delitem(CLASSIFIER_BACKENDS, 'custom')
+    register_backend('custom', InjuryClassifier)
+    assert isinstance(create_classifier('custom'), InjuryClassifier)
+    del CLASSIFIER_BACKENDS['custom']
+
+
+def test_onnx_backend_selected_from_env(monkeypatch, onnx_model):
+    monkeypatch.setenv('CLASSIFIER_BACKEND', 'onnx')
+    monkeypatch.setenv('ONNX_MODEL_PATH', onnx_model)
+    monkeypatch.setenv('ONNX_INTRA_OP_THREADS', '2')
+    classifier = create_classifier()
+    assert classifier.model_info()['backend'] == 'onnx'
+    assert classifier.model_info()['model_path'] == onnx_model
+
+
+@pytest.mark.parametrize('channels_first', [True, False])
+def test_onnx_backend_classifies(tmp_path, channels_first):
+    pytest.importorskip('onnxruntime')
+    from onnx_backend import OnnxInjuryClassifier
+
+    classifier = OnnxInjuryClassifier(build_tiny_model(tmp_path / 'tiny.onnx', channels_first))
+    category, confidence, features = classifier.classify(create_test_image('red').getvalue())
+    assert category == 'burn'
+    assert 0.5 <= confidence <= 1
+    assert set(features['probabilities']) == set(classifier.labels)
+    assert classifier.classify(create_test_image('blue').getvalue())[0] == 'bruise'
+    assert classifier.classify(b'not an image') == ('unknown', 0.5, {})
+
+
+def test_onnx_tensor_layout(onnx_model):
+    import numpy as np
+    from PIL import Image
+    from onnx_backend import IMAGENET_MEAN, IMAGENET_STD, OnnxInjuryClassifier
+
+    classifier = OnnxInjuryClassifier(onnx_model)
+    image = Image.new('RGB', (224, 224), color=(255, 0, 128))
+    tensor = classifier.to_tensor(image)
+    assert tensor.shape == (1, 3, 224, 224)
+    assert tensor.dtype == np.float32
+    for channel, value in enumerate((255, 0, 128)):
+        expected = (value / 255 - IMAGENET_MEAN[channel]) / IMAGENET_STD[channel]
+        assert tensor[0, channel, 10, 10] == pytest.approx(expected, rel=1e-5)
+
+
+def test_onnx_ignores_the_alpha_of_raw_rgba_pixels(onnx_model):
+    from onnx_backend import OnnxInjuryClassifier
+
+    classifier = OnnxInjuryClassifier(onnx_model)
+    image = classifier.preprocess_image(create_test_image('red').getvalue())
+    assert classifier.classify_rgb(image.convert('RGBA').tobytes()) == classifier.classify_image(image)
@@ -0,0 +1,76 @@
+"""
+Tests for the background request log
+Run with: python -m pytest test_request_log.py
+"""
+
+import json
+import os
+import threading
+
+from request_log import RequestLog
+
+
+def read_records(path):
+    with open(path) as log_file:
+        return [json.loads(line) for line in log_file]
+
+
+def test_records_are_written_in_batches_and_flushed_on_close(tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path), batch_size=100, flush_interval=60)
+    for index in range(250):
+        assert log.log({'index': index})
+    log.close()
+    assert [record['index'] for record in read_records(path)] == list(range(250))
+    stats = log.stats()
+    assert stats['written'] == 250
+    assert stats['batches'] == 3
+    assert not log.log({'index': 'late'})
+
+
+def test_partial_batch_is_written_after_flush_interval(tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path), batch_size=100, flush_interval=0.05)
+    log.log({'index': 0})
+    for _ in range(100):
+        if log.stats()['written']:
+            break
+        threading.Event().wait(0.01)
+    assert read_records(path) == [{'index': 0}]
+    log.close()
+
+
+def test_rotates_by_size_keeping_backups(tmp_path):
+    path = tmp_path / 'requests.jsonl'
+    log = RequestLog(str(path), batch_size=1, max_bytes=200, backups=2)
+    for index in range(40):
+        log.log({'index': index, 'padding': 'x' * 20})
+    log.close()
+    assert log.stats()['rotations'] > 2
+    assert sorted(os.listdir(tmp_path)) == ['requests.jsonl', 'requests.jsonl.1', 'requests.jsonl.2']
+    assert all(os.path.getsize(tmp_path / name) <= 200 for name in os.listdir(tmp_path))
+    newest = read_records(path)
+    assert newest[-1]['index'] == 39
+    assert read_records(str(path) + '.1')[-1]['index'] == newest[0]['index'] - 1
+
+
+def test_full_buffer_samples_then_drops(tmp_path):
+    log = RequestLog(str(tmp_path / 'requests.jsonl'), max_buffer=8, batch_size=100,
+                     flush_interval=60, sample_every=2)
+    # Pretend the writer is already running so the buffer only fills
+    log._thread = threading.Thread()
+    kept = [log.log({'index': index}) for index in range(20)]
+    stats = log.stats()
+    # 6 below the high-water mark, then every second record until full
+    assert kept[:6] == [True] * 6
+    assert stats['buffered'] == 8
+    assert stats['sampled_out'] == 2
+    assert stats['dropped'] == 10
+    assert all(record.get('sample_rate') == 2 for record in list(log._buffer)[6:])
+
+
+def test_path_can_include_pid(tmp_path):
+    log = RequestLog(str(tmp_path / 'requests-{pid}.jsonl'))
+    log.log({'index': 0})
+    log.close()
+    assert os.path.exists(tmp_path / f'requests-{os.getpid()}.jsonl')
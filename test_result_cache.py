@@ -0,0 +1,107 @@
+"""
+Unit tests for the content-addressed result cache
+Run with: python -m pytest test_result_cache.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from result_cache import ResultCache, SqliteResultBackend, content_key
+
+
+def test_hit_after_miss():
+    """The second lookup for a key is served from cache"""
+    cache = ResultCache()
+    calls = []
+    compute = lambda: calls.append(1) or ['burn', 0.65, {}]
+    assert cache.get_or_compute('a', compute) == ['burn', 0.65, {}]
+    assert cache.get_or_compute('a', compute) == ['burn', 0.65, {}]
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+
+def test_byte_bound_evicts_least_recently_used():
+    """Entries are evicted oldest-first once max_bytes is exceeded"""
+    cache = ResultCache(max_bytes=30)
+    cache.get_or_compute('a', lambda: 'x' * 10)
+    cache.get_or_compute('b', lambda: 'y' * 10)
+    cache.get_or_compute('a', lambda: pytest.fail('should hit'))
+    cache.get_or_compute('c', lambda: 'z' * 10)
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] <= 30
+    # 'b' was least recently used, so it is the one that went
+    cache.get_or_compute('a', lambda: pytest.fail('should hit'))
+    assert cache.get_or_compute('b', lambda: 'recomputed') == 'recomputed'
+
+
+def test_ttl_expiry():
+    """Expired entries are recomputed"""
+    cache = ResultCache(ttl=0.01)
+    cache.get_or_compute('a', lambda: 1)
+    time.sleep(0.02)
+    assert cache.get_or_compute('a', lambda: 2) == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    """Threads asking for the same key share one computation"""
+    cache = ResultCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+        for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    while cache.stats()['coalesced'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert results == ['result'] * 5
+    assert len(calls) == 1
+
+
+def test_exceptions_are_not_cached():
+    """A failed computation propagates and the next call retries"""
+    cache = ResultCache()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', fail)
+    assert cache.get_or_compute('k', lambda: 'ok') == 'ok'
+
+
+def test_sqlite_backend_shares_results(tmp_path):
+    """Two caches on the same SQLite file see each other's results"""
+    path = str(tmp_path / 'results.sqlite')
+    first = ResultCache(backend=SqliteResultBackend(path))
+    second = ResultCache(backend=SqliteResultBackend(path))
+    first.get_or_compute('k', lambda: ['bruise', 0.62, {'avg_red': 90.0}])
+    value = second.get_or_compute('k', lambda: pytest.fail('should hit shared backend'))
+    assert value == ['bruise', 0.62, {'avg_red': 90.0}]
+    assert second.stats()['shared_hits'] == 1
+
+
+def test_content_key_is_stable():
+    assert content_key(b'abc') == content_key(b'abc')
+    assert content_key(b'abc') != content_key(b'abd')
@@ -0,0 +1,116 @@
+"""
+Tests for model weights shared between processes
+Run with: python -m pytest test_shared_weights.py
+"""
+
+import json
+import multiprocessing
+
+import pytest
+
+from shared_weights import (
+    ALIGNMENT, SharedWeights, export_shared_weights, load_shared_weights, mapped_memory,
+    process_memory, weights_path,
+)
+from test_api import create_test_image
+from test_onnx_backend import build_tiny_model
+
+
+@pytest.fixture
+def exported(tmp_path):
+    pytest.importorskip('onnxruntime')
+    model_path = build_tiny_model(tmp_path / 'tiny.onnx')
+    return model_path, export_shared_weights(model_path)
+
+
+def test_export_writes_aligned_weights(exported):
+    model_path, shared_path = exported
+    assert shared_path.endswith('tiny.shared.onnx')
+    with open(weights_path(shared_path), 'rb') as weights:
+        header_length = int.from_bytes(weights.read(8), 'little')
+        header = json.loads(weights.read(header_length))
+    assert set(header) == {'weights', 'bias'}
+    assert header['weights']['shape'] == [3, 5]
+    assert all(spec['offset'] % ALIGNMENT == 0 and spec['offset'] >= 8 + header_length
+               for spec in header.values())
+
+
+def test_weights_are_read_only_views(exported):
+    import onnx
+    from onnx import numpy_helper
+
+    model_path, shared_path = exported
+    weights = load_shared_weights(shared_path)
+    original = {tensor.name: numpy_helper.to_array(tensor) for tensor in onnx.load(model_path).graph.initializer}
+    for name, array in weights.arrays.items():
+        assert (array == original[name]).all()
+        assert not array.flags.writeable
+    assert weights.info()['bytes'] == (15 + 5) * 4
+    assert load_shared_weights(model_path) is None
+
+
+def test_exported_model_loads_without_the_backend(exported):
+    # The weights file doubles as ONNX external data
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(exported[1], providers=['CPUExecutionProvider'])
+    assert session.get_inputs()[0].name == 'image'
+
+
+def test_shared_model_classifies_like_the_original(exported):
+    from onnx_backend import OnnxInjuryClassifier
+
+    original = OnnxInjuryClassifier(exported[0])
+    shared = OnnxInjuryClassifier(exported[1])
+    assert original.model_info()['shared_weights'] is None
+    assert shared.model_info()['shared_weights']['tensors'] == 2
+    for color in ('red', 'blue', 'normal'):
+        image_bytes = create_test_image(color).getvalue()
+        assert shared.classify(image_bytes) == original.classify(image_bytes)
+
+
+def test_large_header_offsets_stay_aligned(tmp_path):
+    onnx = pytest.importorskip('onnx')
+    from onnx import TensorProto, helper, numpy_helper
+    import numpy as np
+
+    # Enough tensors that shifting offsets past the header adds digits
+    tensors = [numpy_helper.from_array(np.full(100, i, dtype=np.float32), f'tensor_{i}') for i in range(300)]
+    graph = helper.make_graph(
+        [helper.make_node('Sum', [tensor.name for tensor in tensors], ['total'])], 'many',
+        [], [helper.make_tensor_value_info('total', TensorProto.FLOAT, [100])], initializer=tensors,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    onnx.save(model, str(tmp_path / 'many.onnx'))
+    weights = SharedWeights(weights_path(export_shared_weights(str(tmp_path / 'many.onnx'))))
+    assert len(weights.arrays) == 300
+    assert all(weights.arrays[f'tensor_{i}'][0] == i for i in range(300))
+
+
+def read_mapped_memory(path, results):
+    # Runs in a separate process that maps the same file
+    weights = SharedWeights(path)
+    results.put((int(weights.arrays['weights'].sum() != 0), mapped_memory(path)))
+
+
+def test_memory_reports(exported):
+    memory = process_memory()
+    if memory is None:
+        pytest.skip('/proc is not available')
+    assert memory['rss'] == memory['shared'] + memory['private'] > 0
+    assert memory['pss'] <= memory['rss']
+
+    path = weights_path(exported[1])
+    weights = SharedWeights(path)
+    assert weights.arrays['weights'].sum() != 0  # touch the pages
+    assert mapped_memory(path)['rss'] > 0
+    assert mapped_memory(str(exported[0]))['rss'] == 0
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    child = context.Process(target=read_mapped_memory, args=(path, results))
+    child.start()
+    touched, child_memory = results.get(timeout=30)
+    child.join()
+    # This process still maps the same pages, so the child's are shared
+    assert touched and child_memory['shared'] > 0
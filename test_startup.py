@@ -0,0 +1,55 @@
+"""
+Tests for startup warm-up and the readiness/liveness split
+Run with: python -m pytest test_startup.py
+"""
+
+import io
+
+from PIL import Image
+
+import app as app_module
+from startup import WARMUP_FORMATS, Readiness, synthetic_images
+
+
+def test_synthetic_images_cover_each_format():
+    images = synthetic_images(len(WARMUP_FORMATS) + 1)
+    formats = [Image.open(io.BytesIO(image_bytes)).format for image_bytes in images]
+    assert formats == WARMUP_FORMATS + WARMUP_FORMATS[:1]
+    assert synthetic_images(0) == []
+
+
+def test_readiness_after_warm_up():
+    calls = []
+    readiness = Readiness(lambda: calls.append(1))
+    assert readiness.state == 'starting' and not readiness.ready
+    readiness.begin()
+    readiness.begin()
+    assert readiness.wait(timeout=5)
+    assert calls == [1]
+    assert readiness.status()['state'] == 'ready'
+    assert 'warmup_seconds' in readiness.status()
+
+
+def test_failed_warm_up_is_not_ready():
+    def broken():
+        raise RuntimeError('no model')
+
+    readiness = Readiness(broken)
+    readiness.begin()
+    assert readiness.wait(timeout=5) is False
+    assert readiness.status()['error'] == 'no model'
+
+
+def test_health_reports_readiness_and_liveness(monkeypatch):
+    client = app_module.app.test_client()
+    monkeypatch.setattr(app_module, 'startup', Readiness(lambda: None))
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'starting'
+    assert client.get('/health/ready').status_code == 503
+    assert client.get('/health/live').status_code == 200
+
+    app_module.startup.begin()
+    app_module.startup.wait(timeout=5)
+    assert client.get('/health').status_code == 200
+    assert client.get('/health/ready').status_code == 200
@@ -0,0 +1,109 @@
+"""
+Tests for pre-decode upload validation, including crafted bomb files
+Run with: python -m pytest test_validation.py
+"""
+
+import io
+import struct
+import time
+import tracemalloc
+import zlib
+
+import pytest
+from PIL import Image
+
+from validation import UploadRejected, sniff_image_format, validate_image_header
+
+LIMITS = {'max_pixels': 50_000_000, 'max_dimension': 20000}
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png_header_only(width, height):
+    """A ~60 byte PNG that declares the given dimensions and has no pixel data"""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr) + png_chunk(b'IEND', b'')
+
+
+def png_zlib_bomb(width, height):
+    """A valid grayscale PNG of all zeros: tiny on disk, huge when decoded"""
+    compressor = zlib.compressobj(9)
+    row = b'\x00' * (width + 1)
+    idat = b''.join(compressor.compress(row) for _ in range(height)) + compressor.flush()
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr) + png_chunk(b'IDAT', idat) + png_chunk(b'IEND', b'')
+
+
+def encode(size, fmt):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=(200, 80, 80)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('fmt', ['PNG', 'JPEG', 'GIF', 'WEBP'])
+def test_accepts_supported_formats(fmt):
+    assert validate_image_header(encode((640, 480), fmt), **LIMITS) == (fmt, 640, 480)
+
+
+def test_rejects_non_image_with_image_name():
+    with pytest.raises(UploadRejected) as excinfo:
+        validate_image_header(b'This is not an image', **LIMITS)
+    assert excinfo.value.status == 415
+
+
+def test_rejects_truncated_header():
+    with pytest.raises(UploadRejected) as excinfo:
+        validate_image_header(encode((64, 64), 'PNG')[:20], **LIMITS)
+    assert excinfo.value.status == 400
+
+
+def test_rejects_declared_dimensions_in_microseconds():
+    bomb = png_header_only(30000, 30000)
+    assert len(bomb) < 100
+    tracemalloc.start()
+    start = time.perf_counter()
+    with pytest.raises(UploadRejected) as excinfo:
+        validate_image_header(bomb, **LIMITS)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert excinfo.value.status == 413
+    assert elapsed < 0.05
+    assert peak < 1024 * 1024
+
+
+def test_rejects_zlib_bomb_without_decoding():
+    bomb = png_zlib_bomb(12000, 12000)  # 144M pixels in a few hundred KB
+    assert len(bomb) < 1024 * 1024
+    start = time.perf_counter()
+    with pytest.raises(UploadRejected) as excinfo:
+        validate_image_header(bomb, **LIMITS)
+    assert time.perf_counter() - start < 0.05
+    assert excinfo.value.error_type == 'too_many_pixels'
+
+
+def test_reports_our_pixel_limit_beyond_pillows_bomb_threshold():
+    # Past Pillow's own DecompressionBombError threshold
+    width = height = 30000
+    assert width * height > 2 * Image.MAX_IMAGE_PIXELS
+    with pytest.raises(UploadRejected) as excinfo:
+        validate_image_header(png_header_only(width, height), max_pixels=50_000_000, max_dimension=40000)
+    assert str(excinfo.value) == 'Image is 30000x30000; at most 50,000,000 pixels are accepted'
+    # A limit above Pillow's threshold is honoured, not overridden by it
+    assert validate_image_header(png_header_only(width, height), max_pixels=10 ** 9,
+                                 max_dimension=40000) == ('PNG', width, height)
+
+
+def test_rejects_long_thin_images():
+    with pytest.raises(UploadRejected):
+        validate_image_header(png_header_only(40000, 10), **LIMITS)
+
+
+def test_sniff_image_format():
+    assert sniff_image_format(b'\x89PNG\r\n\x1a\nrest') == 'PNG'
+    assert sniff_image_format(b'\xff\xd8') == ''
+    assert sniff_image_format(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'WEBP'
+    assert sniff_image_format(b'RIFF\x00\x00\x00\x00WAVE') is None
+    assert sniff_image_format(b'hello world!') is None